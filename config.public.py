@@ -5,7 +5,12 @@ log_level = logging.INFO
 authentication = False
 
 metadata_db = "/mnt/disks/data/meta_public_version_20240709.db"
+# load the trait and dataset tables of metadata_db in memory at startup, shared by the gunicorn workers
+# (the server needs to be restarted when the db changes)
+metadata_preload = False
 
+# rsid to variant lookup db created with scripts/populate_rsid_sqlite.py
+# the integer-keyed rsid_int table written with --convert is used if the db has it
 rsid_db = {
     "file": "/mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.rsid.db",
 }
@@ -19,6 +24,10 @@ gnomad = {
 
 assoc = {
     "file": "/mnt/disks/data/assoc_resources_public_version_20240709.tsv.gz",
+    # "tabix" reads the file above
+    # "columnar" reads memory-mapped NumPy arrays converted from it with scripts/assoc_to_columnar.py
+    "backend": "tabix",
+    "columnar_dir": "/mnt/disks/data/assoc_resources_public_version_20240709.columnar",
     # not all resources in the data file need to be listed here
     # if a resource is not listed here, data for it will not be shown in the UI
     "resources": [
@@ -195,4 +204,69 @@ finemapped = {
     ],
 }
 
-max_query_variants = 2000
+# "inprocess" reads the tabix-indexed data files within the server process
+# "subprocess" runs the tabix executable for each query
+# with the inprocess backend, variants are looked up through <file>.vidx.npy next to a data file
+# if it exists and is newer than the data file (built with scripts/build_variant_index.py)
+tabix = {
+    "backend": "inprocess",
+    "variant_index": True,
+}
+
+# number of threads used to fetch gnomAD, fine-mapping, association and LD association data
+# for a query concurrently, and the number of variants fetched per task
+# max_workers 0 fetches everything sequentially in the request thread
+# streamed responses fetch at most stream_window batches ahead of the one being sent to bound memory use
+concurrency = {
+    "max_workers": 4,
+    "batch_size": 500,
+    "stream_window": 4,
+}
+
+# parsed per-variant and per-range results are cached in memory in each server process
+# max_bytes bounds the pickled size of the cached results, 0 disables the cache
+# data files are opened once, restart the server after replacing a data file
+result_cache = {
+    "max_bytes": 512 * 1024 * 1024,
+}
+
+# whole responses of /api/v1/results are cached gzip-compressed on disk, shared by the server processes
+# entries are keyed by the normalized query and a fingerprint of this configuration and the data files in it
+# so responses are recomputed after data files change, dir None disables the cache
+# max_bytes bounds the size of the directory, least recently used responses are removed first
+# data files are checked for changes at most every check_interval seconds
+# dir needs to be writable, the data disk is mounted read-only in deploy/, the cache is disabled if it is not
+response_cache = {
+    "dir": "/tmp/response_cache",
+    "max_bytes": 512 * 1024 * 1024,
+    "check_interval": 10,
+}
+
+# the metadata and rsid SQLite dbs are opened read-only
+# immutable True lets SQLite skip locking and change detection, restart the server after replacing a db
+# mmap_size and cache_size_kib are per connection, max_connections bounds the open connections per db and process
+# and timeout is the number of seconds a query waits for a connection when all are in use
+# query timings are reported at /api/v1/db_stats
+sqlite = {
+    "immutable": True,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size_kib": 64 * 1024,
+    "max_connections": 16,
+    "timeout": 30,
+}
+
+# JSON serialization of responses
+# provider "orjson" is fast and always writes non-finite floats (NaN, Infinity) as null,
+# "stdlib" uses the json module and with strict False writes them as NaN and Infinity which is not valid JSON
+# float_precision rounds floats to this many significant digits, None keeps full precision
+json_response = {
+    "provider": "orjson",
+    "float_precision": None,
+    "strict": True,
+}
+
+max_query_variants = 20000
+
+# number of variants in a page of /api/v1/region by default and at most
+region_page_size = 100
+max_region_page_size = 1000
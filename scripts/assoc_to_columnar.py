@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# converts an assoc file (original or rewritten by normalize_assoc.py) into the columnar store
+# read by server/data_access/assoc_store.py
+# one directory of NumPy arrays is written per chromosome:
+# var_pos, var_start: position of each variant and the index of its first row, variants sorted by position
+# allele_offsets, alleles: "ref\talt" of each variant as bytes
+# resource, dataset, data_type, trait: dictionary codes, the dictionaries are in meta.json
+# beta, se, mlog10p: float64
+# rows with NA beta are dropped as the server does not show them
+# and infinite mlog10p values are calculated from beta and se as in normalize_assoc.py
+#
+# ran with:
+# ./assoc_to_columnar.py \
+# /mnt/disks/data/assoc_resources_public_version_20240219.tsv.gz \
+# /mnt/disks/data/assoc_resources_public_version_20240219.columnar
+
+import argparse
+import gzip
+import json
+import os
+import timeit
+from array import array
+
+import numpy as np
+
+from normalize_assoc import NORMALIZED_MARKER, normalize_assoc_row
+
+# must match STORE_FORMAT and STORE_VERSION in server/data_access/assoc_store.py
+STORE_FORMAT = "assoc_columnar"
+STORE_VERSION = 1
+DICTIONARY_COLUMNS = ["resource", "dataset", "data_type", "trait"]
+
+
+class ChromosomeWriter(object):
+    def __init__(self, chr, dictionaries):
+        self.chr = chr
+        self.dictionaries = dictionaries
+        self.var_pos = array("i")
+        self.var_start = array("q", [0])
+        self.allele_offsets = array("q", [0])
+        self.alleles = bytearray()
+        self.codes = {column: array("i") for column in DICTIONARY_COLUMNS}
+        self.values = {column: array("d") for column in ["beta", "se", "mlog10p"]}
+        self.pos = -1
+        # rows of the current position by (ref, alt) in order of first appearance
+        self.pending = {}
+
+    def add(self, pos, ref, alt, d):
+        if pos < self.pos:
+            raise ValueError(f"input not sorted by position at {self.chr}:{pos}")
+        if pos != self.pos:
+            self.flush()
+            self.pos = pos
+        self.pending.setdefault((ref, alt), []).append(d)
+
+    def flush(self):
+        for (ref, alt), rows in self.pending.items():
+            self.var_pos.append(self.pos)
+            self.alleles.extend(f"{ref}\t{alt}".encode())
+            self.allele_offsets.append(len(self.alleles))
+            for d in rows:
+                for column in DICTIONARY_COLUMNS:
+                    value = d[column]
+                    codes = self.dictionaries[column]
+                    if value not in codes:
+                        codes[value] = len(codes)
+                    self.codes[column].append(codes[value])
+                for column in self.values:
+                    self.values[column].append(d[column])
+            self.var_start.append(len(self.codes["resource"]))
+        self.pending = {}
+
+    def save(self, out_dir):
+        self.flush()
+        chr_dir = os.path.join(out_dir, self.chr)
+        os.makedirs(chr_dir, exist_ok=True)
+        arrays = {
+            "var_pos": np.array(self.var_pos, dtype=np.int32),
+            "var_start": np.array(self.var_start, dtype=np.int64),
+            "allele_offsets": np.array(self.allele_offsets, dtype=np.int64),
+            "alleles": np.frombuffer(bytes(self.alleles), dtype=np.uint8),
+        }
+        for column, codes in self.codes.items():
+            arrays[column] = np.array(codes, dtype=np.int32)
+        for column, values in self.values.items():
+            arrays[column] = np.array(values, dtype=np.float64)
+        for name, arr in arrays.items():
+            np.save(os.path.join(chr_dir, name + ".npy"), arr)
+        return len(self.var_pos), len(self.codes["resource"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Script for converting a gzipped assoc file into a columnar NumPy store."
+    )
+    parser.add_argument("input_file", help="gzipped assoc file sorted by chr and pos")
+    parser.add_argument("out_dir", help="directory to be created or overwritten")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    # meta.json is written last so an interrupted conversion cannot be loaded
+    meta_file = os.path.join(args.out_dir, "meta.json")
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    dictionaries = {column: {} for column in DICTIONARY_COLUMNS}
+    chromosomes = []
+    writer = None
+    n_variants = 0
+    n_rows = 0
+    start_time = timeit.default_timer()
+    with gzip.open(args.input_file, "rt") as f:
+        line = f.readline()
+        if line.startswith(NORMALIZED_MARKER):
+            line = f.readline()
+        # the first column is #resource
+        h = {
+            col.lstrip("#"): idx
+            for idx, col in enumerate(line.rstrip("\n").split("\t"))
+        }
+        for line in f:
+            d = line.rstrip("\n").split("\t")
+            # the server does not show rows without beta
+            if d[h["beta"]] == "NA":
+                continue
+            d = normalize_assoc_row(d, h)
+            chr = d[h["chr"]]
+            if writer is None or writer.chr != chr:
+                if writer is not None:
+                    v, r = writer.save(args.out_dir)
+                    n_variants += v
+                    n_rows += r
+                    print(f"chr {writer.chr}: {v} variants, {r} rows")
+                if chr in chromosomes:
+                    raise ValueError(f"input not sorted by chromosome at {chr}")
+                chromosomes.append(chr)
+                writer = ChromosomeWriter(chr, dictionaries)
+            writer.add(
+                int(d[h["pos"]]),
+                d[h["ref"]],
+                d[h["alt"]],
+                {
+                    **{column: d[h[column]] for column in DICTIONARY_COLUMNS},
+                    "beta": float(d[h["beta"]]),
+                    "se": float(d[h["se"]]),
+                    "mlog10p": float(d[h["mlog10p"]]),
+                },
+            )
+    if writer is not None:
+        v, r = writer.save(args.out_dir)
+        n_variants += v
+        n_rows += r
+        print(f"chr {writer.chr}: {v} variants, {r} rows")
+
+    with open(meta_file, "w") as f:
+        json.dump(
+            {
+                "format": STORE_FORMAT,
+                "version": STORE_VERSION,
+                "source": os.path.abspath(args.input_file),
+                "chromosomes": chromosomes,
+                "variants": n_variants,
+                "rows": n_rows,
+                "dictionaries": {
+                    column: list(codes) for column, codes in dictionaries.items()
+                },
+            },
+            f,
+        )
+    print(
+        f"{n_variants} variants, {n_rows} rows written to {args.out_dir} in {round(timeit.default_timer() - start_time)} seconds"
+    )
+
+
+if __name__ == "__main__":
+    main()
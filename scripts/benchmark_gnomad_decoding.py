@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# micro-benchmark of decoding gnomAD rows as a gene query does with the consequences decoded
+# for every row (before) and decoded on first use only (after)
+#
+# ran with:
+# ./benchmark_gnomad_decoding.py /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.sites.tsv.bgz
+
+import argparse
+import gzip
+import os
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../server")
+)
+
+from data_access.gnomad import GnomAD, LazyConsequences  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of gnomAD row decoding with lazy consequences."
+    )
+    parser.add_argument("gnomad_file", help="gnomAD tsv")
+    parser.add_argument("-n", type=int, default=200000, help="number of rows")
+    parser.add_argument("--repeat", type=int, default=5, help="number of repeats")
+    parser.add_argument(
+        "--used",
+        type=float,
+        default=0.1,
+        help="fraction of rows whose consequences are used, e.g. the coding variants of a gene",
+    )
+    args = parser.parse_args()
+
+    with gzip.open(args.gnomad_file, "rt") as f:
+        f.readline()
+        rows = []
+        for line in f:
+            rows.append(line.rstrip("\n").split("\t"))
+            if len(rows) == args.n:
+                break
+    # only the gnomad file and no tabix access is needed for decoding
+    gnomad = GnomAD(
+        {"gnomad": {"file": args.gnomad_file}, "tabix": {"backend": "subprocess"}}
+    )
+    decode = gnomad._decode_row
+    step = max(1, round(1 / args.used)) if args.used > 0 else len(rows) + 1
+
+    def eager():
+        for row in rows:
+            d = decode(row)
+            for v in d.values():
+                if isinstance(v, LazyConsequences):
+                    v.decoded()
+
+    def lazy():
+        for i, row in enumerate(rows):
+            d = decode(row)
+            if i % step == 0:
+                for v in d.values():
+                    if isinstance(v, LazyConsequences):
+                        v.decoded()
+
+    n = len(rows)
+    before = min(timeit.repeat(eager, number=1, repeat=args.repeat))
+    print(f"{'before':<20} {before * 1000:>9.1f} ms {n / before:>12,.0f} rows/s")
+    after = min(timeit.repeat(lazy, number=1, repeat=args.repeat))
+    print(
+        f"{'after':<20} {after * 1000:>9.1f} ms {n / after:>12,.0f} rows/s"
+        + f"  speedup {before / after:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# benchmark of serializing a captured results response with Flask's default JSON provider (before)
+# and with the JSON providers in server/json_provider.py (after)
+#
+# captured the response with:
+# curl -s -X POST -H "Content-Type: application/json" -d '{"variants": "PCSK9"}' \
+# http://localhost:8080/api/v1/results > pcsk9.json
+#
+# ran with:
+# ./benchmark_json.py pcsk9.json
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../server")
+)
+
+from json_provider import ORJSONProvider, StdlibJSONProvider  # noqa: E402
+
+
+def bench(name, dumps, obj, repeat):
+    best = min(timeit.repeat(lambda: dumps(obj), number=1, repeat=repeat))
+    size = len(dumps(obj))
+    print(
+        f"{name:<28} {best * 1000:>9.1f} ms {size / best / 1e6:>9.1f} MB/s {size:>12,} bytes"
+    )
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of JSON serialization of a captured results response."
+    )
+    parser.add_argument("response_file", help="JSON response of /api/v1/results")
+    parser.add_argument("--repeat", type=int, default=5, help="number of repeats")
+    args = parser.parse_args()
+
+    # json.load reads NaN and Infinity if the response has them
+    with open(args.response_file) as f:
+        obj = json.load(f)
+
+    app = Flask(__name__)
+    default = DefaultJSONProvider(app)
+    providers = []
+    for name, provider_class, precision in [
+        ("stdlib strict", StdlibJSONProvider, None),
+        ("orjson", ORJSONProvider, None),
+        ("orjson precision 4", ORJSONProvider, 4),
+    ]:
+        provider = provider_class(app)
+        provider.float_precision = precision
+        providers.append((name, provider))
+
+    # the response as written by jsonify outside debug mode
+    before = bench(
+        "default",
+        lambda obj: default.dumps(obj, separators=(",", ":")).encode(),
+        obj,
+        args.repeat,
+    )
+    for name, provider in providers:
+        if isinstance(provider, ORJSONProvider):
+            after = bench(name, provider.dumps_bytes, obj, args.repeat)
+        else:
+            after = bench(
+                name,
+                lambda obj: provider.dumps(obj, separators=(",", ":")).encode(),
+                obj,
+                args.repeat,
+            )
+        print(f"  speedup {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+# micro-benchmark of decoding data file rows with per-field header dict lookups (before)
+# and with the decoders built once from the header in server/data_access/row_decoder.py (after)
+#
+# ran with:
+# ./benchmark_row_decoders.py \
+# --gnomad /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.sites.tsv.bgz \
+# --assoc /mnt/disks/data/assoc_resources_public_version_20240219.tsv.gz \
+# --finemapped /mnt/disks/data/finemapped_resources_public_version_20240219.tsv.gz
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import timeit
+from collections import OrderedDict as od
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../server")
+)
+
+from data_access.row_decoder import (  # noqa: E402
+    compile_dict_decoder,
+    compile_tuple_decoder,
+)
+from variant import Variant  # noqa: E402
+
+
+def read_rows(path, n):
+    with gzip.open(path, "rt") as f:
+        line = f.readline()
+        while line.startswith("##"):
+            line = f.readline()
+        headers = line.rstrip("\n").split("\t")
+        rows = []
+        for line in f:
+            rows.append(line.rstrip("\n").split("\t"))
+            if len(rows) == n:
+                break
+    return headers, rows
+
+
+def group_consequences(consequences):
+    csq = {}
+    for c in consequences:
+        csq.setdefault(c["gene_symbol"], set()).update(c["consequences"])
+    return [
+        {"gene_symbol": k, "consequence": c.replace("_variant", "").replace("_", " ")}
+        for k, v in csq.items()
+        for c in v
+    ]
+
+
+def gnomad_before(headers):
+    h_idx = od({h: i for i, h in enumerate(headers)})
+
+    def decode(data):
+        gnomad = od()
+        for h in h_idx:
+            if data[h_idx[h]] == "NA" or data[h_idx[h]] == "":
+                gnomad[h] = None if h.lower() != "consequences" else []
+            elif h.lower() == "consequences":
+                gnomad[h] = group_consequences(json.loads(str(data[h_idx[h]])))
+            elif h.lower() == "pos" or h.lower() == "an":
+                gnomad[h] = int(data[h_idx[h]])
+            elif h.lower().startswith("af"):
+                gnomad[h] = float(data[h_idx[h]])
+            elif h.lower() == "most_severe":
+                gnomad[h] = (
+                    str(data[h_idx[h]]).replace("_variant", "").replace("_", " ")
+                )
+            else:
+                gnomad[h] = data[h_idx[h]]
+        return gnomad
+
+    return decode
+
+
+def gnomad_after(headers):
+    converters = {}
+    for h in headers:
+        if h.lower() == "consequences":
+            converters[h] = lambda v: group_consequences(json.loads(v))
+        elif h.lower() == "pos" or h.lower() == "an":
+            converters[h] = int
+        elif h.lower().startswith("af"):
+            converters[h] = float
+        elif h.lower() == "most_severe":
+            converters[h] = lambda v: v.replace("_variant", "").replace("_", " ")
+    return compile_dict_decoder(
+        headers,
+        converters,
+        na_values=("NA", ""),
+        na_defaults={h: list for h in headers if h.lower() == "consequences"},
+    )
+
+
+def assoc_before(headers):
+    h = od({h: i for i, h in enumerate(headers)})
+    ignore = ["FinnGen_R10:GWAS_T3"]
+
+    def decode(d):
+        if d[h["beta"]] == "NA" or f"{d[h['dataset']]}:{d[h['trait']]}" in ignore:
+            return None
+        return (
+            d[h["#resource"]],
+            d[h["dataset"]],
+            d[h["data_type"]],
+            d[h["trait"]],
+            float(d[h["beta"]]),
+            float(d[h["se"]]),
+            float(d[h["mlog10p"]]),
+            str(Variant(f"{d[h['chr']]}-{d[h['pos']]}-{d[h['ref']]}-{d[h['alt']]}")),
+        )
+
+    return decode
+
+
+def assoc_after(headers):
+    h = {h: i for i, h in enumerate(headers)}
+    ignore = set(["FinnGen_R10:GWAS_T3"])
+    fields = compile_tuple_decoder(
+        h, ["#resource", "dataset", "data_type", "trait", "beta", "se", "mlog10p"]
+    )
+    cpra = compile_tuple_decoder(h, ["chr", "pos", "ref", "alt"])
+    variant_ids = {}
+
+    def decode(d):
+        resource, dataset, data_type, trait, beta, se, mlog10p = fields(d)
+        if beta == "NA" or f"{dataset}:{trait}" in ignore:
+            return None
+        key = cpra(d)
+        if key not in variant_ids:
+            variant_ids[key] = str(Variant("-".join(key)))
+        return (
+            resource,
+            dataset,
+            data_type,
+            trait,
+            float(beta),
+            float(se),
+            float(mlog10p),
+            variant_ids[key],
+        )
+
+    return decode
+
+
+FINEMAPPED_COLUMNS = [
+    "#resource",
+    "dataset",
+    "data_type",
+    "trait",
+    "mlog10p",
+    "beta",
+    "se",
+    "pip",
+    "cs_size",
+    "cs_min_r2",
+]
+FINEMAPPED_CONVERTERS = {
+    "mlog10p": float,
+    "beta": float,
+    "se": float,
+    "pip": float,
+    "cs_size": int,
+    "cs_min_r2": float,
+}
+
+
+def finemapped_before(headers):
+    h = od({h: i for i, h in enumerate(headers)})
+
+    def decode(data):
+        return {
+            "resource": data[h["#resource"]],
+            "dataset": data[h["dataset"]],
+            "data_type": data[h["data_type"]],
+            "phenocode": data[h["trait"]],
+            "mlog10p": float(data[h["mlog10p"]]),
+            "beta": float(data[h["beta"]]),
+            "se": float(data[h["se"]]),
+            "pip": float(data[h["pip"]]),
+            "cs_size": int(data[h["cs_size"]]),
+            "cs_min_r2": float(data[h["cs_min_r2"]]),
+        }
+
+    return decode
+
+
+def finemapped_after(headers):
+    decode_tuple = compile_tuple_decoder(
+        {h: i for i, h in enumerate(headers)}, FINEMAPPED_COLUMNS, FINEMAPPED_CONVERTERS
+    )
+
+    def decode(data):
+        (
+            resource,
+            dataset,
+            data_type,
+            phenocode,
+            mlog10p,
+            beta,
+            se,
+            pip,
+            cs_size,
+            cs_min_r2,
+        ) = decode_tuple(data)
+        return {
+            "resource": resource,
+            "dataset": dataset,
+            "data_type": data_type,
+            "phenocode": phenocode,
+            "mlog10p": mlog10p,
+            "beta": beta,
+            "se": se,
+            "pip": pip,
+            "cs_size": cs_size,
+            "cs_min_r2": cs_min_r2,
+        }
+
+    return decode
+
+
+def bench(name, decode, rows, repeat):
+    # decode small samples several times per timing to reduce noise
+    number = max(1, 200000 // len(rows))
+    best = min(
+        timeit.repeat(
+            lambda: [decode(row) for row in rows], number=number, repeat=repeat
+        )
+    )
+    rate = len(rows) * number / best
+    print(f"{name:<12} {rate:>14,.0f} rows/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark of row decoding before and after header-resolved row decoders."
+    )
+    parser.add_argument("--gnomad", help="gnomAD data file")
+    parser.add_argument("--assoc", help="assoc data file")
+    parser.add_argument("--finemapped", help="finemapped data file")
+    parser.add_argument(
+        "--rows", type=int, default=100000, help="number of rows to decode per file"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="number of repeats")
+    args = parser.parse_args()
+
+    for name, path, before, after in [
+        ("gnomad", args.gnomad, gnomad_before, gnomad_after),
+        ("assoc", args.assoc, assoc_before, assoc_after),
+        ("finemapped", args.finemapped, finemapped_before, finemapped_after),
+    ]:
+        if path is None:
+            continue
+        headers, rows = read_rows(path, args.rows)
+        print(f"{name}: {len(rows)} rows")
+        decode_before = before(headers)
+        decode_after = after(headers)
+        for row in rows[:1000]:
+            if decode_before(row) != decode_after(row):
+                raise ValueError(f"{name} decoders disagree on row {row}")
+        rate_before = bench("  before", decode_before, rows, args.repeat)
+        rate_after = bench("  after", decode_after, rows, args.repeat)
+        print(f"  speedup      {rate_after / rate_before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
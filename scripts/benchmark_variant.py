@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+# micro-benchmark of constructing and hashing variants with the previous Variant class (before)
+# and with the packed Variant in server/variant.py and its trusted-row fast path (after)
+#
+# ran with:
+# ./benchmark_variant.py --gnomad /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.sites.tsv.bgz
+
+import argparse
+import gzip
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../server")
+)
+
+from exceptions import ParseException  # noqa: E402
+from variant import Variant  # noqa: E402
+
+var_re = re.compile("-|_|:|\\|")
+non_autosomes = set(["X", "Y", "XY", "MT"])
+
+
+class VariantBefore(object):
+    # the previous Variant class
+    def __init__(self, varstr):
+        s = var_re.split(varstr)
+        if len(s) != 4:
+            raise ParseException(
+                "variant needs to contain four fields, supported separators are - _ : |"
+            )
+        try:
+            chr = re.sub(r"^0", "", str(s[0]))
+            chr = (
+                chr.upper()
+                .replace("CHR", "")
+                .replace("23", "X")
+                .replace("24", "Y")
+                .replace("25", "XY")
+                .replace("26", "MT")
+            )
+            chr_int = int(chr)
+            if chr_int < 1 or chr_int > 26:
+                raise ValueError
+        except ValueError:
+            if chr not in non_autosomes:
+                raise ParseException("supported chromosomes: 1-26,X,Y,XY,MT")
+        try:
+            pos = int(s[1])
+        except ValueError:
+            raise ParseException("position must be an integer")
+        self.chr = chr
+        self.pos = pos
+        self.ref = s[2].upper()
+        self.alt = s[3].upper()
+        if not bool(re.match(r"[ACGT]+$", self.ref)) or not bool(
+            re.match(r"[ACGT]+$", self.alt)
+        ):
+            raise ParseException("only ACGT alleles are supported")
+        self.varid = "{}-{}-{}-{}".format(self.chr, self.pos, self.ref, self.alt)
+
+    def __eq__(self, other):
+        if not isinstance(other, VariantBefore):
+            return NotImplemented
+        return (
+            self.chr == other.chr
+            and self.pos == other.pos
+            and self.ref == other.ref
+            and self.alt == other.alt
+        )
+
+    def __hash__(self):
+        return hash(self.varid)
+
+    def __repr__(self):
+        return self.varid
+
+
+def read_cpras(path, n):
+    with gzip.open(path, "rt") as f:
+        h = {col: i for i, col in enumerate(f.readline().rstrip("\n").split("\t"))}
+        cols = [h["#chr"], h["pos"], h["ref"], h["alt"]]
+        cpras = []
+        for line in f:
+            s = line.rstrip("\n").split("\t")
+            cpras.append(tuple(s[i] for i in cols))
+            if len(cpras) == n:
+                break
+    return cpras
+
+
+def random_cpras(n):
+    random.seed(1)
+    return [
+        (
+            random.choice([str(i) for i in range(1, 23)] + ["X"]),
+            str(random.randint(1, 248000000)),
+            random.choice("ACGT"),
+            random.choice(["A", "C", "G", "T", "AT", "CTT"]),
+        )
+        for _ in range(n)
+    ]
+
+
+def bench(name, f, n, repeat):
+    best = min(timeit.repeat(f, number=1, repeat=repeat))
+    print(f"{name:<36} {best * 1000:>9.1f} ms {n / best / 1e6:>7.2f} M/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of Variant construction and hashing."
+    )
+    parser.add_argument("--gnomad", help="gnomAD tsv to read variants from")
+    parser.add_argument("-n", type=int, default=200000, help="number of variants")
+    parser.add_argument("--repeat", type=int, default=5, help="number of repeats")
+    args = parser.parse_args()
+
+    if args.gnomad is not None:
+        cpras = read_cpras(args.gnomad, args.n)
+    else:
+        cpras = random_cpras(args.n)
+    strings = ["-".join(cpra) for cpra in cpras]
+    n = len(cpras)
+
+    before = bench(
+        "construct before", lambda: [VariantBefore(s) for s in strings], n, args.repeat
+    )
+    after = bench(
+        "construct after", lambda: [Variant(s) for s in strings], n, args.repeat
+    )
+    print(f"  speedup {before / after:.2f}x")
+    after = bench(
+        "construct after, trusted rows",
+        lambda: [Variant.from_trusted(*cpra) for cpra in cpras],
+        n,
+        args.repeat,
+    )
+    print(f"  speedup {before / after:.2f}x")
+    before = bench(
+        "construct + str before",
+        lambda: [str(VariantBefore(s)) for s in strings],
+        n,
+        args.repeat,
+    )
+    after = bench(
+        "construct + str after, trusted rows",
+        lambda: [str(Variant.from_trusted(*cpra)) for cpra in cpras],
+        n,
+        args.repeat,
+    )
+    print(f"  speedup {before / after:.2f}x")
+
+    variants_before = [VariantBefore(s) for s in strings]
+    variants_after = [Variant(s) for s in strings]
+    keys_before = {v: i for i, v in enumerate(variants_before)}
+    keys_after = {v: i for i, v in enumerate(variants_after)}
+    # lookups with equal but not identical variants as when a query is looked up in a cache
+    lookups_before = [VariantBefore(s) for s in strings]
+    lookups_after = [Variant(s) for s in strings]
+    before = bench(
+        "dict build + lookup before",
+        lambda: (
+            {v: i for i, v in enumerate(variants_before)},
+            [keys_before[v] for v in lookups_before],
+        ),
+        n,
+        args.repeat,
+    )
+    after = bench(
+        "dict build + lookup after",
+        lambda: (
+            {v: i for i, v in enumerate(variants_after)},
+            [keys_after[v] for v in lookups_after],
+        ),
+        n,
+        args.repeat,
+    )
+    print(f"  speedup {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# builds the exact variant index read by server/data_access/variant_index.py
+# the index maps a packed (chr, pos, ref, alt) key to the BGZF virtual offset and row count
+# of each run of consecutive rows of the variant, and is written next to the data file as <file>.vidx.npy
+# the server ignores an index that is older than its data file, so rebuild after replacing a data file
+#
+# ran with:
+# ./build_variant_index.py /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.sites.tsv.bgz --chr \#chr
+# ./build_variant_index.py /mnt/disks/data/assoc_resources_public_version_20240219.tsv.gz
+# ./build_variant_index.py /mnt/disks/data/finemapped_resources_public_version_20240219.tsv.gz
+# ./build_variant_index.py /mnt/disks/data/ld_assoc.tsv.gz \
+# --chr tag_chr --pos tag_pos --ref tag_ref --alt tag_alt
+
+import argparse
+import gzip
+import os
+import struct
+import sys
+import timeit
+import zlib
+from array import array
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../server")
+)
+
+# the keys are computed with the server's variant_key so that lookups match the index
+from data_access.tabix import BGZF_HEADER_LEN  # noqa: E402
+from data_access.variant_index import INDEX_SUFFIX, variant_key  # noqa: E402
+
+
+def bgzf_lines(path):
+    """
+    Yields (virtual offset, line) for each line of a BGZF-compressed file.
+    """
+    partial = b""
+    line_vo = 0
+    with open(path, "rb") as f:
+        while True:
+            coffset = f.tell()
+            header = f.read(BGZF_HEADER_LEN)
+            if len(header) < BGZF_HEADER_LEN:
+                break
+            if header[12:14] != b"BC":
+                raise ValueError(f"{path} is not BGZF compressed")
+            (bsize,) = struct.unpack_from("<H", header, 16)
+            data = zlib.decompress(f.read(bsize + 1 - BGZF_HEADER_LEN)[:-8], -15)
+            pos = 0
+            while pos < len(data):
+                if not partial:
+                    line_vo = (coffset << 16) | pos
+                nl = data.find(b"\n", pos)
+                if nl == -1:
+                    partial += data[pos:]
+                    break
+                yield line_vo, partial + data[pos:nl]
+                partial = b""
+                pos = nl + 1
+    if partial:
+        yield line_vo, partial
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Script for building an exact variant index of a BGZF-compressed tab-delimited file."
+    )
+    parser.add_argument("input_file", help="BGZF-compressed file sorted by chr and pos")
+    parser.add_argument(
+        "--chr", help="chromosome column name in the input file", default="chr"
+    )
+    parser.add_argument(
+        "--pos", help="position column name in the input file", default="pos"
+    )
+    parser.add_argument(
+        "--ref", help="reference allele column name in the input file", default="ref"
+    )
+    parser.add_argument(
+        "--alt", help="alternate allele column name in the input file", default="alt"
+    )
+    args = parser.parse_args()
+
+    with gzip.open(args.input_file, "rt") as f:
+        line = f.readline()
+        # skip marker lines such as the one written by normalize_assoc.py
+        while line.startswith("##"):
+            line = f.readline()
+        h = {col: idx for idx, col in enumerate(line.rstrip("\n").split("\t"))}
+    cols = [h[args.chr], h[args.pos], h[args.ref], h[args.alt]]
+    max_split = max(cols) + 1
+
+    keys = array("Q")
+    offsets = array("Q")
+    counts = array("Q")
+    prev_key = None
+    n = 0
+    skipped = 0
+    start_time = timeit.default_timer()
+    for vo, line in bgzf_lines(args.input_file):
+        if line.startswith(b"#") or line == b"":
+            continue
+        d = line.decode().split("\t", max_split)
+        key = variant_key(d[cols[0]], int(d[cols[1]]), d[cols[2]], d[cols[3]])
+        n += 1
+        if key is None:
+            skipped += 1
+            prev_key = None
+            continue
+        if key == prev_key:
+            counts[-1] += 1
+        else:
+            keys.append(key)
+            offsets.append(vo)
+            counts.append(1)
+            prev_key = key
+        if n % 10000000 == 0:
+            print(
+                f"{n} rows, {round(n / (timeit.default_timer() - start_time))} rows/s"
+            )
+
+    key_arr = np.frombuffer(keys, dtype=np.uint64)
+    # stable so that runs of the same key stay in file order
+    order = np.argsort(key_arr, kind="stable")
+    out_file = args.input_file + INDEX_SUFFIX
+    tmp_file = out_file + ".tmp.npy"
+    index = np.lib.format.open_memmap(
+        tmp_file, mode="w+", dtype=np.uint64, shape=(3, len(keys))
+    )
+    index[0] = key_arr[order]
+    index[1] = np.frombuffer(offsets, dtype=np.uint64)[order]
+    index[2] = np.frombuffer(counts, dtype=np.uint64)[order]
+    index.flush()
+    del index
+    os.replace(tmp_file, out_file)
+    print(
+        f"{n} rows, {len(keys)} runs, {skipped} rows with unsupported chromosome or position skipped, "
+        + f"index written to {out_file} in {round(timeit.default_timer() - start_time)} seconds"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# adds the derived columns read by server/data_access/gnomad.py to a merged gnomAD exomes and genomes file:
+# popmax_pop, popmax_af, popmin_pop and popmin_af of each row if gnomad_tsv.py did not already export them,
+# and preferred, the source (exomes or genomes) preferred for the variant, which needs the exome and genome rows
+# the input must be sorted by chr, pos, ref and alt so that the rows of a variant are next to each other,
+# as in the merge step in gnomad_tsv.py
+#
+# ran with:
+# zcat gnomad.genomes.exomes.v4.0.sites.tsv.bgz | ./gnomad_derived_columns.py | bgzip -@4 > gnomad.genomes.exomes.v4.0.sites.derived.tsv.bgz && \
+# tabix -s 1 -b 2 -e 2 gnomad.genomes.exomes.v4.0.sites.derived.tsv.bgz && \
+# ./build_variant_index.py gnomad.genomes.exomes.v4.0.sites.derived.tsv.bgz --chr \#chr
+
+import argparse
+import sys
+
+POP_COLUMNS = ["popmax_pop", "popmax_af", "popmin_pop", "popmin_af"]
+
+
+def popmax_popmin(s, af_cols):
+    """
+    Returns the popmax and popmin columns of a row, the first population with the highest AF above 0
+    and the first population with the lowest AF below 1, or NA.
+    Must match the fallback in server/data_access/gnomad.py.
+    """
+    popmax_pop, popmax_af, popmax_value = "NA", "NA", 0.0
+    popmin_pop, popmin_af, popmin_value = "NA", "NA", 1.0
+    for pop, i in af_cols:
+        if s[i] in ("NA", ""):
+            continue
+        af = float(s[i])
+        if af > popmax_value:
+            popmax_pop, popmax_af, popmax_value = pop, s[i], af
+        if af < popmin_value:
+            popmin_pop, popmin_af, popmin_value = pop, s[i], af
+    return [popmax_pop, popmax_af, popmin_pop, popmin_af]
+
+
+def preferred(rows, h, an_col):
+    """
+    Returns the preferred source of a variant, exomes only if AN in exomes is higher than AN in genomes.
+    """
+    an = {s[h["genome_or_exome"]]: s[an_col] for s in rows}
+    if "g" not in an:
+        return "exomes"
+    if "e" in an and an["e"] not in ("NA", "") and an["g"] not in ("NA", ""):
+        if int(an["e"]) > int(an["g"]):
+            return "exomes"
+    return "genomes"
+
+
+def write_variant(rows, h, af_cols, add_pops, out):
+    pref = preferred(rows, h, h["AN"])
+    for s in rows:
+        if add_pops:
+            s.extend(popmax_popmin(s, af_cols))
+        s.append(pref)
+        out.write("\t".join(s) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add popmax, popmin and preferred columns to a merged gnomAD tsv."
+    )
+    parser.add_argument(
+        "--chr", default="#chr", help="chromosome column (default: %(default)s)"
+    )
+    args = parser.parse_args()
+
+    header = sys.stdin.readline().rstrip("\n").split("\t")
+    h = {col: i for i, col in enumerate(header)}
+    if "preferred" in h:
+        raise SystemExit("input already has the derived columns")
+    # population AF columns in file order, ties go to the first population
+    af_cols = [(col[3:], i) for i, col in enumerate(header) if col.startswith("AF_")]
+    add_pops = not all(col in h for col in POP_COLUMNS)
+    if add_pops:
+        header.extend(POP_COLUMNS)
+    header.append("preferred")
+    out = sys.stdout
+    out.write("\t".join(header) + "\n")
+
+    key_cols = [h[args.chr], h["pos"], h["ref"], h["alt"]]
+    rows = []
+    prev_key = None
+    for line in sys.stdin:
+        s = line.rstrip("\n").split("\t")
+        key = [s[i] for i in key_cols]
+        if key != prev_key and len(rows) > 0:
+            write_variant(rows, h, af_cols, add_pops, out)
+            rows = []
+        rows.append(s)
+        prev_key = key
+    if len(rows) > 0:
+        write_variant(rows, h, af_cols, add_pops, out)
+
+
+if __name__ == "__main__":
+    main()
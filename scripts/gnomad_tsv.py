@@ -13,8 +13,10 @@
 # <(sort -m -T . -k1,1V -k2,2g -k3,3 -k4,4 \
 # <(zcat gnomad.exomes.v4.0.sites.tsv.bgz | awk 'NR>1 {print $0"\te"}' | sort -T . -k1,1V -k2,2g -k3,3 -k4,4) \
 # <(zcat gnomad.genomes.v4.0.sites.tsv.bgz | awk 'NR>1 {print $0"\tg"}' | sort -T . -k1,1V -k2,2g -k3,3 -k4,4) \
-# ) | bgzip -@4 > gnomad.genomes.exomes.v4.0.sites.tsv.bgz && \
+# ) | ./gnomad_derived_columns.py | bgzip -@4 > gnomad.genomes.exomes.v4.0.sites.tsv.bgz && \
 # tabix -s 1 -b 2 -e 2 gnomad.genomes.exomes.v4.0.sites.tsv.bgz
+# gnomad_derived_columns.py adds the preferred column which needs both the exome and genome rows of a variant
+# (and popmax and popmin for files exported before they were added here)
 
 # to start a cluster:
 # (only use a high number of workers if sure that this works)
@@ -30,6 +32,8 @@
 import hail as hl
 
 DATA_TYPE = "genomes"
+# populations of the AF_ columns in export order
+POPULATIONS = ["afr", "amr", "asj", "eas", "fin", "mid", "nfe", "remaining", "sas"]
 
 
 def filter_table(table):
@@ -123,6 +127,23 @@ def annotate_table(table):
     )
 
 
+def annotate_popmax_popmin(table):
+    # the first population with the highest AF above 0 and the first population with the lowest AF below 1,
+    # missing otherwise, as computed by the server for files without these columns
+    afs = hl.array([table[f"AF_{pop}"] for pop in POPULATIONS])
+    pops = hl.literal(POPULATIONS)
+    max_i = hl.argmax(afs, unique=False)
+    min_i = hl.argmin(afs, unique=False)
+    has_max = hl.is_defined(max_i) & (afs[max_i] > 0)
+    has_min = hl.is_defined(min_i) & (afs[min_i] < 1)
+    return table.annotate(
+        popmax_pop=hl.or_missing(has_max, pops[max_i]),
+        popmax_af=hl.or_missing(has_max, afs[max_i]),
+        popmin_pop=hl.or_missing(has_min, pops[min_i]),
+        popmin_af=hl.or_missing(has_min, afs[min_i]),
+    )
+
+
 def export(table, outfile):
     table.select(
         "rsids",
@@ -141,6 +162,10 @@ def export(table, outfile):
         "most_severe",
         "gene_most_severe",
         "consequences",
+        "popmax_pop",
+        "popmax_af",
+        "popmin_pop",
+        "popmin_af",
     ).export(outfile)
 
 
@@ -152,7 +177,9 @@ table = filter_table(table)
 # rerun VEP
 # table = hl.vep(table, "gs://hail-eu-vep/vep95-GRCh38-loftee-gcloud.json")
 table = (
-    annotate_table(table).rename({"chr": "#chr"}).key_by("#chr", "pos", "ref", "alt")
+    annotate_popmax_popmin(annotate_table(table))
+    .rename({"chr": "#chr"})
+    .key_by("#chr", "pos", "ref", "alt")
 )
 export(
     table,
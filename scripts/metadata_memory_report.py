@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# reports the memory footprint of the preloaded trait and dataset catalogue (metadata_preload in config.py)
+# compared with the same tables held as one Python dict per row, and checks that every row
+# looked up from the catalogue equals the row read from the metadata db
+#
+# ran with:
+# ./metadata_memory_report.py /mnt/disks/data/meta_public_version_20240219.db
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../server")
+)
+
+from data_access.metadata import DATASET_COLUMNS, TRAIT_COLUMNS  # noqa: E402
+from data_access.metadata_catalogue import MetadataCatalogue  # noqa: E402
+
+
+def read_rows(db, table, columns):
+    conn = sqlite3.connect(db)
+    c = conn.execute(f"SELECT {columns} FROM {table}")
+    names = [d[0] for d in c.description]
+    rows = [dict(zip(names, row)) for row in c.fetchall()]
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Memory footprint of the preloaded metadata catalogue."
+    )
+    parser.add_argument("metadata_db", help="metadata sqlite db")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    start = timeit.default_timer()
+    catalogue = MetadataCatalogue(args.metadata_db, TRAIT_COLUMNS, DATASET_COLUMNS)
+    load_time = timeit.default_timer() - start
+    catalogue_traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    traits = read_rows(args.metadata_db, "trait", TRAIT_COLUMNS)
+    datasets = read_rows(args.metadata_db, "dataset", DATASET_COLUMNS)
+    dicts_traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    report = catalogue.memory_report()
+    print(json.dumps(report, indent=2))
+    print(f"loaded in {load_time:.2f} s")
+    print(f"catalogue (traced)  {catalogue_traced / 1e6:>9.2f} MB")
+    print(f"row dicts (traced)  {dicts_traced / 1e6:>9.2f} MB")
+
+    mismatches = 0
+    for row in traits:
+        if catalogue.trait.get((row["resource"], row["phenocode"])) != row:
+            mismatches += 1
+    for row in datasets:
+        if catalogue.dataset.get((row["dataset_id"],)) != row:
+            mismatches += 1
+    print(f"checked {len(traits) + len(datasets)} rows, {mismatches} mismatches")
+
+
+if __name__ == "__main__":
+    main()
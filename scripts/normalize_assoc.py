@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# rewrites an assoc or ld_assoc file so that the server only needs to parse floats:
+# assoc: missing (infinite) mlog10p values are calculated from beta and se
+# ld_assoc: beta is taken from the odds ratio when missing and mlog10p is calculated from pval
+# a marker line is written before the header so that the server can skip its fallback calculations
+#
+# ran with:
+# ./normalize_assoc.py assoc assoc.tsv.gz | bgzip -@4 > assoc.normalized.tsv.gz && \
+# tabix -s 5 -b 6 -e 6 assoc.normalized.tsv.gz
+# ./normalize_assoc.py ld_assoc ld_assoc.tsv.gz | bgzip -@4 > ld_assoc.normalized.tsv.gz && \
+# tabix -s 6 -b 7 -e 7 ld_assoc.normalized.tsv.gz
+
+import argparse
+import gzip
+import math
+import sys
+
+from scipy.stats import norm  # type: ignore
+
+# must match NORMALIZED_MARKER in server/data_access/assoc.py
+NORMALIZED_MARKER = "##normalized_assoc_format=1"
+# smallest pval in the ld_assoc (Open Targets) file
+MIN_PVAL = 5e-324
+
+
+def normalize_assoc_row(d, h):
+    mlogp = float(d[h["mlog10p"]])
+    if mlogp == math.inf and d[h["beta"]] != "NA":
+        # this is off when t distribution was used for the original
+        # but we don't have sample size available here to use t distribution
+        beta = float(d[h["beta"]])
+        sebeta = float(d[h["se"]])
+        mlogp = -norm.logsf(abs(beta) / sebeta) / math.log(10) - math.log10(2)
+        d[h["mlog10p"]] = repr(float(mlogp))
+    return d
+
+
+def normalize_ld_assoc_row(d, h):
+    beta_str = d[h["beta"]]
+    odds_ratio_str = d[h["odds_ratio"]]
+    try:
+        if beta_str != "None":
+            beta = float(beta_str)
+        elif odds_ratio_str != "None":
+            beta = math.log(float(odds_ratio_str))
+        else:  # there are missing effect sizes in the data
+            beta = 0
+    except ValueError:
+        print(
+            f"Could not parse beta or odds ratio: {beta_str} {odds_ratio_str}",
+            file=sys.stderr,
+        )
+        beta = 0
+    try:
+        overall_r2 = float(d[h["overall_r2"]])
+    except ValueError:
+        overall_r2 = 0
+    pval = float(d[h["pval"]])
+    mlogp = -math.log10(pval if pval > 0 else MIN_PVAL)
+    d[h["beta"]] = repr(float(beta))
+    d[h["overall_r2"]] = repr(float(overall_r2))
+    return d + [repr(mlogp)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Script for precomputing mlog10p and beta values in an assoc or ld_assoc file, writes to stdout."
+    )
+    parser.add_argument(
+        "type", choices=["assoc", "ld_assoc"], help="type of the input file"
+    )
+    parser.add_argument("input_file", help="gzipped assoc or ld_assoc file")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    with gzip.open(args.input_file, "rt") as f:
+        line = f.readline()
+        if line.startswith(NORMALIZED_MARKER):
+            raise ValueError(f"{args.input_file} is already normalized")
+        header = line.rstrip("\n").split("\t")
+        h = {col: idx for idx, col in enumerate(header)}
+        if args.type == "ld_assoc":
+            header = header + ["mlog10p"]
+        out.write(NORMALIZED_MARKER + "\n")
+        out.write("\t".join(header) + "\n")
+        normalize = (
+            normalize_assoc_row if args.type == "assoc" else normalize_ld_assoc_row
+        )
+        n = 0
+        for line in f:
+            d = normalize(line.rstrip("\n").split("\t"), h)
+            out.write("\t".join(d) + "\n")
+            n += 1
+            if n % 1000000 == 0:
+                print(f"{n} rows normalized", file=sys.stderr)
+    print(f"{n} rows normalized", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,39 @@
 # /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.sites.tsv.bgz \
 # /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.rsid.db \
 # --chr \#chr --pos pos --ref ref --alt alt --rs rsids
+#
+# converted to the integer-keyed format (read by the server when the db has the rsid_int table) with:
+# ./populate_rsid_sqlite.py --convert \
+# /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.rsid.db \
+# /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.rsid_int.db
+#
+# or built directly in the integer-keyed format with one worker per chromosome (needs the tabix index) with:
+# ./populate_rsid_sqlite.py --fast --workers 16 \
+# /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.sites.tsv.bgz \
+# /mnt/disks/data/gnomad/gnomad.genomes.exomes.v4.0.rsid_int.db \
+# --chr \#chr --pos pos --ref ref --alt alt --rs rsids
+# a failed fast build resumes from the completed chromosomes when run again with the same arguments
 
 import gzip
+import heapq
+import multiprocessing
+import os
+import re
+import shutil
+import sys
 import timeit
 import sqlite3
 import argparse
 
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../server")
+)
+
+from data_access.tabix import BGZFReader, TabixIndex  # noqa: E402
+from data_access.rsid_db import pack_locus  # noqa: E402
+
+RSID_NUMBER_REGEX = re.compile("rs([1-9][0-9]*)$")
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -20,25 +47,45 @@ def main():
     )
     parser.add_argument(
         "input_file",
-        help="variant annotation file with at least cpra columns and an rsid column",
+        help="variant annotation file with at least cpra columns and an rsid column, "
+        + "or with --convert an rsid sqlite3 db created by this script",
     )
     parser.add_argument("db_name", help="sqlite3 db file to be created or overwritten")
+    parser.add_argument("--chr", help="chromosome column name in the input file")
+    parser.add_argument("--pos", help="position column name in the input file")
+    parser.add_argument("--ref", help="reference allele column name in the input file")
+    parser.add_argument("--alt", help="alternate allele column name in the input file")
+    parser.add_argument("--rs", help="rsid(s) column name in the input file")
     parser.add_argument(
-        "--chr", help="chromosome column name in the input file", required=True
-    )
-    parser.add_argument(
-        "--pos", help="position column name in the input file", required=True
+        "--convert",
+        action="store_true",
+        help="write the rsid table of the input db to db_name in the integer-keyed format",
     )
     parser.add_argument(
-        "--ref", help="reference allele column name in the input file", required=True
+        "--fast",
+        action="store_true",
+        help="build db_name in the integer-keyed format from the tabix-indexed input file "
+        + "with one worker per chromosome, resuming from the completed chromosomes",
     )
     parser.add_argument(
-        "--alt", help="alternate allele column name in the input file", required=True
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of worker processes with --fast",
     )
     parser.add_argument(
-        "--rs", help="rsid(s) column name in the input file", required=True
+        "--runs-dir",
+        help="directory of the per-chromosome runs with --fast, default db_name.runs",
     )
     args = parser.parse_args()
+    if args.convert:
+        convert_rsids(args)
+        return
+    if None in [args.chr, args.pos, args.ref, args.alt, args.rs]:
+        parser.error("--chr, --pos, --ref, --alt and --rs are required")
+    if args.fast:
+        fast_populate_rsids(args)
+        return
     populate_rsids(args)
 
 
@@ -54,28 +101,34 @@ def generate_entries(args):
         h = {h: i for i, h in enumerate(f.readline().strip().split("\t"))}
         last_entry = None
         for line in f:
-            s = line.strip().split("\t")
-            rsids = s[h[args.rs]].split(",")
-            for rsid in rsids:
-                if not rsids[0].startswith("rs"):
-                    continue
-                current_entry = (
-                    s[h[args.chr]]
-                    .replace("chr", "")
-                    .replace("23", "X")
-                    .replace("24", "Y")
-                    .replace("25", "XY")
-                    .replace("26", "MT"),
-                    int(s[h[args.pos]]),
-                    s[h[args.ref]],
-                    s[h[args.alt]],
-                    rsid.strip(),
-                )
+            for current_entry in row_entries(line.strip().split("\t"), h, args):
                 if current_entry != last_entry:
                     yield current_entry
                     last_entry = current_entry
 
 
+def row_entries(s, h, args):
+    """
+    Yields the entries of a split row of the input file, see generate_entries.
+    """
+    rsids = s[h[args.rs]].split(",")
+    for rsid in rsids:
+        if not rsids[0].startswith("rs"):
+            continue
+        yield (
+            s[h[args.chr]]
+            .replace("chr", "")
+            .replace("23", "X")
+            .replace("24", "Y")
+            .replace("25", "XY")
+            .replace("26", "MT"),
+            int(s[h[args.pos]]),
+            s[h[args.ref]],
+            s[h[args.alt]],
+            rsid.strip(),
+        )
+
+
 def populate_rsids(args):
     """
     Creates and populates a sqlite3 table containing the chromosome, position, reference
@@ -103,5 +156,227 @@ def populate_rsids(args):
     conn.close()
 
 
+def with_variant_index(entries):
+    """
+    Yields (rsid number, index of the variant among the variants of the rsid, locus, ref, alt)
+    for (rsid number, locus, ref, alt) entries sorted by rsid number.
+    """
+    last_number = None
+    idx = 0
+    for number, locus, ref, alt in entries:
+        idx = idx + 1 if number == last_number else 0
+        last_number = number
+        yield (number, idx, locus, ref, alt)
+
+
+def create_int_table(c):
+    c.execute("DROP TABLE IF EXISTS main.rsid_int")
+    c.execute("""
+        CREATE TABLE main.rsid_int (
+            rsid integer, idx integer, locus integer, ref text, alt text,
+            PRIMARY KEY (rsid, idx)
+        ) WITHOUT ROWID
+        """)
+
+
+def generate_int_entries(conn, table, skipped):
+    """
+    Generator for entries of the integer-keyed table from the given rsid table.
+    Yields the number of the rsid, the packed locus, reference allele and alternate allele
+    sorted by rsid number, the variants of an rsid in the order of the rsid table.
+    Rsids and variants that cannot be packed are counted in skipped.
+    """
+    c = conn.execute(f"""
+        SELECT rsid, chr, pos, ref, alt
+        FROM {table}
+        ORDER BY CAST(substr(rsid, 3) AS INTEGER), rowid
+        """)
+    for rsid, chr, pos, ref, alt in c:
+        match = RSID_NUMBER_REGEX.match(rsid)
+        locus = pack_locus(chr, pos)
+        if match is None or locus is None:
+            skipped[0] += 1
+            continue
+        yield (int(match.group(1)), locus, ref, alt)
+
+
+def convert_rsids(args):
+    """
+    Creates and populates a WITHOUT ROWID sqlite3 table keyed by the rsid number
+    with the packed locus and alleles of each variant, from an existing rsid table.
+    """
+    start_time = timeit.default_timer()
+    conn = sqlite3.connect(args.db_name)
+    c = conn.cursor()
+    # the input db can also be db_name, the table is then added next to the rsid table
+    same_db = os.path.abspath(args.input_file) == os.path.abspath(args.db_name)
+    if not same_db:
+        c.execute("ATTACH DATABASE ? AS input", (args.input_file,))
+    create_int_table(c)
+    skipped = [0]
+    c.executemany(
+        "INSERT INTO main.rsid_int VALUES (?, ?, ?, ?, ?)",
+        with_variant_index(
+            generate_int_entries(
+                conn, "main.rsid" if same_db else "input.rsid", skipped
+            )
+        ),
+    )
+    conn.commit()
+    if not same_db:
+        c.execute("DETACH DATABASE input")
+    print(
+        str(timeit.default_timer() - start_time)
+        + " seconds converting rsids, "
+        + str(skipped[0])
+        + " rows skipped"
+    )
+    conn.close()
+
+
+def fast_connect(db_name):
+    """
+    Returns a connection for bulk loading a new db, without journal or syncs
+    so a db is only complete after it has been closed.
+    """
+    conn = sqlite3.connect(db_name)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+    conn.execute("PRAGMA cache_size = -1048576")
+    return conn
+
+
+def build_run(task):
+    """
+    Writes the entries of one chromosome to a run db sorted by rsid number, reading
+    and decompressing only the BGZF blocks of the chromosome. The run db is renamed
+    to its final name when complete so that a resumed build skips it.
+    Returns the chromosome, number of entries, number of skipped entries and seconds.
+    """
+    args, name, start, stop, run_file = task
+    start_time = timeit.default_timer()
+    with gzip.open(args.input_file, "rt") as f:
+        h = {h: i for i, h in enumerate(f.readline().strip().split("\t"))}
+    tmp_file = run_file + ".tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    conn = fast_connect(tmp_file)
+    conn.execute(
+        "CREATE TABLE run (rsid integer, seq integer, locus integer, ref text, alt text)"
+    )
+    counts = {"entries": 0, "skipped": 0}
+
+    def generate():
+        reader = BGZFReader(args.input_file)
+        last_entry = None
+        for _, line in reader.read_lines(start, stop):
+            s = line.decode().strip().split("\t")
+            if s[0].startswith("#") or s[h[args.chr]] != name:
+                continue
+            for entry in row_entries(s, h, args):
+                if entry == last_entry:
+                    continue
+                last_entry = entry
+                chr, pos, ref, alt, rsid = entry
+                match = RSID_NUMBER_REGEX.match(rsid)
+                locus = pack_locus(chr, pos)
+                if match is None or locus is None:
+                    counts["skipped"] += 1
+                    continue
+                # seq keeps the file order of the variants of an rsid
+                yield (int(match.group(1)), counts["entries"], locus, ref, alt)
+                counts["entries"] += 1
+        reader.close()
+
+    conn.executemany("INSERT INTO run VALUES (?, ?, ?, ?, ?)", generate())
+    # the run is read in this order when merging
+    conn.execute("CREATE INDEX run_idx ON run (rsid, seq)")
+    conn.commit()
+    conn.close()
+    os.replace(tmp_file, run_file)
+    return (
+        name,
+        counts["entries"],
+        counts["skipped"],
+        timeit.default_timer() - start_time,
+    )
+
+
+def read_run(run_file):
+    """
+    Yields the (rsid number, locus, ref, alt) entries of a run sorted by rsid number.
+    """
+    conn = sqlite3.connect(run_file)
+    for number, _, locus, ref, alt in conn.execute(
+        "SELECT rsid, seq, locus, ref, alt FROM run ORDER BY rsid, seq"
+    ):
+        yield (number, locus, ref, alt)
+    conn.close()
+
+
+def fast_populate_rsids(args):
+    """
+    Builds the integer-keyed rsid table from a tabix-indexed input file.
+    One worker per chromosome writes the entries of the chromosome to a run db, and the runs,
+    sorted by rsid number, are merged in chromosome order into the table in primary key order.
+    Completed runs are kept until the db has been written so that a failed build can resume.
+    """
+    start_time = timeit.default_timer()
+    index = TabixIndex(args.input_file + ".tbi")
+    runs_dir = args.runs_dir or args.db_name + ".runs"
+    os.makedirs(runs_dir, exist_ok=True)
+    tasks = []
+    run_files = []
+    for tid, name in enumerate(index.names):
+        chunks = index.chunks(name, 0, 2**29)
+        if len(chunks) == 0:
+            continue
+        run_file = os.path.join(runs_dir, f"{tid:03d}_{name}.db")
+        run_files.append(run_file)
+        if os.path.exists(run_file):
+            print(f"{name} already done, resuming")
+            continue
+        tasks.append((args, name, chunks[0][0], chunks[-1][1], run_file))
+
+    n = 0
+    with multiprocessing.Pool(max(1, min(args.workers, len(tasks)))) as pool:
+        for name, entries, skipped, seconds in pool.imap_unordered(build_run, tasks):
+            n += entries
+            print(
+                f"{name}: {entries} entries, {skipped} skipped, "
+                + f"{round(seconds)} seconds, {round(entries / seconds)} entries/s"
+            )
+    seconds = timeit.default_timer() - start_time
+    print(
+        f"{n} entries of {len(tasks)} chromosomes read in {round(seconds)} seconds, "
+        + f"{round(n / seconds)} entries/s"
+    )
+
+    merge_time = timeit.default_timer()
+    tmp_db = args.db_name + ".tmp"
+    if os.path.exists(tmp_db):
+        os.remove(tmp_db)
+    conn = fast_connect(tmp_db)
+    c = conn.cursor()
+    create_int_table(c)
+    # heapq.merge keeps the order of the runs for equal rsid numbers, i.e. the file order
+    entries = heapq.merge(*[read_run(f) for f in run_files], key=lambda e: e[0])
+    c.executemany(
+        "INSERT INTO main.rsid_int VALUES (?, ?, ?, ?, ?)",
+        with_variant_index(entries),
+    )
+    conn.commit()
+    (total,) = c.execute("SELECT COUNT(*) FROM main.rsid_int").fetchone()
+    conn.close()
+    os.replace(tmp_db, args.db_name)
+    shutil.rmtree(runs_dir)
+    seconds = timeit.default_timer() - merge_time
+    print(
+        f"{total} entries merged in {round(seconds)} seconds, {round(total / seconds)} entries/s, "
+        + f"{round(timeit.default_timer() - start_time)} seconds in total"
+    )
+
+
 if __name__ == "__main__":
     main()
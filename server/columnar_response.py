@@ -0,0 +1,110 @@
+from typing import Any, Mapping, Sequence
+
+# requested with {"format": "columnar"} in the request body or with this in the Accept header
+COLUMNAR_MEDIA_TYPE = "application/vnd.genetics-results.columnar+json"
+COLUMNAR_FORMAT_VERSION = 1
+
+RECORD_TYPES = ["assoc", "finemapped"]
+
+
+class _StringDictionary(object):
+    def __init__(self) -> None:
+        self.strings: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self._index[value] = index
+            self.strings.append(value)
+        return index
+
+
+def _strip_placeholders(
+    records: list[dict[str, Any]], placeholders: dict[str, Mapping[str, Any]]
+) -> tuple[list[dict[str, Any]], bool]:
+    """
+    Returns the records without placeholders and whether the placeholders were removed.
+    Records are left as they are unless they contain every placeholder.
+    """
+    if len(placeholders) == 0:
+        return records, False
+    kept = [
+        record for record in records if placeholders.get(record["resource"]) != record
+    ]
+    if len(records) - len(kept) != len(placeholders):
+        return records, False
+    return kept, True
+
+
+def _encode_records(
+    variant_records: list[dict[str, Any]],
+    placeholders: list[Mapping[str, Any]],
+    strings: _StringDictionary,
+) -> dict[str, Any]:
+    """
+    Encodes the records of each variant as one array per field over all variants.
+    Records of variant i are rows offsets[i] to offsets[i + 1] of the arrays.
+    Fields whose values are all strings are given as indices to the string dictionary,
+    null stands for a field the record does not have.
+    """
+    by_resource = {placeholder["resource"]: placeholder for placeholder in placeholders}
+    rows: list[dict[str, Any]] = []
+    offsets = [0]
+    has_placeholders = []
+    resources = []
+    for container in variant_records:
+        records, stripped = _strip_placeholders(container["data"], by_resource)
+        rows.extend(records)
+        offsets.append(len(rows))
+        has_placeholders.append(stripped)
+        resources.append([strings.encode(r) for r in container["resources"]])
+    fields = list(dict.fromkeys(field for row in rows for field in row))
+    columns = {field: [row.get(field) for row in rows] for field in fields}
+    encoded = []
+    for field, values in columns.items():
+        if all(value is None or isinstance(value, str) for value in values):
+            columns[field] = [
+                None if value is None else strings.encode(value) for value in values
+            ]
+            encoded.append(field)
+    return {
+        "offsets": offsets,
+        "has_placeholders": has_placeholders,
+        "placeholders": placeholders if any(has_placeholders) else [],
+        "resources": resources,
+        "columns": columns,
+        "encoded": encoded,
+    }
+
+
+def encode_columnar(
+    results: dict[str, Any], assoc_placeholders: Sequence[Mapping[str, Any]]
+) -> dict[str, Any]:
+    """
+    Returns the results response with the association and fine-mapping records
+    of all variants in struct-of-arrays form and their strings in one dictionary.
+    Association placeholders are sent once and each variant has a flag telling
+    whether the client should add them back, sorted by mlogp after the records.
+    The rest of the response is as in the default format.
+    """
+    strings = _StringDictionary()
+    placeholders = sorted(assoc_placeholders, key=lambda x: -float(x["mlogp"]))
+    encoded: dict[str, Any] = {
+        key: value for key, value in results.items() if key != "data"
+    }
+    encoded["data"] = [
+        {key: value for key, value in row.items() if key not in RECORD_TYPES}
+        for row in results["data"]
+    ]
+    for record_type in RECORD_TYPES:
+        encoded[record_type] = _encode_records(
+            [row[record_type] for row in results["data"]],
+            placeholders if record_type == "assoc" else [],
+            strings,
+        )
+    encoded["strings"] = strings.strings
+    encoded["format"] = "columnar"
+    encoded["format_version"] = COLUMNAR_FORMAT_VERSION
+    return encoded
@@ -1,250 +1,381 @@
 import gzip
 import math
-import subprocess
 from typing import Any
 import numpy as np
 import timeit
 from collections import OrderedDict as od, defaultdict as dd
 
-import scipy as sp  # type: ignore
 from datatypes import (
     AssociationResult,
     AssociationResults,
 )
+from data_access.assoc_store import AssocRow, ColumnarAssocStore
+from data_access.result_cache import ResultCache
+from data_access.row_decoder import compile_tuple_decoder, split_limit
+from data_access.tabix import open_tabix, parse_region
 from exceptions import DataException
 from variant import Variant
 from singleton import Singleton
 
 
+# files rewritten by scripts/normalize_assoc.py start with this line
+# and have mlog10p and beta precomputed
+NORMALIZED_MARKER = "##normalized_assoc_format=1"
+
+
+def read_headers(file: str) -> tuple[dict[str, int], bool]:
+    """
+    Returns the column indices of a gzipped data file
+    and whether the file has been normalized.
+    """
+    with gzip.open(file, "rt") as f:
+        line = f.readline()
+        normalized = line.startswith(NORMALIZED_MARKER)
+        if normalized:
+            line = f.readline()
+    headers = line.strip().split("\t")
+    return od({h: idx for idx, h in enumerate(headers)}), normalized
+
+
 class Datafetch(object, metaclass=Singleton):
     def _init_tabix(self) -> None:
-        with gzip.open(self.conf["assoc"]["file"], "rt") as f:
-            headers = f.readline().strip().split("\t")
-        self.assoc_headers: dict[str, int] = od(
-            {h: idx for idx, h in enumerate(headers)}
+        # "tabix" reads the assoc file, "columnar" the store written by scripts/assoc_to_columnar.py
+        self.assoc_backend = self.conf["assoc"].get("backend", "tabix")
+        self.assoc_headers: dict[str, int]
+        self.ld_assoc_headers: dict[str, int]
+        if self.assoc_backend == "tabix":
+            self.assoc_headers, self.assoc_normalized = read_headers(
+                self.conf["assoc"]["file"]
+            )
+            self.assoc_tabix = open_tabix(self.conf["assoc"]["file"], self.conf)
+            self.assoc_file = self.conf["assoc"]["file"]
+            self._assoc_fields = compile_tuple_decoder(
+                self.assoc_headers,
+                ["#resource", "dataset", "data_type", "trait", "beta", "se", "mlog10p"],
+            )
+            self._assoc_cpra = compile_tuple_decoder(
+                self.assoc_headers, ["chr", "pos", "ref", "alt"]
+            )
+            self._assoc_pra = compile_tuple_decoder(
+                self.assoc_headers, ["pos", "ref", "alt"]
+            )
+            self._assoc_ref_alt = compile_tuple_decoder(
+                self.assoc_headers, ["ref", "alt"]
+            )
+            self._assoc_pra_split = split_limit(
+                self.assoc_headers, ["pos", "ref", "alt"]
+            )
+        elif self.assoc_backend == "columnar":
+            self.assoc_store = ColumnarAssocStore(self.conf["assoc"]["columnar_dir"])
+            self.assoc_file = self.assoc_store.meta_file
+        else:
+            raise DataException(f"unknown assoc backend {self.assoc_backend}")
+        self.ld_assoc_headers, self.ld_assoc_normalized = read_headers(
+            self.conf["ld_assoc"]["file"]
+        )
+        self.ld_assoc_tabix = open_tabix(self.conf["ld_assoc"]["file"], self.conf)
+        self._ld_assoc_fields = compile_tuple_decoder(
+            self.ld_assoc_headers,
+            ["tag_ref", "tag_alt", "lead_pos", "lead_ref", "lead_alt", "#study_id"],
+            {"lead_pos": int},
         )
-        with gzip.open(self.conf["ld_assoc"]["file"], "rt") as f:
-            headers = f.readline().strip().split("\t")
-        self.ld_assoc_headers: dict[str, int] = od(
-            {h: idx for idx, h in enumerate(headers)}
+        self._ld_assoc_values = compile_tuple_decoder(
+            self.ld_assoc_headers,
+            (
+                ["overall_r2", "beta", "mlog10p"]
+                if self.ld_assoc_normalized
+                else ["overall_r2", "beta", "odds_ratio", "pval"]
+            ),
+            (
+                {"overall_r2": float, "beta": float, "mlog10p": float}
+                if self.ld_assoc_normalized
+                else {}
+            ),
         )
 
     def __init__(self, conf: dict[str, Any]) -> None:
         self.conf = conf
         self._init_tabix()
+        self.cache = ResultCache(conf)
         self.assoc_resource_ids = set(
             [resource["resource"] for resource in self.conf["assoc"]["resources"]]
         )
         # NA resource placeholder
         self.assoc_resource_ids.add("NA")
+        self.ignore_phenos = set(self.conf["ignore_phenos"]["assoc"])
+
+    def _is_shown(self, resource: str, dataset: str, trait: str) -> bool:
+        return (
+            resource in self.assoc_resource_ids  # skip results for resources not in the config
+            and (
+                len(self.ignore_phenos) == 0
+                or f"{dataset}:{trait}" not in self.ignore_phenos
+            )
+        )
+
+    def _make_assoc_result(
+        self,
+        resource: str,
+        dataset: str,
+        data_type: str,
+        phenocode: str,
+        beta: float,
+        sebeta: float,
+        mlogp: float,
+    ) -> AssociationResult:
+        return {
+            "ld": False,
+            "resource": resource,
+            "dataset": dataset,
+            "data_type": data_type,  # type: ignore
+            "phenocode": (
+                phenocode if data_type != "sQTL" else dataset + ":" + phenocode
+            ),
+            "mlogp": mlogp,
+            "beta": beta,
+            "sebeta": sebeta,
+        }
+
+    def _parse_assoc_row(self, d: list[str]) -> AssociationResult | None:
+        """
+        Returns the association result of a split assoc row
+        or None if the row is filtered out.
+        """
+        resource, dataset, data_type, phenocode, beta_str, se_str, mlogp_str = (
+            self._assoc_fields(d)
+        )
+        if (
+            not self._is_shown(resource, dataset, phenocode)
+            or beta_str
+            == "NA"  # TODO check when munging data in that there is no NA or allow and report it
+        ):
+            return None
+        beta = float(beta_str)
+        sebeta = float(se_str)
+        mlogp = float(mlogp_str)
+        # if mlog10p is missing, calculate it from beta and se
+        # this is off when t distribution was used for the original
+        # but we don't currently have sample size available here to use t distribution
+        # this will be a lot off if there would be case/control studies
+        # normalized files have mlog10p always available (scripts/normalize_assoc.py)
+        if mlogp == np.inf and not self.assoc_normalized:
+            from scipy.stats import norm  # type: ignore
+
+            mlogp = -norm.logsf(abs(beta) / sebeta) / math.log(10) - math.log10(2)
+        return self._make_assoc_result(
+            resource, dataset, data_type, phenocode, beta, sebeta, mlogp
+        )
+
+    def _assoc_store_results(self, rows: list[AssocRow]) -> list[AssociationResult]:
+        """
+        Returns the association results of rows from the columnar store that are not filtered out.
+        Rows without beta and infinite mlog10p values are handled when the store is written.
+        """
+        return [
+            self._make_assoc_result(*row)
+            for row in rows
+            if self._is_shown(row[0], row[1], row[3])
+        ]
+
+    def placeholders(self) -> list[AssociationResult]:
+        """
+        Returns one placeholder per resource so that the frontend
+        can show something when data are filtered.
+        """
+        return [
+            {
+                "resource": resource,
+                "dataset": "NA",
+                "data_type": "NA",
+                "phenocode": "NA",
+                # the NA resource will be before the others in sorted order
+                # feels hacky but is useful for the frontend
+                "mlogp": 0 if resource == "NA" else -1,
+                "beta": 0,
+                "sebeta": 0,
+            }
+            for resource in self.assoc_resource_ids
+        ]
 
-    def get_assoc_range(self, tabix_range: str) -> AssociationResults:
+    def get_assoc_range(
+        self, tabix_range: str, variants: frozenset[str] | None = None
+    ) -> AssociationResults:
+        """
+        Returns association results of the variants in the range.
+        If variants (chr-pos-ref-alt) are given, only rows of those variants are parsed.
+        """
         start_time = timeit.default_timer()
+        assoc = self.cache.get_or_compute(
+            self.assoc_file,
+            ("range", tabix_range, variants),
+            lambda: self._get_assoc_range(tabix_range, variants),
+        )
+        assoc["time"] = timeit.default_timer() - start_time
+        return assoc
+
+    def _get_assoc_range(
+        self, tabix_range: str, variants: frozenset[str] | None
+    ) -> AssociationResults:
         assoc = dd(lambda: {"data": [], "resources": set()})
-        try:
-            result = subprocess.run(
-                ["tabix", self.conf["assoc"]["file"], tabix_range],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as e:
-            raise DataException from e
-        if result.stderr:
-            raise DataException(result.stderr)
-        for row in result.stdout.strip().split("\n"):
-            if row == "":
-                continue
-            data = row.split("\t")
-            resource = data[self.assoc_headers["#resource"]]
-            if (
-                resource
-                in self.assoc_resource_ids  # skip results for resources not in the config
-                and data[self.assoc_headers["beta"]]
-                != "NA"  # TODO check when munging data in that there is no NA or allow and report it
-                and f"{data[self.assoc_headers['dataset']]}:{data[self.assoc_headers['trait']]}"
-                not in self.conf["ignore_phenos"]["assoc"]
+        # a range is on one chromosome so rows are matched by pos, ref and alt
+        wanted = (
+            None
+            if variants is None
+            else set(tuple(variant.split("-")[1:]) for variant in variants)
+        )
+        if self.assoc_backend == "columnar":
+            chr, beg, end = parse_region(tabix_range)
+            for pos, ref, alt, rows in self.assoc_store.fetch_range(
+                chr, beg + 1, end, wanted
             ):
-                dataset = data[self.assoc_headers["dataset"]]
-                data_type = data[self.assoc_headers["data_type"]]
-                phenocode = data[self.assoc_headers["trait"]]
-                beta = float(data[self.assoc_headers["beta"]])
-                sebeta = float(data[self.assoc_headers["se"]])
-                mlogp = float(data[self.assoc_headers["mlog10p"]])
-                # if mlog10p is missing, calculate it from beta and se
-                # this is off when t distribution was used for the original
-                # but we don't currently have sample size available here to use t distribution
-                # this will be a lot off if there would be case/control studies
-                # TODO prepare the data up front so that mlog10p is always available
-                if mlogp == np.inf:
-                    mlogp = -sp.stats.norm.logsf(abs(beta) / sebeta) / math.log(
-                        10
-                    ) - math.log10(2)
-                result = {
-                    "ld": False,
-                    "resource": resource,
-                    "dataset": dataset,
-                    "data_type": data_type,
-                    "phenocode": (
-                        phenocode if data_type != "sQTL" else dataset + ":" + phenocode
-                    ),
-                    "mlogp": mlogp,
-                    "beta": beta,
-                    "sebeta": sebeta,
-                }
-                variant = Variant(
-                    f"{data[self.assoc_headers['chr']]}-{data[self.assoc_headers['pos']]}-{data[self.assoc_headers['ref']]}-{data[self.assoc_headers['alt']]}"
-                )
-                assoc[str(variant)]["data"] = assoc[str(variant)]["data"] + [result]
-                assoc[str(variant)]["resources"].add(resource)
+                results = self._assoc_store_results(rows)
+                if len(results) > 0:
+                    variant = Variant.from_trusted(chr, pos, ref, alt)
+                    assoc[str(variant)]["data"] = results
+                    assoc[str(variant)]["resources"] = set(
+                        result["resource"] for result in results
+                    )
+        else:
+            variant_ids: dict[tuple[str, ...], str] = {}
+            for row in self.assoc_tabix.fetch(tabix_range):
+                if wanted is not None:
+                    # split only the leading columns to skip rows of other variants cheaply
+                    prefix = row.split("\t", self._assoc_pra_split)
+                    if self._assoc_pra(prefix) not in wanted:
+                        continue
+                data = row.split("\t")
+                result = self._parse_assoc_row(data)
+                if result is not None:
+                    cpra = self._assoc_cpra(data)
+                    if cpra not in variant_ids:
+                        variant_ids[cpra] = str(Variant.from_trusted(*cpra))
+                    variant_id = variant_ids[cpra]
+                    assoc[variant_id]["data"] = assoc[variant_id]["data"] + [result]
+                    assoc[variant_id]["resources"].add(result["resource"])
         # return also placeholders so that the frontend can show something when data are filtered
         for variant in assoc:
-            for resource in self.assoc_resource_ids:
-                placeholder: AssociationResult = {
-                    "resource": resource,
-                    "dataset": "NA",
-                    "data_type": "NA",
-                    "phenocode": "NA",
-                    # the NA resource will be before the others in sorted order
-                    # feels hacky but is useful for the frontend
-                    "mlogp": 0 if resource == "NA" else -1,
-                    "beta": 0,
-                    "sebeta": 0,
-                }
-                assoc[variant]["data"].append(placeholder)
+            assoc[variant]["data"].extend(self.placeholders())
             assoc[variant]["data"] = sorted(
                 assoc[variant]["data"], key=lambda x: -float(x["mlogp"])
             )
             assoc[variant]["resources"] = sorted(list(assoc[variant]["resources"]))
-        end_time = timeit.default_timer() - start_time
         return {
             "assoc": {
-                "data": assoc,
+                "data": dict(assoc),
             },
-            "time": end_time,
+            "time": 0,
         }
 
-    def get_assoc(self, variant: Variant) -> AssociationResults:
-        start_time = timeit.default_timer()
+    def _get_assoc_from_rows(
+        self, variant: Variant, rows: list[str]
+    ) -> AssociationResults:
         assoc: list[AssociationResult] = []
-        resources = set()
-        try:
-            result = subprocess.run(
-                [
-                    "tabix",
-                    self.conf["assoc"]["file"],
-                    f"{variant.chr}:{variant.pos}-{variant.pos}",
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as e:
-            raise DataException from e
-        if result.stderr:
-            raise DataException(result.stderr)
-        for row in result.stdout.strip().split("\n"):
-            if row == "":
-                continue
+        for row in rows:
             d = row.split("\t")
-            ref = d[self.assoc_headers["ref"]]
-            alt = d[self.assoc_headers["alt"]]
-            resource = d[self.assoc_headers["#resource"]]
-            if (
-                ref == variant.ref
-                and alt == variant.alt
-                and resource
-                in self.assoc_resource_ids  # skip results for resources not in the config
-                and d[self.assoc_headers["beta"]]
-                != "NA"  # TODO check when munging data in that there is no NA or allow and report it
-                and f"{d[self.assoc_headers['dataset']]}:{d[self.assoc_headers['trait']]}"
-                not in self.conf["ignore_phenos"]["assoc"]
-            ):
-                dataset = d[self.assoc_headers["dataset"]]
-                data_type = d[self.assoc_headers["data_type"]]
-                phenocode = d[self.assoc_headers["trait"]]
-                beta = float(d[self.assoc_headers["beta"]])
-                sebeta = float(d[self.assoc_headers["se"]])
-                mlogp = float(d[self.assoc_headers["mlog10p"]])
-                # if mlog10p is missing, calculate it from beta and se
-                # this is off when t distribution was used for the original
-                # but we don't currently have sample size available here to use t distribution
-                # this will be a lot off if there would be case/control studies
-                # TODO prepare the data up front so that mlog10p is always available
-                if mlogp == np.inf:
-                    mlogp = -sp.stats.norm.logsf(abs(beta) / sebeta) / math.log(
-                        10
-                    ) - math.log10(2)
-                assoc.append(
-                    {
-                        "ld": False,
-                        "resource": resource,
-                        "dataset": dataset,
-                        "data_type": data_type,
-                        "phenocode": (
-                            phenocode
-                            if data_type != "sQTL"
-                            else dataset + ":" + phenocode
-                        ),
-                        "mlogp": mlogp,
-                        "beta": beta,
-                        "sebeta": sebeta,
-                    }
-                )
-                resources.add(resource)
+            if self._assoc_ref_alt(d) == (variant.ref, variant.alt):
+                result = self._parse_assoc_row(d)
+                if result is not None:
+                    assoc.append(result)
+        return self._get_assoc_from_results(variant, assoc)
+
+    def _get_assoc_from_results(
+        self, variant: Variant, assoc: list[AssociationResult]
+    ) -> AssociationResults:
+        resources = set(result["resource"] for result in assoc)
         # return also placeholders so that the frontend can show something when data are filtered
-        for resource in self.assoc_resource_ids:
-            placeholder: AssociationResult = {
-                "resource": resource,
-                "dataset": "NA",
-                "data_type": "NA",
-                "phenocode": "NA",
-                # the NA resource will be before the others in sorted order
-                # feels hacky but is useful for the frontend
-                "mlogp": 0 if resource == "NA" else -1,
-                "beta": 0,
-                "sebeta": 0,
-            }
-            assoc.append(placeholder)
+        assoc.extend(self.placeholders())
         assoc = sorted(assoc, key=lambda x: -float(x["mlogp"]))
-        end_time = timeit.default_timer() - start_time
         return {
             "variant": str(variant),
             "assoc": {
                 "data": assoc,
                 "resources": sorted(list(resources)),
             },
-            "time": end_time,
+            "time": 0,
         }
 
-    def get_ld_assoc(self, variant: Variant) -> AssociationResults:
+    def _get_assoc_cached(
+        self, variants: list[Variant]
+    ) -> dict[Variant, AssociationResults]:
+        """
+        Returns association results for each variant from the cache
+        or from the data file for variants that are not cached.
+        """
+
+        def compute(variants: list[Variant]) -> dict[Variant, AssociationResults]:
+            if self.assoc_backend == "columnar":
+                store_rows = self.assoc_store.fetch_variants(
+                    [
+                        (variant.chr, variant.pos, variant.ref, variant.alt)
+                        for variant in variants
+                    ]
+                )
+                return {
+                    variant: self._get_assoc_from_results(
+                        variant,
+                        self._assoc_store_results(
+                            store_rows[
+                                (variant.chr, variant.pos, variant.ref, variant.alt)
+                            ]
+                        ),
+                    )
+                    for variant in variants
+                }
+            rows = self.assoc_tabix.fetch_variants(
+                [
+                    (variant.chr, variant.pos, variant.ref, variant.alt)
+                    for variant in variants
+                ]
+            )
+            return {
+                variant: self._get_assoc_from_rows(
+                    variant, rows[(variant.chr, variant.pos, variant.ref, variant.alt)]
+                )
+                for variant in variants
+            }
+
+        return self.cache.get_or_compute_many(self.assoc_file, variants, compute)
+
+    def get_assoc(self, variant: Variant) -> AssociationResults:
         start_time = timeit.default_timer()
+        assoc = self._get_assoc_cached([variant])[variant]
+        assoc["time"] = timeit.default_timer() - start_time
+        return assoc
+
+    def _parse_ld_assoc_values(self, d: list[str]) -> tuple[float, float, float]:
+        """
+        Returns overall r2, beta and mlog10p of a split ld_assoc row that has not been normalized.
+        """
+        overall_r2_str, beta_str, odds_ratio_str, pval_str = self._ld_assoc_values(d)
+        overall_r2: float
+        try:
+            overall_r2 = float(overall_r2_str)
+        except ValueError:
+            overall_r2 = 0
+        beta: float
+        try:
+            if beta_str != "None":
+                beta = float(beta_str)
+            elif odds_ratio_str != "None":
+                beta = math.log(float(odds_ratio_str))
+            else:  # there are missing effect sizes in the data
+                beta = 0
+        except ValueError:
+            print(f"Could not parse beta or odds ratio: {beta_str} {odds_ratio_str}")
+            beta = 0
+        mlogp = -math.log10(float(pval_str))
+        if mlogp == np.inf:
+            mlogp = -math.log10(5e-324)  # this is the smallest number in the ot file
+        return overall_r2, beta, mlogp
+
+    def _get_ld_assoc_from_rows(
+        self, variant: Variant, rows: list[str]
+    ) -> AssociationResults:
         assoc: list[AssociationResult] = []
         resources = set()
-        try:
-            result = subprocess.run(
-                [
-                    "tabix",
-                    self.conf["ld_assoc"]["file"],
-                    f"{variant.chr}:{variant.pos}-{variant.pos}",
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as e:
-            raise DataException from e
-        if result.stderr:
-            raise DataException(result.stderr)
-        for row in result.stdout.strip().split("\n"):
-            if row == "":
-                continue
+        for row in rows:
             d = row.split("\t")
-            ref = d[self.ld_assoc_headers["tag_ref"]]
-            alt = d[self.ld_assoc_headers["tag_alt"]]
-            lead_pos = int(d[self.ld_assoc_headers["lead_pos"]])
-            lead_ref = d[self.ld_assoc_headers["lead_ref"]]
-            lead_alt = d[self.ld_assoc_headers["lead_alt"]]
+            ref, alt, lead_pos, lead_ref, lead_alt, phenocode = self._ld_assoc_fields(d)
             resource = "Open_Targets"  # TODO include in data file
             if (
                 ref == variant.ref
@@ -254,31 +385,11 @@ class Datafetch(object, metaclass=Singleton):
             ):
                 dataset = "Open_Targets_22.09"  # TODO include in data file
                 data_type = "GWAS"  # TODO include in data file
-                phenocode = d[self.ld_assoc_headers["#study_id"]]
-                beta_str = d[self.ld_assoc_headers["beta"]]
-                odds_ratio_str = d[self.ld_assoc_headers["odds_ratio"]]
-                try:
-                    overall_r2 = float(d[self.ld_assoc_headers["overall_r2"]])
-                except ValueError:
-                    overall_r2 = 0
-                try:
-                    if beta_str != "None":
-                        beta = float(beta_str)
-                    elif odds_ratio_str != "None":
-                        beta = math.log(float(odds_ratio_str))
-                    else:  # there are missing effect sizes in the data
-                        beta = 0
-                except ValueError:
-                    print(
-                        f"Could not parse beta or odds ratio: {beta_str} {odds_ratio_str}"
-                    )
-                    beta = 0
-                mlogp = -math.log10(float(d[self.ld_assoc_headers["pval"]]))
-                if mlogp == np.inf:
-                    mlogp = -math.log10(
-                        5e-324
-                    )  # this is the smallest number in the ot file
-                result = {
+                if self.ld_assoc_normalized:
+                    overall_r2, beta, mlogp = self._ld_assoc_values(d)
+                else:
+                    overall_r2, beta, mlogp = self._parse_ld_assoc_values(d)
+                result: AssociationResult = {
                     "ld": True,
                     "resource": resource,
                     "dataset": dataset,
@@ -304,20 +415,50 @@ class Datafetch(object, metaclass=Singleton):
                 assoc.append(result)
                 resources.add(resource)
         assoc = sorted(assoc, key=lambda x: -float(x["mlogp"]))
-        end_time = timeit.default_timer() - start_time
         return {
             "variant": str(variant),
             "assoc": {
                 "data": assoc,
                 "resources": sorted(list(resources)),
             },
-            "time": end_time,
+            "time": 0,
         }
 
-    def get_assoc_and_ld_assoc(self, variant: Variant) -> AssociationResults:
-        assoc = self.get_assoc(variant)
-        ld_assoc = self.get_ld_assoc(variant)
-        # merge the two results
+    def _get_ld_assoc_cached(
+        self, variants: list[Variant]
+    ) -> dict[Variant, AssociationResults]:
+        """
+        Returns LD association results for each variant from the cache
+        or from the data file for variants that are not cached.
+        """
+
+        def compute(variants: list[Variant]) -> dict[Variant, AssociationResults]:
+            rows = self.ld_assoc_tabix.fetch_variants(
+                [
+                    (variant.chr, variant.pos, variant.ref, variant.alt)
+                    for variant in variants
+                ]
+            )
+            return {
+                variant: self._get_ld_assoc_from_rows(
+                    variant, rows[(variant.chr, variant.pos, variant.ref, variant.alt)]
+                )
+                for variant in variants
+            }
+
+        return self.cache.get_or_compute_many(
+            self.conf["ld_assoc"]["file"], variants, compute
+        )
+
+    def get_ld_assoc(self, variant: Variant) -> AssociationResults:
+        start_time = timeit.default_timer()
+        assoc = self._get_ld_assoc_cached([variant])[variant]
+        assoc["time"] = timeit.default_timer() - start_time
+        return assoc
+
+    def merge_assoc_and_ld_assoc(
+        self, assoc: AssociationResults, ld_assoc: AssociationResults
+    ) -> AssociationResults:
         assoc["assoc"]["data"].extend(ld_assoc["assoc"]["data"])
         assoc["assoc"]["resources"].extend(ld_assoc["assoc"]["resources"])
         # sort by mlogp
@@ -325,3 +466,44 @@ class Datafetch(object, metaclass=Singleton):
             assoc["assoc"]["data"], key=lambda x: -float(x["mlogp"])
         )
         return assoc
+
+    def get_assoc_and_ld_assoc(self, variant: Variant) -> AssociationResults:
+        assoc = self.get_assoc(variant)
+        ld_assoc = self.get_ld_assoc(variant)
+        # merge the two results
+        return self.merge_assoc_and_ld_assoc(assoc, ld_assoc)
+
+    def get_ld_assoc_many(self, variants: list[Variant]) -> dict[str, Any]:
+        """
+        Returns LD association results for each of the given variants,
+        keyed by variant, reading the data file once for all variants that are not cached.
+        """
+        start_time = timeit.default_timer()
+        ld_assoc = self._get_ld_assoc_cached(variants)
+        end_time = timeit.default_timer() - start_time
+        return {
+            "assoc": {variant: ld_assoc[variant] for variant in variants},
+            "time": end_time,
+        }
+
+    def get_assoc_many(
+        self, variants: list[Variant], include_ld: bool = True
+    ) -> dict[str, Any]:
+        """
+        Returns association results for each of the given variants,
+        keyed by variant, reading each data file once for all variants that are not cached.
+        LD association results are merged in unless include_ld is False.
+        """
+        start_time = timeit.default_timer()
+        assoc = self._get_assoc_cached(variants)
+        if include_ld:
+            ld_assoc = self._get_ld_assoc_cached(variants)
+            for variant in variants:
+                assoc[variant] = self.merge_assoc_and_ld_assoc(
+                    assoc[variant], ld_assoc[variant]
+                )
+        end_time = timeit.default_timer() - start_time
+        return {
+            "assoc": {variant: assoc[variant] for variant in variants},
+            "time": end_time,
+        }
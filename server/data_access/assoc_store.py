@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+from typing import Any, Iterator
+
+import numpy as np
+
+from exceptions import DataException
+
+# written by scripts/assoc_to_columnar.py
+STORE_FORMAT = "assoc_columnar"
+STORE_VERSION = 1
+
+# resource, dataset, data_type, trait, beta, se, mlog10p
+AssocRow = tuple[str, str, str, str, float, float, float]
+
+VARIANT_COLUMNS = ["var_pos", "var_start", "allele_offsets", "alleles"]
+ROW_COLUMNS = ["resource", "dataset", "data_type", "trait", "beta", "se", "mlog10p"]
+
+
+class ColumnarAssocStore(object):
+    """
+    Reads association rows from a directory of NumPy arrays written by scripts/assoc_to_columnar.py.
+    The arrays of each chromosome are memory-mapped on first use.
+    Variants are sorted by position and point to a contiguous block of rows,
+    string columns are dictionary-encoded and numeric columns are stored as float64,
+    so lookups read the rows without parsing.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.meta_file = os.path.join(path, "meta.json")
+        with open(self.meta_file) as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT or meta.get("version") != STORE_VERSION:
+            raise DataException(
+                f"{path} is not a version {STORE_VERSION} columnar association store"
+            )
+        self.dictionaries: dict[str, list[str]] = meta["dictionaries"]
+        self.chromosomes: set[str] = set(meta["chromosomes"])
+        self._columns: dict[str, dict[str, np.ndarray[Any, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _chr_columns(self, chr: str) -> dict[str, np.ndarray[Any, Any]] | None:
+        if chr not in self.chromosomes:
+            return None
+        if chr not in self._columns:
+            with self._lock:
+                if chr not in self._columns:
+                    self._columns[chr] = {
+                        column: np.load(
+                            os.path.join(self.path, chr, column + ".npy"),
+                            mmap_mode="r",
+                        )
+                        for column in VARIANT_COLUMNS + ROW_COLUMNS
+                    }
+        return self._columns[chr]
+
+    def _alleles(self, cols: dict[str, np.ndarray[Any, Any]], i: int) -> list[str]:
+        offsets = cols["allele_offsets"]
+        return bytes(cols["alleles"][offsets[i] : offsets[i + 1]]).decode().split("\t")
+
+    def _rows(self, cols: dict[str, np.ndarray[Any, Any]], i: int) -> list[AssocRow]:
+        start = cols["var_start"][i]
+        end = cols["var_start"][i + 1]
+        decoded = [
+            [self.dictionaries[column][code] for code in cols[column][start:end].tolist()]
+            for column in ["resource", "dataset", "data_type", "trait"]
+        ]
+        return list(
+            zip(
+                *decoded,
+                cols["beta"][start:end].tolist(),
+                cols["se"][start:end].tolist(),
+                cols["mlog10p"][start:end].tolist(),
+            )
+        )
+
+    def fetch_variants(
+        self, variants: list[tuple[str, int, str, str]]
+    ) -> dict[tuple[str, int, str, str], list[AssocRow]]:
+        """
+        Returns the rows of each (chr, pos, ref, alt) variant, variants not in the store get an empty list.
+        """
+        result: dict[tuple[str, int, str, str], list[AssocRow]] = {
+            variant: [] for variant in variants
+        }
+        by_chr: dict[str, list[tuple[str, int, str, str]]] = {}
+        for variant in result:
+            by_chr.setdefault(variant[0], []).append(variant)
+        for chr, chr_variants in by_chr.items():
+            cols = self._chr_columns(chr)
+            if cols is None:
+                continue
+            positions = np.array([variant[1] for variant in chr_variants])
+            lows = np.searchsorted(cols["var_pos"], positions, side="left").tolist()
+            highs = np.searchsorted(cols["var_pos"], positions, side="right").tolist()
+            for variant, low, high in zip(chr_variants, lows, highs):
+                for i in range(low, high):
+                    if self._alleles(cols, i) == [variant[2], variant[3]]:
+                        result[variant].extend(self._rows(cols, i))
+        return result
+
+    def fetch_range(
+        self,
+        chr: str,
+        start: int,
+        end: int,
+        variants: set[tuple[str, ...]] | None = None,
+    ) -> Iterator[tuple[int, str, str, list[AssocRow]]]:
+        """
+        Yields (pos, ref, alt, rows) of each variant with start <= pos <= end (1-based) in position order.
+        If variants are given as (pos, ref, alt) strings, only rows of those variants are decoded.
+        """
+        cols = self._chr_columns(chr)
+        if cols is None:
+            return
+        low = int(np.searchsorted(cols["var_pos"], start, side="left"))
+        high = int(np.searchsorted(cols["var_pos"], end, side="right"))
+        for i, pos in enumerate(cols["var_pos"][low:high].tolist(), low):
+            ref, alt = self._alleles(cols, i)
+            if variants is not None and (str(pos), ref, alt) not in variants:
+                continue
+            yield pos, ref, alt, self._rows(cols, i)
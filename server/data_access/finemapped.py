@@ -1,6 +1,4 @@
 import gzip
-import sqlite3
-import subprocess
 from typing import Any
 import timeit
 from collections import OrderedDict as od, defaultdict as dd
@@ -9,7 +7,9 @@ from datatypes import (
     FineMappedResult,
     FineMappedResults,
 )
-from exceptions import DataException
+from data_access.result_cache import ResultCache
+from data_access.row_decoder import compile_tuple_decoder, split_limit
+from data_access.tabix import open_tabix
 from variant import Variant
 from singleton import Singleton
 
@@ -19,149 +19,207 @@ class Finemapped(object, metaclass=Singleton):
         with gzip.open(self.conf["finemapped"]["file"], "rt") as f:
             headers = f.readline().strip().split("\t")
         self.headers: dict[str, int] = od({h: idx for idx, h in enumerate(headers)})
+        self._decode_row = compile_tuple_decoder(
+            self.headers,
+            [
+                "#resource",
+                "dataset",
+                "data_type",
+                "trait",
+                "mlog10p",
+                "beta",
+                "se",
+                "pip",
+                "cs_size",
+                "cs_min_r2",
+            ],
+            {
+                "mlog10p": float,
+                "beta": float,
+                "se": float,
+                "pip": float,
+                "cs_size": int,
+                "cs_min_r2": float,
+            },
+        )
+        self._cpra = compile_tuple_decoder(self.headers, ["chr", "pos", "ref", "alt"])
+        self._pra = compile_tuple_decoder(self.headers, ["pos", "ref", "alt"])
+        self._ref_alt = compile_tuple_decoder(self.headers, ["ref", "alt"])
+        self._pra_split = split_limit(self.headers, ["pos", "ref", "alt"])
+        self._resource_col = self.headers["#resource"]
+        self.tabix = open_tabix(self.conf["finemapped"]["file"], self.conf)
 
     def __init__(self, conf: dict[str, Any]) -> None:
         self.conf = conf
         self._init_tabix()
-        self.rsid_conn: dict[int, sqlite3.Connection] = dd(
-            lambda: sqlite3.connect(conf["finemapped"]["metadata_db"])
-        )
+        self.cache = ResultCache(conf)
         self.finemapped_resources = set(
             [resource["resource"] for resource in self.conf["finemapped"]["resources"]]
         )
 
-    def get_finemapped_range(self, tabix_range: str) -> FineMappedResults:
+    def _parse_finemapped_row(self, data: list[str]) -> FineMappedResult | None:
+        """
+        Returns the fine-mapping result of a split row
+        or None if the resource of the row is not in the config.
+        """
+        resource = data[self._resource_col]
+        # skip results for resources not in the config
+        if resource not in self.finemapped_resources:
+            return None
+        (
+            resource,
+            dataset,
+            data_type,
+            phenocode,
+            mlog10p,
+            beta,
+            se,
+            pip,
+            cs_size,
+            cs_min_r2,
+        ) = self._decode_row(data)
+        return {
+            "resource": resource,
+            "dataset": dataset,
+            "data_type": data_type,
+            "phenocode": (
+                phenocode if data_type != "sQTL" else dataset + ":" + phenocode
+            ),
+            "mlog10p": mlog10p,
+            "beta": beta,
+            "se": se,
+            "pip": pip,
+            "cs_size": cs_size,
+            "cs_min_r2": cs_min_r2,
+        }
+
+    def _ordered_resources(self, found_resources: set[str]) -> list[str]:
+        # keep order of resources from the config
+        # TODO why not doing the same in assoc?
+        return [
+            resource["resource"]
+            for resource in self.conf["finemapped"]["resources"]
+            if resource["resource"] in found_resources
+        ]
+
+    def get_finemapped_range(
+        self, tabix_range: str, variants: frozenset[str] | None = None
+    ) -> FineMappedResults:
+        """
+        Returns fine-mapping results of the variants in the range.
+        If variants (chr-pos-ref-alt) are given, only rows of those variants are parsed.
+        """
         start_time = timeit.default_timer()
+        finemapped = self.cache.get_or_compute(
+            self.conf["finemapped"]["file"],
+            ("range", tabix_range, variants),
+            lambda: self._get_finemapped_range(tabix_range, variants),
+        )
+        finemapped["time"] = timeit.default_timer() - start_time
+        return finemapped
+
+    def _get_finemapped_range(
+        self, tabix_range: str, variants: frozenset[str] | None
+    ) -> FineMappedResults:
         finemapped = dd(lambda: {"data": [], "resources": set()})
-        try:
-            result = subprocess.run(
-                [
-                    "tabix",
-                    self.conf["finemapped"]["file"],
-                    tabix_range,
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as e:
-            raise DataException from e
-        if result.stderr:
-            raise DataException(result.stderr)
-        for row in result.stdout.strip().split("\n"):
-            if row == "":
-                continue
+        # a range is on one chromosome so rows are matched by pos, ref and alt
+        wanted = (
+            None
+            if variants is None
+            else set(tuple(variant.split("-")[1:]) for variant in variants)
+        )
+        variant_ids: dict[tuple[str, ...], str] = {}
+        for row in self.tabix.fetch(tabix_range):
+            if wanted is not None:
+                # split only the leading columns to skip rows of other variants cheaply
+                if self._pra(row.split("\t", self._pra_split)) not in wanted:
+                    continue
             data = row.split("\t")
-            resource = data[self.headers["#resource"]]
-            if (
-                # skip results for resources not in the config
-                resource
-                in self.finemapped_resources
-            ):
-                data_type = data[self.headers["data_type"]]
-                dataset = data[self.headers["dataset"]]
-                phenocode = data[self.headers["trait"]]
-                result: FineMappedResult = {
-                    "resource": resource,
-                    "dataset": dataset,
-                    "data_type": data_type,
-                    "phenocode": (
-                        phenocode if data_type != "sQTL" else dataset + ":" + phenocode
-                    ),
-                    "mlog10p": float(data[self.headers["mlog10p"]]),
-                    "beta": float(data[self.headers["beta"]]),
-                    "se": float(data[self.headers["se"]]),
-                    "pip": float(data[self.headers["pip"]]),
-                    "cs_size": int(data[self.headers["cs_size"]]),
-                    "cs_min_r2": float(data[self.headers["cs_min_r2"]]),
-                }
-                variant = Variant(
-                    f"{data[self.headers['chr']]}-{data[self.headers['pos']]}-{data[self.headers['ref']]}-{data[self.headers['alt']]}"
-                )
-                finemapped[str(variant)]["data"] = finemapped[str(variant)]["data"] + [
-                    result
-                ]
-                finemapped[str(variant)]["resources"].add(resource)
+            result = self._parse_finemapped_row(data)
+            if result is not None:
+                cpra = self._cpra(data)
+                if cpra not in variant_ids:
+                    variant_ids[cpra] = str(Variant.from_trusted(*cpra))
+                variant = variant_ids[cpra]
+                finemapped[variant]["data"] = finemapped[variant]["data"] + [result]
+                finemapped[variant]["resources"].add(result["resource"])
 
         for variant in finemapped:
             finemapped[variant]["data"] = sorted(
                 finemapped[variant]["data"], key=lambda x: -float(x["pip"])
             )
-            # keep order of resources from the config
-            # TODO why not doing the same in assoc?
-            finemapped[str(variant)]["resources"] = [
-                resource["resource"]
-                for resource in self.conf["finemapped"]["resources"]
-                if resource["resource"] in finemapped[str(variant)]["resources"]
-            ]
-        end_time = timeit.default_timer() - start_time
+            finemapped[str(variant)]["resources"] = self._ordered_resources(
+                finemapped[str(variant)]["resources"]
+            )
         return {
             "finemapped": {
-                "data": finemapped,
+                "data": dict(finemapped),
             },
-            "time": end_time,
+            "time": 0,
         }
 
-    def get_finemapped(self, variant: Variant) -> FineMappedResults:
-        start_time = timeit.default_timer()
+    def _get_finemapped_from_rows(
+        self, variant: Variant, rows: list[str]
+    ) -> FineMappedResults:
         finemapped: list[FineMappedResult] = []
         found_resources = set()
-        try:
-            result = subprocess.run(
-                [
-                    "tabix",
-                    self.conf["finemapped"]["file"],
-                    f"{variant.chr}:{variant.pos}-{variant.pos}",
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as e:
-            raise DataException from e
-        if result.stderr:
-            raise DataException(result.stderr)
-        for row in result.stdout.strip().split("\n"):
-            if row == "":
-                continue
+        for row in rows:
             data = row.split("\t")
-            resource = data[self.headers["#resource"]]
-            if (
-                data[self.headers["ref"]] == variant.ref
-                and data[self.headers["alt"]] == variant.alt
-                # skip results for resources not in the config
-                and resource in self.finemapped_resources
-            ):
-                found_resources.add(resource)
-                data_type = data[self.headers["data_type"]]
-                dataset = data[self.headers["dataset"]]
-                phenocode = data[self.headers["trait"]]
-                result: FineMappedResult = {
-                    "resource": resource,
-                    "dataset": dataset,
-                    "data_type": data_type,
-                    "phenocode": (
-                        phenocode if data_type != "sQTL" else dataset + ":" + phenocode
-                    ),
-                    "mlog10p": float(data[self.headers["mlog10p"]]),
-                    "beta": float(data[self.headers["beta"]]),
-                    "se": float(data[self.headers["se"]]),
-                    "pip": float(data[self.headers["pip"]]),
-                    "cs_size": int(data[self.headers["cs_size"]]),
-                    "cs_min_r2": float(data[self.headers["cs_min_r2"]]),
-                }
-                finemapped.append(result)
-        end_time = timeit.default_timer() - start_time
+            if self._ref_alt(data) == (variant.ref, variant.alt):
+                result = self._parse_finemapped_row(data)
+                if result is not None:
+                    found_resources.add(result["resource"])
+                    finemapped.append(result)
         return {
             "variant": str(variant),
             "finemapped": {
                 "data": sorted(finemapped, key=lambda x: -float(x["pip"])),
-                # keep order of resources from the config
-                "resources": [
-                    resource["resource"]
-                    for resource in self.conf["finemapped"]["resources"]
-                    if resource["resource"] in found_resources
-                ],
+                "resources": self._ordered_resources(found_resources),
             },
+            "time": 0,
+        }
+
+    def _get_finemapped_cached(
+        self, variants: list[Variant]
+    ) -> dict[Variant, FineMappedResults]:
+        """
+        Returns fine-mapping results for each variant from the cache
+        or from the data file for variants that are not cached.
+        """
+
+        def compute(variants: list[Variant]) -> dict[Variant, FineMappedResults]:
+            rows = self.tabix.fetch_variants(
+                [
+                    (variant.chr, variant.pos, variant.ref, variant.alt)
+                    for variant in variants
+                ]
+            )
+            return {
+                variant: self._get_finemapped_from_rows(
+                    variant, rows[(variant.chr, variant.pos, variant.ref, variant.alt)]
+                )
+                for variant in variants
+            }
+
+        return self.cache.get_or_compute_many(
+            self.conf["finemapped"]["file"], variants, compute
+        )
+
+    def get_finemapped(self, variant: Variant) -> FineMappedResults:
+        start_time = timeit.default_timer()
+        finemapped = self._get_finemapped_cached([variant])[variant]
+        finemapped["time"] = timeit.default_timer() - start_time
+        return finemapped
+
+    def get_finemapped_many(self, variants: list[Variant]) -> dict[str, Any]:
+        """
+        Returns fine-mapping results for each of the given variants,
+        keyed by variant, reading the data file once for all variants that are not cached.
+        """
+        start_time = timeit.default_timer()
+        finemapped = self._get_finemapped_cached(variants)
+        end_time = timeit.default_timer() - start_time
+        return {
+            "finemapped": {variant: finemapped[variant] for variant in variants},
             "time": end_time,
         }
@@ -0,0 +1,132 @@
+import re
+from typing import Any, Iterable, NamedTuple
+import numpy as np
+from exceptions import GeneNotFoundException, ParseException
+from singleton import Singleton
+from variant import normalize_chromosome
+
+region_re = re.compile(r"^(?:chr)?([0-9A-Za-z]+)[:_-]([0-9,]+)-([0-9,]+)$")
+
+
+class GeneRange(NamedTuple):
+    chr: str
+    start: int
+    end: int
+
+
+class MergedRange(NamedTuple):
+    chr: str
+    start: int
+    end: int
+    genes: list[str]
+
+
+def parse_region(region: str) -> GeneRange:
+    """
+    Returns the chromosome, start and end of a chr:start-end region, positions inclusive.
+    Raises ParseException if it is not a valid region.
+    """
+    match = region_re.match(region.strip())
+    if match is None:
+        raise ParseException("region needs to be given as chr:start-end")
+    start = int(match.group(2).replace(",", ""))
+    end = int(match.group(3).replace(",", ""))
+    if start > end:
+        raise ParseException("region start needs to be before its end")
+    return GeneRange(normalize_chromosome(match.group(1)), start, end)
+
+
+class _ChromosomeIndex(object):
+    """
+    Genes of a chromosome sorted by start, with the running maximum of their ends
+    so that the genes overlapping a region are found with two binary searches.
+    """
+
+    def __init__(self, ranges: list[tuple[int, int, str]]) -> None:
+        ranges.sort()
+        self.starts = np.array([r[0] for r in ranges], dtype=np.int64)
+        self.ends = np.array([r[1] for r in ranges], dtype=np.int64)
+        self.max_ends = np.maximum.accumulate(self.ends)
+        self.genes = [r[2] for r in ranges]
+
+    def overlapping(self, start: int, end: int) -> list[str]:
+        # genes before first all end before the region, genes from last start after it
+        first = int(np.searchsorted(self.max_ends, start, side="left"))
+        last = int(np.searchsorted(self.starts, end, side="right"))
+        hits = np.nonzero(self.ends[first:last] >= start)[0]
+        return [self.genes[first + int(i)] for i in hits]
+
+
+class GeneIndex(object, metaclass=Singleton):
+    """
+    Gene coordinates from the gene_chr_pos file with lookups by gene name
+    and an index of genes by position per chromosome.
+    """
+
+    def __init__(self, conf: dict[str, Any]) -> None:
+        self.ranges: dict[str, GeneRange] = {}
+        with open(conf["gene_chr_pos"], "r") as f:
+            for line in f:
+                s = line.strip().split("\t")
+                self.ranges[s[0].upper()] = GeneRange(s[1], int(s[2]), int(s[3]))
+        by_chr: dict[str, list[tuple[int, int, str]]] = {}
+        for gene, r in self.ranges.items():
+            try:
+                chr = normalize_chromosome(r.chr)
+            except ParseException:
+                # genes on other contigs can be looked up by name only
+                continue
+            by_chr.setdefault(chr, []).append((r.start, r.end, gene))
+        self._index = {chr: _ChromosomeIndex(r) for chr, r in by_chr.items()}
+
+    def __contains__(self, gene: str) -> bool:
+        return gene.upper() in self.ranges
+
+    def get_range(self, gene: str) -> GeneRange:
+        """
+        Returns the chromosome, start and end of the gene, matched case-insensitively.
+        Raises GeneNotFoundException if it is not in the index.
+        """
+        if gene.upper() not in self.ranges:
+            raise GeneNotFoundException(f"Gene {gene} not found")
+        return self.ranges[gene.upper()]
+
+    def overlapping(self, chr: str, start: int, end: int) -> list[str]:
+        """
+        Returns the genes overlapping the region sorted by start, positions inclusive.
+        """
+        index = self._index.get(normalize_chromosome(chr))
+        if index is None:
+            return []
+        return index.overlapping(start, end)
+
+    def genes_at(self, chr: str, pos: int) -> list[str]:
+        """
+        Returns the genes overlapping the position.
+        """
+        return self.overlapping(chr, pos, pos)
+
+    def merged_ranges(self, genes: Iterable[str]) -> list[MergedRange]:
+        """
+        Returns the ranges of the genes with overlapping ranges merged, sorted by chromosome and start,
+        each with its genes, so that each range needs to be read once.
+        Raises GeneNotFoundException if a gene is not in the index.
+        """
+        ranges: dict[str, GeneRange] = {}
+        for gene in genes:
+            if gene.upper() not in ranges:
+                ranges[gene.upper()] = self.get_range(gene)
+        merged: list[MergedRange] = []
+        for gene, r in sorted(ranges.items(), key=lambda item: item[1]):
+            if (
+                len(merged) > 0
+                and merged[-1].chr == r.chr
+                and r.start <= merged[-1].end
+            ):
+                prev = merged[-1]
+                merged[-1] = MergedRange(
+                    r.chr, prev.start, max(prev.end, r.end), prev.genes + [gene]
+                )
+            else:
+                merged.append(MergedRange(r.chr, r.start, r.end, [gene]))
+        return merged
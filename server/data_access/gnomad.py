@@ -1,10 +1,15 @@
 import gzip
-import subprocess
-from typing import Any, Optional, TypedDict
+import warnings
+import numpy as np
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, TypedDict
 import timeit
 import json
 from collections import OrderedDict as od, defaultdict as dd
-from exceptions import ACZeroException, DataException, VariantNotFoundException
+from exceptions import ACZeroException, VariantNotFoundException
+from data_access.result_cache import ResultCache
+from data_access.row_decoder import Converter, compile_dict_decoder
+from data_access.tabix import open_tabix
 from singleton import Singleton
 from typing import TypedDict
 from variant import Variant
@@ -20,35 +25,140 @@ class Csq_dict(TypedDict):
     consequence: str
 
 
+def group_consequences(consequences: list[dict[str, str]]) -> list[Csq_dict]:
+    csq: dict[str, Csq] = dd(lambda: {"gene_ids": [], "consequences": set()})
+    for c in consequences:
+        csq[c["gene_symbol"]]["gene_ids"].append(c["gene_id"])
+        csq[c["gene_symbol"]]["consequences"].update(c["consequences"])
+    return [
+        {
+            "gene_symbol": k,
+            "consequence": c.replace("_variant", "").replace("_", " "),
+        }
+        for k, v in csq.items()
+        for c in v["consequences"]
+    ]
+
+
+# columns written by scripts/gnomad_derived_columns.py, read into popmax, popmin and preferred instead
+# of being decoded, for files without them these are computed from the AF and AN columns
+DERIVED_COLUMNS = ("popmax_pop", "popmax_af", "popmin_pop", "popmin_af", "preferred")
+
+
+def popmax_popmin(d: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
+    """
+    Returns the first population with the highest AF above 0 and the first population
+    with the lowest AF below 1 of a decoded row, with pop NA if there is none.
+    """
+    popmax_pop = "NA"
+    popmax_af = 0
+    popmin_pop = "NA"
+    popmin_af = 1
+    for k in d.keys():
+        if k.startswith("AF_") and d[k] is not None:
+            if d[k] > popmax_af:
+                popmax_af = d[k]
+                popmax_pop = k.replace("AF_", "")
+            if d[k] < popmin_af:
+                popmin_af = d[k]
+                popmin_pop = k.replace("AF_", "")
+    return {"pop": popmax_pop, "af": popmax_af}, {"pop": popmin_pop, "af": popmin_af}
+
+
+def preferred(exomes: dict[str, Any] | None, genomes: dict[str, Any] | None) -> str:
+    """
+    Returns the preferred data, exomes only if AN in exomes is higher than AN in genomes.
+    """
+    if genomes is None or (exomes is not None and exomes["AN"] > genomes["AN"]):
+        return "exomes"
+    return "genomes"
+
+
+class LazyConsequences(Sequence[Csq_dict]):
+    """
+    Grouped consequences of a row decoded from the JSON of the consequences column on first use.
+    Rows of a range that are not in the response are not decoded, and gene queries check
+    the raw JSON with mentions so that only rows that may be coding are decoded.
+    Pickled and serialized as JSON like the decoded list.
+    """
+
+    __slots__ = ("raw", "_decoded")
+
+    def __init__(self, raw: str) -> None:
+        self.raw = raw
+        self._decoded: list[Csq_dict] | None = None
+
+    def decoded(self) -> list[Csq_dict]:
+        if self._decoded is None:
+            self._decoded = group_consequences(json.loads(self.raw))
+        return self._decoded
+
+    def mentions(self, terms: Iterable[str]) -> bool:
+        """
+        Returns whether any of the terms is in the raw JSON, without decoding it.
+        """
+        return any(term in self.raw for term in terms)
+
+    def __getitem__(self, i: Any) -> Any:
+        return self.decoded()[i]
+
+    def __len__(self) -> int:
+        return len(self.decoded())
+
+    def __iter__(self) -> Iterator[Csq_dict]:
+        return iter(self.decoded())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, LazyConsequences):
+            return self.decoded() == other.decoded()
+        return self.decoded() == other
+
+    def __json__(self) -> list[Csq_dict]:
+        return self.decoded()
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (LazyConsequences, (self.raw,))
+
+
 class GnomAD(object, metaclass=Singleton):
     def __init__(self, conf: dict[str, Any]) -> None:
         self.conf = conf
         self._init_tabix()
+        self.cache = ResultCache(conf)
 
-    def get_gnomad_range(self, tabix_range: str, gene: str | None) -> dict[str, Any]:
+    def get_gnomad_range(
+        self, tabix_range: str, gene: str | tuple[str, ...] | None
+    ) -> dict[str, Any]:
+        """
+        Returns the gnomAD data of the variants in the range, of the gene or any of the genes if given,
+        i.e. the rows whose most severe gene is the gene.
+        """
         start_time: float = timeit.default_timer()
-        try:
-            result = subprocess.run(
-                [
-                    "tabix",
-                    self.conf["gnomad"]["file"],
-                    tabix_range,
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as e:
-            raise DataException from e
-        if result.stderr:
-            raise DataException(result.stderr)
-        if not result.stdout:
+        gnomad = self.cache.get_or_compute(
+            self.conf["gnomad"]["file"],
+            ("range", tabix_range, gene),
+            lambda: self._get_gnomad_range(tabix_range, gene),
+            cache_exceptions=(VariantNotFoundException,),
+        )
+        gnomad["time"] = timeit.default_timer() - start_time
+        return gnomad
+
+    def _get_gnomad_range(
+        self, tabix_range: str, gene: str | tuple[str, ...] | None
+    ) -> dict[str, Any]:
+        rows = self.tabix.fetch(tabix_range)
+        if len(rows) == 0:
             raise VariantNotFoundException(f"No variants found")
 
         gnomad_results = dd(lambda: {"exomes": None, "genomes": None})
-        for row in result.stdout.strip().split("\n"):
-            if row == "":
-                continue
+        genes = (
+            None
+            if gene is None
+            else frozenset([gene.upper()] if isinstance(gene, str) else gene)
+        )
+        prev_cpra: tuple[Any, ...] | None = None
+        variant = ""
+        for row in rows:
             data = row.split("\t")
             # if (
             #     data[self.gnomad_headers["AF"]] == "NA"
@@ -57,94 +167,131 @@ class GnomAD(object, metaclass=Singleton):
             #     gene is None
             #     or data[self.gnomad_headers["gene_most_severe"]] == gene.upper()
             # ):
-            if (
-                gene is None
-                or data[self.gnomad_headers["gene_most_severe"]].upper() == gene.upper()
-            ):
-                data = self._get_gnomad_fields(data)
-                variant = str(
-                    Variant(f'{data["#chr"]}:{data["pos"]}:{data["ref"]}:{data["alt"]}')
-                )
-                if data["genome_or_exome"] == "e":
-                    gnomad_results[variant]["exomes"] = data
-                elif data["genome_or_exome"] == "g":
-                    gnomad_results[variant]["genomes"] = data
+            if genes is None or data[self._gene_col].upper() in genes:
+                d = self._decode_row(data)
+                # exome and genome rows of a variant are next to each other
+                cpra = (d["#chr"], d["pos"], d["ref"], d["alt"])
+                if cpra != prev_cpra:
+                    variant = str(Variant.from_trusted(*cpra))
+                    prev_cpra = cpra
+                if d["genome_or_exome"] == "e":
+                    gnomad_results[variant]["exomes"] = d
+                elif d["genome_or_exome"] == "g":
+                    gnomad_results[variant]["genomes"] = d
+                else:
+                    continue
+                self._add_popmax_popmin(d, data)
+                if self._derived_cols is not None:
+                    gnomad_results[variant]["preferred"] = data[
+                        self._derived_cols["preferred"]
+                    ]
 
         uniq_variants = list(gnomad_results.keys())
         if len(uniq_variants) == 0:
             raise VariantNotFoundException(f"No variants found")
 
-        # calculate min and max AFs over populations
-        for v in gnomad_results:
-            for ge in ["exomes", "genomes"]:
-                d = gnomad_results[v][ge]
-                if d is not None:
-                    popmax_pop = "NA"
-                    popmax_af = 0
-                    popmin_pop = "NA"
-                    popmin_af = 1
-                    for k in d.keys():
-                        if k.startswith("AF_") and d[k] is not None:
-                            if d[k] > popmax_af:
-                                popmax_af = d[k]
-                                popmax_pop = k.replace("AF_", "")
-                            if d[k] < popmin_af:
-                                popmin_af = d[k]
-                                popmin_pop = k.replace("AF_", "")
-                    d["popmax"] = {"pop": popmax_pop, "af": popmax_af}
-                    d["popmin"] = {"pop": popmin_pop, "af": popmin_af}
-            # prefer exomes over genomes only if AN in exomes is higher than AN in genomes
-            gnomad_results[v]["preferred"] = "genomes"
-            if gnomad_results[v]["genomes"] is None or (
-                gnomad_results[v]["exomes"] is not None
-                and gnomad_results[v]["exomes"]["AN"]
-                > gnomad_results[v]["genomes"]["AN"]
-            ):
-                gnomad_results[v]["preferred"] = "exomes"
-
-        end_time: float = timeit.default_timer() - start_time
+        if self._derived_cols is None:
+            for v in gnomad_results.values():
+                v["preferred"] = preferred(v["exomes"], v["genomes"])
 
         return {
             "range": tabix_range,
             "gene": gene,
-            "gnomad": gnomad_results,
-            "time": end_time,
+            "gnomad": dict(gnomad_results),
+            "time": 0,
         }
 
-    def get_gnomad(self, variant: Variant) -> dict[str, Any]:
+    def get_gnomad_page(
+        self,
+        chr: str,
+        start: int,
+        end: int,
+        after: tuple[int, str, str] | None,
+        limit: int,
+    ) -> dict[str, Any]:
+        """
+        Returns the gnomAD data of up to limit variants of the region in file order, after the
+        (pos, ref, alt) variant if given, and as next the (pos, ref, alt) of the last variant
+        if the region has more variants, None otherwise.
+        Rows are read from the position of the after variant so earlier blocks are not read again,
+        and reading stops at the first variant after the page. Pages are not cached.
+        """
         start_time: float = timeit.default_timer()
-        try:
-            result = subprocess.run(
-                [
-                    "tabix",
-                    self.conf["gnomad"]["file"],
-                    f"{variant.chr}:{variant.pos}-{variant.pos}",
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as e:
-            raise DataException from e
-        if result.stderr:
-            raise DataException(result.stderr)
-        if not result.stdout:
+        rows = self.tabix.iter_region(
+            f"{chr}:{start if after is None else after[0]}-{end}"
+        )
+        gnomad: dict[str, dict[str, Any]] = {}
+        last: tuple[int, str, str] | None = None
+        next_variant: tuple[int, str, str] | None = None
+        # the rows at the position of the after variant up to and including its rows are skipped
+        skipping = after is not None
+        seen_after = False
+        variant = ""
+        for row in rows:
+            data = row.split("\t")
+            pra = (int(data[self._pos_col]), data[self._ref_col], data[self._alt_col])
+            if skipping:
+                if pra == after:
+                    seen_after = True
+                    continue
+                if after is not None and pra[0] == after[0] and not seen_after:
+                    continue
+                skipping = False
+            # exome and genome rows of a variant are next to each other
+            if pra != last:
+                if len(gnomad) == limit:
+                    next_variant = last
+                    break
+                last = pra
+                variant = str(Variant.from_trusted(data[self._chr_col], *pra))
+                gnomad[variant] = {"exomes": None, "genomes": None}
+            d = self._decode_row(data)
+            if d["genome_or_exome"] == "e":
+                gnomad[variant]["exomes"] = d
+            elif d["genome_or_exome"] == "g":
+                gnomad[variant]["genomes"] = d
+            else:
+                continue
+            self._add_popmax_popmin(d, data)
+            if self._derived_cols is not None:
+                gnomad[variant]["preferred"] = data[self._derived_cols["preferred"]]
+        if self._derived_cols is None:
+            for v in gnomad.values():
+                v["preferred"] = preferred(v["exomes"], v["genomes"])
+
+        return {
+            "gnomad": gnomad,
+            "next": next_variant,
+            "time": timeit.default_timer() - start_time,
+        }
+
+    def _get_gnomad_from_rows(self, variant: Variant, rows: list[str]) -> dict[str, Any]:
+        """
+        Returns gnomAD exome and genome data of the variant from the rows at its position.
+        Raises VariantNotFoundException if the variant is not in the rows
+        and ACZeroException if it has AC0 in both exomes and genomes.
+        """
+        if len(rows) == 0:
             raise VariantNotFoundException(f"variant {variant} not found")
 
-        gnomad = {"exomes": None, "genomes": None}
-        for row in result.stdout.strip().split("\n"):
-            if row == "":
-                continue
+        gnomad: dict[str, Any] = {"exomes": None, "genomes": None}
+        pref = None
+        for row in rows:
             data = row.split("\t")
             if (
-                data[self.gnomad_headers["ref"]] == variant.ref
-                and data[self.gnomad_headers["alt"]] == variant.alt
+                data[self._ref_col] == variant.ref
+                and data[self._alt_col] == variant.alt
             ):
-                data = self._get_gnomad_fields(data)
-                if data["genome_or_exome"] == "e":
-                    gnomad["exomes"] = data
-                elif data["genome_or_exome"] == "g":
-                    gnomad["genomes"] = data
+                d = self._get_gnomad_fields(data)
+                if d["genome_or_exome"] == "e":
+                    gnomad["exomes"] = d
+                elif d["genome_or_exome"] == "g":
+                    gnomad["genomes"] = d
+                else:
+                    continue
+                self._add_popmax_popmin(d, data)
+                if self._derived_cols is not None:
+                    pref = data[self._derived_cols["preferred"]]
 
         if gnomad["exomes"] is None and gnomad["genomes"] is None:
             raise VariantNotFoundException(f"variant {variant} not found")
@@ -164,32 +311,72 @@ class GnomAD(object, metaclass=Singleton):
         ):
             raise ACZeroException(f"AC0 for {variant}")
 
-        # calculate min and max AFs over populations
-        for ge in ["exomes", "genomes"]:
-            if gnomad[ge] is not None:
-                popmax_pop = "NA"
-                popmax_af = 0
-                popmin_pop = "NA"
-                popmin_af = 1
-                for k in gnomad[ge].keys():
-                    if k.startswith("AF_") and gnomad[ge][k] is not None:
-                        if gnomad[ge][k] > popmax_af:
-                            popmax_af = gnomad[ge][k]
-                            popmax_pop = k.replace("AF_", "")
-                        if gnomad[ge][k] < popmin_af:
-                            popmin_af = gnomad[ge][k]
-                            popmin_pop = k.replace("AF_", "")
-                gnomad[ge]["popmax"] = {"pop": popmax_pop, "af": popmax_af}
-                gnomad[ge]["popmin"] = {"pop": popmin_pop, "af": popmin_af}
-
-        # prefer exomes over genomes only if AN in exomes is higher than AN in genomes
-        gnomad["preferred"] = "genomes"
-        if gnomad["genomes"] is None or (
-            gnomad["exomes"] is not None
-            and gnomad["exomes"]["AN"] > gnomad["genomes"]["AN"]
-        ):
-            gnomad["preferred"] = "exomes"
+        gnomad["preferred"] = (
+            pref if pref is not None else preferred(gnomad["exomes"], gnomad["genomes"])
+        )
+
+        return gnomad
+
+    def _add_popmax_popmin(self, d: dict[str, Any], data: list[str]) -> None:
+        """
+        Adds popmax and popmin to the decoded row d from the derived columns of the split row data,
+        or computed from the AF columns of d if the file does not have them.
+        """
+        cols = self._derived_cols
+        if cols is None:
+            d["popmax"], d["popmin"] = popmax_popmin(d)
+            return
+        # NA when no AF is above 0 or below 1, the af is then 0 or 1 as when computed
+        pop = data[cols["popmax_pop"]]
+        d["popmax"] = (
+            {"pop": pop, "af": float(data[cols["popmax_af"]])}
+            if pop != "NA"
+            else {"pop": "NA", "af": 0}
+        )
+        pop = data[cols["popmin_pop"]]
+        d["popmin"] = (
+            {"pop": pop, "af": float(data[cols["popmin_af"]])}
+            if pop != "NA"
+            else {"pop": "NA", "af": 1}
+        )
+
+    def _get_gnomad_outcomes(
+        self, variants: list[Variant]
+    ) -> dict[Variant, dict[str, Any] | Exception]:
+        """
+        Returns gnomAD data for each variant or the exception raised for it,
+        from the cache or from the data file for variants that are not cached.
+        """
 
+        def compute(
+            variants: list[Variant],
+        ) -> dict[Variant, dict[str, Any] | Exception]:
+            rows = self.tabix.fetch_variants(
+                [
+                    (variant.chr, variant.pos, variant.ref, variant.alt)
+                    for variant in variants
+                ]
+            )
+            outcomes: dict[Variant, dict[str, Any] | Exception] = {}
+            for variant in variants:
+                try:
+                    outcomes[variant] = self._get_gnomad_from_rows(
+                        variant,
+                        rows[(variant.chr, variant.pos, variant.ref, variant.alt)],
+                    )
+                except (VariantNotFoundException, ACZeroException) as e:
+                    outcomes[variant] = e
+            return outcomes
+
+        return self.cache.get_or_compute_many(
+            self.conf["gnomad"]["file"], variants, compute
+        )
+
+    def get_gnomad(self, variant: Variant) -> dict[str, Any]:
+        start_time: float = timeit.default_timer()
+        gnomad = self._get_gnomad_outcomes([variant])[variant]
+        if isinstance(gnomad, Exception):
+            raise gnomad
         end_time: float = timeit.default_timer() - start_time
 
         return {
@@ -198,55 +385,124 @@ class GnomAD(object, metaclass=Singleton):
             "time": end_time,
         }
 
+    def get_gnomad_many(self, variants: list[Variant]) -> dict[str, Any]:
+        """
+        Returns gnomAD data for each of the given variants keyed by variant,
+        reading the data file once for all variants that are not cached.
+        Variants not in gnomAD or with AC0 are listed separately.
+        """
+        start_time: float = timeit.default_timer()
+        outcomes = self._get_gnomad_outcomes(variants)
+        gnomad: dict[Variant, dict[str, Any]] = {}
+        not_found: list[Variant] = []
+        ac0: list[Variant] = []
+        for variant in variants:
+            outcome = outcomes[variant]
+            if isinstance(outcome, VariantNotFoundException):
+                not_found.append(variant)
+            elif isinstance(outcome, ACZeroException):
+                ac0.append(variant)
+            elif isinstance(outcome, dict):
+                gnomad[variant] = outcome
+        end_time: float = timeit.default_timer() - start_time
+
+        return {
+            "gnomad": gnomad,
+            "not_found": not_found,
+            "ac0": ac0,
+            "time": end_time,
+        }
+
     def _init_tabix(self) -> None:
         with gzip.open(self.conf["gnomad"]["file"], "rt") as f:
             headers = f.readline().strip().split("\t")
         self.gnomad_headers: dict[str, int] = od({h: i for i, h in enumerate(headers)})
+        self._chr_col = self.gnomad_headers["#chr"]
+        self._pos_col = self.gnomad_headers["pos"]
+        self._ref_col = self.gnomad_headers["ref"]
+        self._alt_col = self.gnomad_headers["alt"]
+        self._gene_col = self.gnomad_headers["gene_most_severe"]
+        self._derived_cols: dict[str, int] | None = (
+            {h: self.gnomad_headers[h] for h in DERIVED_COLUMNS}
+            if all(h in self.gnomad_headers for h in DERIVED_COLUMNS)
+            else None
+        )
+        self._decode_row = self._compile_decoder(
+            [h for h in headers if h not in DERIVED_COLUMNS]
+        )
+        self.tabix = open_tabix(self.conf["gnomad"]["file"], self.conf)
 
-    def summarize_freq(self, data: list[Any]) -> list[dict[str, str | int | float]]:
-        gn = [d["gnomad"] for d in data]
-        max_freqs: dict[str, float] = {}
-        for c in gn:
-            max_freq = max(
-                (
-                    (k.split("_")[1], v)
-                    for k, v in (c.get("exomes") or c.get("genomes")).items()
-                    if k.startswith("AF_") and v is not None
-                ),
-                key=lambda x: x[1],
-                default=("", 0),
-            )
-            max_freqs[max_freq[0]] = max_freqs.get(max_freq[0], 0) + 1
-
-        min_freqs: dict[str, float] = {}
-        for c in gn:
-            min_freq = min(
-                (
-                    (k.split("_")[1], v)
-                    for k, v in (c.get("exomes") or c.get("genomes")).items()
-                    if k.startswith("AF_") and v is not None
-                ),
-                key=lambda x: x[1],
-                default=("", 1),
-            )
-            min_freqs[min_freq[0]] = min_freqs.get(min_freq[0], 0) + 1
-
-        try:
-            keys = data[0]["gnomad"]["genomes"].keys()
-        except AttributeError:
-            keys = data[0]["gnomad"]["exomes"].keys()
-        all_pops = [k.split("_")[1] for k in keys if k.startswith("AF_")]
-        all_pops_freqs = [
+    def _compile_decoder(
+        self, columns: list[str]
+    ) -> Callable[[Sequence[str]], dict[str, Any]]:
+        headers = list(self.gnomad_headers)
+        return compile_dict_decoder(
+            headers,
+            self._gnomad_converters(headers),
+            na_values=("NA", ""),
+            na_defaults={
+                h: self._get_empty_csq for h in headers if h.lower() == "consequences"
+            },
+            columns=columns,
+        )
+
+    def summarize_freq(
+        self, data: list[Any], percentiles: Sequence[float] = ()
+    ) -> list[dict[str, Any]]:
+        """
+        Returns for each population the number and fraction of variants where the population has
+        the highest and the lowest AF, using exomes if available and genomes otherwise.
+        Ties go to the first population, variants without any AF are counted for no population.
+        If percentiles (0-100) are given, each population also has the AF at these percentiles
+        over the variants with an AF for it, None if there are none.
+        """
+        records = [
+            d["gnomad"].get("exomes") or d["gnomad"].get("genomes") for d in data
+        ]
+        first = next((r for r in records if r is not None), None)
+        if first is None:
+            return []
+        keys = [k for k in first.keys() if k.startswith("AF_")]
+        if len(keys) == 0:
+            return []
+        all_pops = [k.split("_")[1] for k in keys]
+        get_afs: Callable[[dict[str, Any]], Any] = (
+            itemgetter(*keys) if len(keys) > 1 else lambda r: (r[keys[0]],)
+        )
+        # variants x populations, missing AFs are NaN
+        afs = np.array([get_afs(r) for r in records if r is not None], dtype=np.float64)
+        missing = np.isnan(afs)
+        has_af = ~missing.all(axis=1)
+        max_counts = np.bincount(
+            np.where(missing, -np.inf, afs).argmax(axis=1)[has_af],
+            minlength=len(keys),
+        )
+        min_counts = np.bincount(
+            np.where(missing, np.inf, afs).argmin(axis=1)[has_af],
+            minlength=len(keys),
+        )
+        all_pops_freqs: list[dict[str, Any]] = [
             {
                 "pop": pop,
-                "max": max_freqs.get(pop, 0),
-                "maxPerc": max_freqs.get(pop, 0) / len(gn),
-                "min": min_freqs.get(pop, 0),
-                "minPerc": min_freqs.get(pop, 0) / len(gn),
+                "max": int(max_counts[i]),
+                "maxPerc": int(max_counts[i]) / len(data),
+                "min": int(min_counts[i]),
+                "minPerc": int(min_counts[i]) / len(data),
             }
-            for pop in all_pops
+            for i, pop in enumerate(all_pops)
         ]
 
+        if len(percentiles) > 0:
+            with warnings.catch_warnings():
+                # all-NaN populations give NaN
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                values = np.nanpercentile(afs, percentiles, axis=0)
+            for i, freqs in enumerate(all_pops_freqs):
+                freqs["percentiles"] = {
+                    str(p): None if np.isnan(values[j, i]) else float(values[j, i])
+                    for j, p in enumerate(percentiles)
+                }
+
         return all_pops_freqs
 
     # workaround for Union with empty list
@@ -254,51 +510,20 @@ class GnomAD(object, metaclass=Singleton):
     def _get_empty_csq(self) -> list[Csq_dict]:
         return []
 
-    def _get_gnomad_fields(
-        self, data: dict[int, str | int | float]
-    ) -> dict[str, str | int | float | Optional[list[Csq_dict]]]:
-        gnomad: dict[
-            str,
-            str | int | float | Optional[list[Csq_dict]],
-        ] = od()
-        for h in self.gnomad_headers:
-            if (
-                data[self.gnomad_headers[h]] == "NA"
-                or data[self.gnomad_headers[h]] == ""
-            ):
-                gnomad[h] = (
-                    None if h.lower() != "consequences" else self._get_empty_csq()
-                )
-            elif h.lower() == "consequences":
-                gnomad[h] = self._group_gnomad_consequences(
-                    json.loads(str(data[self.gnomad_headers[h]]))
-                )
+    def _gnomad_converters(self, headers: list[str]) -> dict[str, Converter]:
+        converters: dict[str, Converter] = {}
+        for h in headers:
+            if h.lower() == "consequences":
+                converters[h] = LazyConsequences
             elif h.lower() == "pos" or h.lower() == "an":
-                gnomad[h] = int(data[self.gnomad_headers[h]])
+                converters[h] = int
             elif h.lower().startswith("af"):
-                gnomad[h] = float(data[self.gnomad_headers[h]])
+                converters[h] = float
             elif h.lower() == "most_severe":
-                gnomad[h] = (
-                    str(data[self.gnomad_headers[h]])
-                    .replace("_variant", "")
-                    .replace("_", " ")
-                )
-            else:
-                gnomad[h] = data[self.gnomad_headers[h]]
-        return gnomad
+                converters[h] = lambda v: v.replace("_variant", "").replace("_", " ")
+        return converters
 
-    def _group_gnomad_consequences(
-        self, consequences: list[dict[str, str]]
-    ) -> list[Csq_dict]:
-        csq: dict[str, Csq] = dd(lambda: {"gene_ids": [], "consequences": set()})
-        for c in consequences:
-            csq[c["gene_symbol"]]["gene_ids"].append(c["gene_id"])
-            csq[c["gene_symbol"]]["consequences"].update(c["consequences"])
-        return [
-            {
-                "gene_symbol": k,
-                "consequence": c.replace("_variant", "").replace("_", " "),
-            }
-            for k, v in csq.items()
-            for c in v["consequences"]
-        ]
+    def _get_gnomad_fields(
+        self, data: list[str]
+    ) -> dict[str, str | int | float | Optional[Sequence[Csq_dict]]]:
+        return self._decode_row(data)
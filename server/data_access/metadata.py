@@ -1,40 +1,51 @@
-import sqlite3
-import threading
 from collections import OrderedDict as od, defaultdict as dd
-from typing import Any
+from typing import Any, Iterable
 
+from data_access.metadata_catalogue import MetadataCatalogue
+from data_access.sqlite_db import SQLiteDB, chunks
 from exceptions import DataException
 from singleton import Singleton
 
+DATASET_COLUMNS = """resource, data_type, dataset_id, study_id, study_label,
+                   sample_group, tissue_id, tissue_label, condition_label,
+                   sample_size, quant_method"""
+
+TRAIT_COLUMNS = """resource, data_type, trait_type, phenocode, phenostring, category,
+                   chromosome, gene_start, gene_end, strand,
+                   num_samples, num_cases, num_controls,
+                   pub_author, pub_date"""
+
 
 class Metadata(object, metaclass=Singleton):
     def __init__(self, conf: dict[str, Any]) -> None:
         self.conf = conf
-        self.rsid_conn: dict[int, sqlite3.Connection] = dd(
-            lambda: sqlite3.connect(conf["metadata_db"])
-        )
-
-    def _dict_factory(self, cursor: sqlite3.Cursor, row: sqlite3.Row) -> dict[str, str]:
-        d = {}
-        for idx, col in enumerate(cursor.description):
-            d[col[0]] = row[idx]
-        return d
+        self.db = SQLiteDB(conf)
+        # the trait and dataset tables are optionally loaded in memory at startup,
+        # before gunicorn forks the workers so that they share the memory
+        self.catalogue: MetadataCatalogue | None = None
+        if conf.get("metadata_preload", False):
+            self.catalogue = MetadataCatalogue(
+                conf["metadata_db"], TRAIT_COLUMNS, DATASET_COLUMNS
+            )
+            report = self.catalogue.memory_report()
+            print(
+                f"loaded {report['trait']['rows']} traits and {report['dataset']['rows']} datasets "
+                + f"from {conf['metadata_db']} in {report['total_bytes'] / 1e6:.1f} MB"
+            )
 
     def get_dataset(self, dataset: str) -> dict[str, str | int | None] | None:
-        if self.rsid_conn[threading.get_ident()].row_factory is None:
-            self.rsid_conn[threading.get_ident()].row_factory = self._dict_factory
-        c: sqlite3.Cursor = self.rsid_conn[threading.get_ident()].cursor()
-        c.execute(
-            """
-            SELECT resource, data_type, dataset_id, study_id, study_label,
-                   sample_group, tissue_id, tissue_label, condition_label,
-                   sample_size, quant_method
+        if self.catalogue is not None:
+            return self.catalogue.dataset.get((dataset,))
+        rows = self.db.query_dicts(
+            self.conf["metadata_db"],
+            "dataset",
+            f"""
+            SELECT {DATASET_COLUMNS}
             FROM dataset
             WHERE dataset_id = ?
             """,
             (dataset,),
         )
-        rows: list[dict[str, str | int | None]] = c.fetchall()
         if len(rows) == 0:
             return None
         return rows[0]
@@ -42,15 +53,17 @@ class Metadata(object, metaclass=Singleton):
     def get_phenotype(
         self, data_type: str, resource: str, dataset: str, phenocode: str
     ) -> dict[str, str | int | None]:
-        if self.rsid_conn[threading.get_ident()].row_factory is None:
-            self.rsid_conn[threading.get_ident()].row_factory = self._dict_factory
-        c: sqlite3.Cursor = self.rsid_conn[threading.get_ident()].cursor()
-        c.execute(
-            """
-            SELECT resource, data_type, trait_type, phenocode, phenostring, category,
-                   chromosome, gene_start, gene_end, strand,
-                   num_samples, num_cases, num_controls,
-                   pub_author, pub_date
+        if self.catalogue is not None:
+            row = self.catalogue.trait.get((resource, phenocode))
+            if row is None:
+                return self._missing_phenotype(data_type, resource, dataset, phenocode)
+            row["is_na"] = False
+            return row
+        rows = self.db.query_dicts(
+            self.conf["metadata_db"],
+            "trait",
+            f"""
+            SELECT {TRAIT_COLUMNS}
             FROM trait
             WHERE resource = ? AND phenocode = ?
             """,
@@ -59,39 +72,110 @@ class Metadata(object, metaclass=Singleton):
                 phenocode,
             ),
         )
-        rows: list[dict[str, str | int | None]] = c.fetchall()
         if len(rows) == 0:
-            # TODO insert NA into metadata db?
-            if phenocode == "NA":
-                rows = [
-                    od(
-                        [
-                            ("resource", resource),
-                            ("data_type", "NA"),
-                            ("trait_type", "NA"),
-                            ("phenocode", "NA"),
-                            ("phenostring", "NA"),
-                            ("category", None),
-                            ("chromosome", None),
-                            ("gene_start", None),
-                            ("gene_end", None),
-                            ("strand", None),
-                            ("num_samples", 0),
-                            ("num_cases", 0),
-                            ("num_controls", 0),
-                            ("pub_author", "NA"),
-                            ("pub_date", "NA"),
-                            ("is_na", True),
-                        ]
-                    )
+            return self._missing_phenotype(data_type, resource, dataset, phenocode)
+        rows[0]["is_na"] = False
+        return rows[0]
+
+    def _missing_phenotype(
+        self, data_type: str, resource: str, dataset: str, phenocode: str
+    ) -> dict[str, str | int | None]:
+        # TODO insert NA into metadata db?
+        if phenocode == "NA":
+            return od(
+                [
+                    ("resource", resource),
+                    ("data_type", "NA"),
+                    ("trait_type", "NA"),
+                    ("phenocode", "NA"),
+                    ("phenostring", "NA"),
+                    ("category", None),
+                    ("chromosome", None),
+                    ("gene_start", None),
+                    ("gene_end", None),
+                    ("strand", None),
+                    ("num_samples", 0),
+                    ("num_cases", 0),
+                    ("num_controls", 0),
+                    ("pub_author", "NA"),
+                    ("pub_date", "NA"),
+                    ("is_na", True),
                 ]
-            else:
-                print(resource, data_type, dataset, phenocode)
-                raise DataException(
-                    "No trait found in metadata db for resource {} phenocode: {}".format(
-                        resource, phenocode
-                    )
+            )
+        print(resource, data_type, dataset, phenocode)
+        raise DataException(
+            "No trait found in metadata db for resource {} phenocode: {}".format(
+                resource, phenocode
+            )
+        )
+
+    def get_datasets_many(
+        self, datasets: Iterable[str]
+    ) -> dict[str, dict[str, str | int | None]]:
+        """
+        Returns the datasets found in the metadata db keyed by dataset id,
+        querying them in chunks instead of one query per dataset.
+        """
+        found: dict[str, dict[str, str | int | None]] = {}
+        if self.catalogue is not None:
+            for dataset in set(datasets):
+                row = self.catalogue.dataset.get((dataset,))
+                if row is not None:
+                    found[dataset] = row
+            return found
+        for chunk in chunks(sorted(set(datasets))):
+            rows = self.db.query_dicts(
+                self.conf["metadata_db"],
+                "datasets_many",
+                f"""
+                SELECT {DATASET_COLUMNS}
+                FROM dataset
+                WHERE dataset_id IN ({",".join("?" * len(chunk))})
+                """,
+                chunk,
+            )
+            for row in rows:
+                found[str(row["dataset_id"])] = row
+        return found
+
+    def get_phenotypes_many(
+        self, phenos: Iterable[tuple[str, str, str, str]]
+    ) -> dict[tuple[str, str], dict[str, str | int | None]]:
+        """
+        Returns the phenotypes of the given (data_type, resource, dataset, phenocode) tuples
+        keyed by (resource, phenocode) as get_phenotype would,
+        querying the phenocodes of each resource in chunks instead of one query per phenotype.
+        Raises DataException if a phenotype other than NA is not found.
+        """
+        phenos = list(phenos)
+        found: dict[tuple[str, str], dict[str, str | int | None]] = {}
+        by_resource: dict[str, list[str]] = dd(list)
+        for _, resource, _, phenocode in phenos:
+            if self.catalogue is None:
+                by_resource[resource].append(phenocode)
+                continue
+            row = self.catalogue.trait.get((resource, phenocode))
+            if row is not None:
+                row["is_na"] = False
+                found[(resource, phenocode)] = row
+        for resource, phenocodes in by_resource.items():
+            for chunk in chunks(sorted(set(phenocodes))):
+                rows = self.db.query_dicts(
+                    self.conf["metadata_db"],
+                    "traits_many",
+                    f"""
+                    SELECT {TRAIT_COLUMNS}
+                    FROM trait
+                    WHERE resource = ? AND phenocode IN ({",".join("?" * len(chunk))})
+                    """,
+                    [resource, *chunk],
                 )
-        else:
-            rows[0]["is_na"] = False
-        return rows[0]
+                for row in rows:
+                    row["is_na"] = False
+                    found[(resource, str(row["phenocode"]))] = row
+        for data_type, resource, dataset, phenocode in phenos:
+            if (resource, phenocode) not in found:
+                found[(resource, phenocode)] = self._missing_phenotype(
+                    data_type, resource, dataset, phenocode
+                )
+        return found
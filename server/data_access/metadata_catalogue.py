@@ -0,0 +1,193 @@
+import sqlite3
+from typing import Any, Hashable
+
+import numpy as np
+
+Row = dict[str, str | int | None]
+
+
+class StringPool(object):
+    """
+    Distinct strings stored once in one UTF-8 buffer, referred to by integer ids.
+    """
+
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+        self._strings: list[str] = []
+        self.data: np.ndarray[Any, Any] = np.zeros(0, dtype=np.uint8)
+        self.offsets: np.ndarray[Any, Any] = np.zeros(1, dtype=np.int64)
+
+    def add(self, value: str) -> int:
+        id = self._ids.get(value)
+        if id is None:
+            id = len(self._strings)
+            self._ids[value] = id
+            self._strings.append(value)
+        return id
+
+    def freeze(self) -> None:
+        """
+        Packs the added strings into the buffer and drops the Python strings.
+        """
+        encoded = [s.encode() for s in self._strings]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=self.offsets[1:])
+        self.data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        self._ids = {}
+        self._strings = []
+
+    def get(self, id: int) -> str:
+        return bytes(self.data[self.offsets[id] : self.offsets[id + 1]]).decode()
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes + self.offsets.nbytes)
+
+
+class CompactTable(object):
+    """
+    Read-only table of rows stored column-wise in NumPy arrays with an open-addressing hash index
+    on the key columns. String columns are ids into a string pool shared by the tables,
+    integer columns are int64 with a null mask and columns with other or mixed types are kept as lists.
+    Rows are decoded to dicts on lookup so the table holds few Python objects, which keeps
+    it small and its pages shared between forked processes.
+    """
+
+    def __init__(
+        self,
+        columns: list[str],
+        rows: list[tuple[Any, ...]],
+        key_columns: list[str],
+        pool: StringPool,
+    ) -> None:
+        self.columns = columns
+        self.key_columns = key_columns
+        self.pool = pool
+        self.n = len(rows)
+        self._string: dict[str, np.ndarray[Any, Any]] = {}
+        self._int: dict[str, tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]] = {}
+        self._other: dict[str, list[Any]] = {}
+        for i, column in enumerate(columns):
+            values = [row[i] for row in rows]
+            if all(v is None or isinstance(v, str) for v in values):
+                self._string[column] = np.array(
+                    [-1 if v is None else pool.add(v) for v in values], dtype=np.int32
+                )
+            elif all(
+                v is None or (isinstance(v, int) and not isinstance(v, bool))
+                for v in values
+            ):
+                self._int[column] = (
+                    np.array([0 if v is None else v for v in values], dtype=np.int64),
+                    np.array([v is None for v in values], dtype=np.bool_),
+                )
+            else:
+                self._other[column] = values
+        key_idx = [columns.index(column) for column in key_columns]
+        # hashes are per process, the index is built in the process that looks rows up or in its parent
+        self._hashes = np.array(
+            [hash(tuple(row[i] for i in key_idx)) for row in rows], dtype=np.int64
+        )
+        size = 1 << max(4, (2 * self.n).bit_length())
+        self._mask = size - 1
+        slots = [-1] * size
+        for row_idx, h in enumerate(self._hashes.tolist()):
+            slot = h & self._mask
+            while slots[slot] != -1:
+                slot = (slot + 1) & self._mask
+            slots[slot] = row_idx
+        self._slots = np.array(slots, dtype=np.int32)
+
+    def _value(self, column: str, i: int) -> str | int | None:
+        if column in self._string:
+            id = int(self._string[column][i])
+            return None if id == -1 else self.pool.get(id)
+        if column in self._int:
+            values, nulls = self._int[column]
+            return None if nulls[i] else int(values[i])
+        value: str | int | None = self._other[column][i]
+        return value
+
+    def row(self, i: int) -> Row:
+        return {column: self._value(column, i) for column in self.columns}
+
+    def find(self, key: tuple[Hashable, ...]) -> int | None:
+        """
+        Returns the index of the row with the given key column values or None.
+        """
+        h = hash(key)
+        slot = h & self._mask
+        while True:
+            i = int(self._slots[slot])
+            if i == -1:
+                return None
+            if int(self._hashes[i]) == h and key == tuple(
+                self._value(column, i) for column in self.key_columns
+            ):
+                return i
+            slot = (slot + 1) & self._mask
+
+    def get(self, key: tuple[Hashable, ...]) -> Row | None:
+        i = self.find(key)
+        return None if i is None else self.row(i)
+
+    def memory_report(self) -> dict[str, int]:
+        return {
+            "rows": self.n,
+            "string_columns_bytes": sum(a.nbytes for a in self._string.values()),
+            "int_columns_bytes": sum(
+                values.nbytes + nulls.nbytes for values, nulls in self._int.values()
+            ),
+            "other_columns": len(self._other),
+            "index_bytes": self._hashes.nbytes + self._slots.nbytes,
+        }
+
+
+class MetadataCatalogue(object):
+    """
+    The trait and dataset tables of the metadata db loaded into compact in-memory tables,
+    looked up by (resource, phenocode) and by dataset_id.
+    The tables only change when the db is rebuilt, after which the server needs to be restarted.
+    """
+
+    def __init__(self, db: str, trait_columns: str, dataset_columns: str) -> None:
+        self.pool = StringPool()
+        conn = sqlite3.connect(db)
+        try:
+            self.trait = self._load(
+                conn, "trait", trait_columns, ["resource", "phenocode"]
+            )
+            self.dataset = self._load(conn, "dataset", dataset_columns, ["dataset_id"])
+        finally:
+            conn.close()
+        self.pool.freeze()
+
+    def _load(
+        self,
+        conn: sqlite3.Connection,
+        table: str,
+        columns: str,
+        key_columns: list[str],
+    ) -> CompactTable:
+        c = conn.execute(f"SELECT {columns} FROM {table}")
+        names = [d[0] for d in c.description]
+        return CompactTable(names, c.fetchall(), key_columns, self.pool)
+
+    def memory_report(self) -> dict[str, Any]:
+        """
+        Returns the number of rows and bytes used by the columns, indices and string pool.
+        """
+        trait = self.trait.memory_report()
+        dataset = self.dataset.memory_report()
+        total = self.pool.nbytes + sum(
+            report["string_columns_bytes"]
+            + report["int_columns_bytes"]
+            + report["index_bytes"]
+            for report in [trait, dataset]
+        )
+        return {
+            "trait": trait,
+            "dataset": dataset,
+            "string_pool_bytes": self.pool.nbytes,
+            "total_bytes": total,
+        }
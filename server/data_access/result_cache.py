@@ -0,0 +1,114 @@
+import pickle
+import threading
+from collections import OrderedDict as od
+from typing import Any, Callable, Hashable, TypeVar
+
+from singleton import Singleton
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class ResultCache(object, metaclass=Singleton):
+    """
+    LRU cache of parsed per-variant and per-range results shared by the data-access classes.
+    Entries are keyed by data file and a key within the file, e.g. a Variant or a tabix range.
+    Values are stored pickled so that the cache is bounded by bytes and each hit returns a fresh copy.
+    Data files are opened once at startup, so the server needs to be restarted after a data file changes.
+    """
+
+    def __init__(self, conf: dict[str, Any]) -> None:
+        cache_conf = conf.get("result_cache", {})
+        # 0 disables the cache
+        self.max_bytes: int = cache_conf.get("max_bytes", 0)
+        self._entries: od[tuple[str, Hashable], bytes] = od()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, file: str, keys: list[K]) -> dict[K, Any]:
+        """
+        Returns the cached values of the given keys, keys that are not cached are left out.
+        """
+        if self.max_bytes <= 0:
+            return {}
+        found: dict[K, bytes] = {}
+        with self._lock:
+            for key in keys:
+                value = self._entries.get((file, key))
+                if value is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end((file, key))
+                    found[key] = value
+                    self.hits += 1
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    def put(self, file: str, key: Hashable, value: Any) -> None:
+        if self.max_bytes <= 0:
+            return
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((file, key), None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[(file, key)] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def get_or_compute_many(
+        self, file: str, keys: list[K], compute: Callable[[list[K]], dict[K, V]]
+    ) -> dict[K, V]:
+        """
+        Returns values for the given keys from the cache,
+        computing the missing ones together with compute and caching them.
+        """
+        values: dict[K, V] = self.get_many(file, keys)
+        missing = [key for key in dict.fromkeys(keys) if key not in values]
+        if len(missing) > 0:
+            computed = compute(missing)
+            for key in missing:
+                self.put(file, key, computed[key])
+            values.update(computed)
+        return values
+
+    def get_or_compute(
+        self,
+        file: str,
+        key: K,
+        compute: Callable[[], V],
+        cache_exceptions: tuple[type[Exception], ...] = (),
+    ) -> V:
+        """
+        Returns the value of key from the cache or computes and caches it.
+        Exceptions of the given types raised by compute are cached and raised again on hits.
+        """
+
+        def compute_or_exception(_: list[K]) -> dict[K, V | Exception]:
+            try:
+                return {key: compute()}
+            except cache_exceptions as e:
+                return {key: e}
+
+        value = self.get_or_compute_many(file, [key], compute_or_exception)[key]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,82 @@
+from operator import itemgetter
+from typing import Any, Callable, Collection, Sequence, cast
+
+Converter = Callable[[str], Any]
+
+
+def compile_dict_decoder(
+    headers: list[str],
+    converters: dict[str, Converter],
+    na_values: tuple[str, ...] = (),
+    na_defaults: dict[str, Callable[[], Any]] | None = None,
+    columns: Collection[str] | None = None,
+) -> Callable[[Sequence[str]], dict[str, Any]]:
+    """
+    Returns a function that decodes the split fields of a row into a dict keyed by header.
+    The column indices and converters are resolved once here,
+    columns without a converter are kept as strings.
+    Values in na_values become None, or the result of the column's na_defaults factory.
+    If columns is given, only those columns are decoded and put in the dict.
+    """
+    na_defaults = na_defaults or {}
+    na = frozenset(na_values)
+    # (header, index, converter, NA factory) of the decoded columns in header order
+    fields = [
+        (h, i, converters.get(h), na_defaults.get(h))
+        for i, h in enumerate(headers)
+        if columns is None or h in columns
+    ]
+    n = len(headers)
+
+    def decode(d: Sequence[str]) -> dict[str, Any]:
+        if len(d) < n:
+            raise ValueError(f"expected {n} fields, got {len(d)}")
+        row: dict[str, Any] = {}
+        for h, i, converter, default in fields:
+            v = d[i]
+            if v in na:
+                row[h] = default() if default is not None else None
+            else:
+                row[h] = converter(v) if converter is not None else v
+        return row
+
+    return decode
+
+
+def compile_tuple_decoder(
+    headers: dict[str, int],
+    columns: list[str],
+    converters: dict[str, Converter] | None = None,
+) -> Callable[[Sequence[str]], tuple[Any, ...]]:
+    """
+    Returns a function that picks the given columns from the split fields of a row into a tuple,
+    converting the columns that have a converter.
+    """
+    converters = converters or {}
+    getter = itemgetter(*[headers[column] for column in columns])
+    if not any(column in converters for column in columns):
+        if len(columns) == 1:
+            return lambda d: (getter(d),)
+        return cast(Callable[[Sequence[str]], tuple[Any, ...]], getter)
+    # positions in the tuple of the converted columns and their converters
+    converted = [
+        (k, converters[column])
+        for k, column in enumerate(columns)
+        if column in converters
+    ]
+
+    def decode(d: Sequence[str]) -> tuple[Any, ...]:
+        values = list(getter(d)) if len(columns) > 1 else [getter(d)]
+        for k, converter in converted:
+            values[k] = converter(values[k])
+        return tuple(values)
+
+    return decode
+
+
+def split_limit(headers: dict[str, int], columns: list[str]) -> int:
+    """
+    Returns the maxsplit that separates the given columns of a row
+    without splitting the rest of the row.
+    """
+    return max(headers[column] for column in columns) + 1
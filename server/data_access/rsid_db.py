@@ -1,32 +1,133 @@
 import re
-import sqlite3
 import threading
-from collections import defaultdict as dd
-from typing import Any
+from typing import Any, Iterable
 from exceptions import ParseException
-from variant import Variant
+from variant import CHROMOSOME_CODES, Variant
 from singleton import Singleton
+from data_access.sqlite_db import SQLiteDB, chunks
 
 RSID_REGEX: re.Pattern[str] = re.compile("rs[0-9]+")
+RSID_NUMBER_REGEX: re.Pattern[str] = re.compile("rs([1-9][0-9]*)$")
+
+# the table of the integer-keyed format written by scripts/populate_rsid_sqlite.py
+INT_TABLE = "rsid_int"
+CHROMOSOMES = {code: chr for chr, code in CHROMOSOME_CODES.items() if chr != "M"}
+# the locus column packs the chromosome code above the position, unlike Variant.key in fewer bits
+LOCUS_POSITION_BITS = 28
+MAX_LOCUS_POSITION = 2**LOCUS_POSITION_BITS - 1
+
+
+def pack_locus(chr: str, pos: int) -> int | None:
+    """
+    Returns the chromosome and position packed as chromosome code << 28 | position
+    or None if they cannot be packed. Used by scripts/populate_rsid_sqlite.py to write the db.
+    """
+    code = CHROMOSOME_CODES.get(chr)
+    if code is None or pos < 0 or pos > MAX_LOCUS_POSITION:
+        return None
+    return (code << LOCUS_POSITION_BITS) | pos
+
+
+def unpack_locus(locus: int) -> tuple[str, int]:
+    """
+    Returns the chromosome and position of a locus packed by pack_locus.
+    """
+    return CHROMOSOMES[locus >> LOCUS_POSITION_BITS], locus & MAX_LOCUS_POSITION
 
 
 class RsidDB(object, metaclass=Singleton):
+    """
+    Variants of rsids in either the text-keyed rsid table
+    or the integer-keyed rsid_int table, which is used if the db has it.
+    """
+
     def __init__(self, conf: dict[str, Any]) -> None:
-        self.rsid_conn: dict[int, sqlite3.Connection] = dd(
-            lambda: sqlite3.connect(conf["rsid_db"]["file"])
-        )
+        self.file = conf["rsid_db"]["file"]
+        self.db = SQLiteDB(conf)
+        self._lock = threading.Lock()
+        self._int_format: bool | None = None
+
+    def _has_int_table(self) -> bool:
+        # checked on first use so that no connection is opened before the server forks
+        with self._lock:
+            if self._int_format is None:
+                self._int_format = (
+                    len(
+                        self.db.query(
+                            self.file,
+                            "rsid_format",
+                            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (INT_TABLE,),
+                        )
+                    )
+                    > 0
+                )
+            return self._int_format
 
     def get_variants_by_rsid(self, rsid: str) -> list[Variant]:
         rsid = rsid.lower()
         if RSID_REGEX.match(rsid) is None:
             raise ParseException("invalid rsid")
-        if self.rsid_conn[threading.get_ident()].row_factory is None:
-            self.rsid_conn[threading.get_ident()].row_factory = sqlite3.Row
-        c: sqlite3.Cursor = self.rsid_conn[threading.get_ident()].cursor()
-        c.execute("SELECT chr, pos, ref, alt FROM rsid WHERE rsid = ?", (rsid,))
-        return [
-            Variant(
-                row["chr"] + "-" + str(row["pos"]) + "-" + row["ref"] + "-" + row["alt"]
+        return self.get_variants_by_rsids([rsid])[rsid]
+
+    def get_variants_by_rsids(self, rsids: Iterable[str]) -> dict[str, list[Variant]]:
+        """
+        Returns the variants of each given rsid, querying them in chunks.
+        Invalid rsids are not in the returned dict, rsids not in the db have no variants.
+        """
+        valid = {
+            rsid: rsid.lower()
+            for rsid in rsids
+            if RSID_REGEX.match(rsid.lower()) is not None
+        }
+        if self._has_int_table():
+            variants = self._get_int(set(valid.values()))
+        else:
+            variants = self._get_text(set(valid.values()))
+        return {rsid: variants.get(lower, []) for rsid, lower in valid.items()}
+
+    def _get_text(self, rsids: set[str]) -> dict[str, list[Variant]]:
+        variants: dict[str, list[Variant]] = {}
+        for chunk in chunks(sorted(rsids)):
+            rows = self.db.query(
+                self.file,
+                "rsids",
+                f"""
+                SELECT rsid, chr, pos, ref, alt
+                FROM rsid
+                WHERE rsid IN ({",".join("?" * len(chunk))})
+                """,
+                chunk,
+            )
+            for rsid, chr, pos, ref, alt in rows:
+                variants.setdefault(rsid, []).append(
+                    Variant.from_trusted(chr, pos, ref, alt)
+                )
+        return variants
+
+    def _get_int(self, rsids: set[str]) -> dict[str, list[Variant]]:
+        numbers = {}
+        for rsid in rsids:
+            # e.g. rs123abc and rs0123 pass RSID_REGEX but cannot be in the db
+            match = RSID_NUMBER_REGEX.match(rsid)
+            if match is not None:
+                numbers[int(match.group(1))] = rsid
+        variants: dict[str, list[Variant]] = {}
+        for chunk in chunks(sorted(numbers)):
+            rows = self.db.query(
+                self.file,
+                "rsids_int",
+                f"""
+                SELECT rsid, locus, ref, alt
+                FROM {INT_TABLE}
+                WHERE rsid IN ({",".join("?" * len(chunk))})
+                ORDER BY rsid, idx
+                """,
+                chunk,
             )
-            for row in c.fetchall()
-        ]
+            for number, locus, ref, alt in rows:
+                chr, pos = unpack_locus(locus)
+                variants.setdefault(numbers[number], []).append(
+                    Variant.from_trusted(chr, pos, ref, alt)
+                )
+        return variants
@@ -0,0 +1,171 @@
+import os
+import queue
+import sqlite3
+import threading
+import timeit
+import urllib.parse
+from collections import defaultdict as dd
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Sequence, TypeVar
+
+from exceptions import DataException
+from singleton import Singleton
+
+T = TypeVar("T")
+
+# number of values bound in one IN (...) query, below SQLITE_MAX_VARIABLE_NUMBER of old SQLite versions
+CHUNK_SIZE = 900
+
+
+def chunks(values: Sequence[T]) -> Iterable[Sequence[T]]:
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i : i + CHUNK_SIZE]
+
+
+class SQLiteDB(object, metaclass=Singleton):
+    """
+    Pools of read-only connections to the SQLite databases, shared by the data-access classes.
+    Databases are opened with a read-only URI, immutable by default so that SQLite skips locking
+    and change detection, which means that the server needs to be restarted when a db is replaced.
+    Connections are bounded per db and reused, and with them their prepared statements,
+    and the time of each named query is recorded.
+    """
+
+    def __init__(self, conf: dict[str, Any]) -> None:
+        sqlite_conf = conf.get("sqlite", {})
+        self.immutable: bool = sqlite_conf.get("immutable", True)
+        self.mmap_size: int = sqlite_conf.get("mmap_size", 256 * 1024 * 1024)
+        self.cache_size_kib: int = sqlite_conf.get("cache_size_kib", 64 * 1024)
+        self.max_connections: int = sqlite_conf.get("max_connections", 16)
+        # seconds to wait for a connection when all connections of a db are in use
+        self.timeout: float = sqlite_conf.get("timeout", 30)
+        self.cached_statements: int = sqlite_conf.get("cached_statements", 128)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._pools: dict[str, queue.LifoQueue[sqlite3.Connection]] = {}
+        self._opened: dict[str, int] = dd(int)
+        # (db, query name) -> [count, total seconds, max seconds, rows]
+        self._timings: dict[tuple[str, str], list[float]] = dd(lambda: [0, 0.0, 0.0, 0])
+
+    def _connect(self, db: str) -> sqlite3.Connection:
+        params = {"mode": "ro"}
+        if self.immutable:
+            params["immutable"] = "1"
+        uri = (
+            "file:"
+            + urllib.parse.quote(os.path.abspath(db))
+            + "?"
+            + urllib.parse.urlencode(params)
+        )
+        try:
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                check_same_thread=False,
+                cached_statements=self.cached_statements,
+            )
+        except sqlite3.OperationalError as e:
+            raise DataException("Could not open {}: {}".format(db, e))
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        # negative cache_size is in KiB
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kib)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    def _pool(self, db: str) -> queue.LifoQueue[sqlite3.Connection]:
+        with self._lock:
+            if os.getpid() != self._pid:
+                # connections must not be used across fork, a worker opens its own
+                self._pid = os.getpid()
+                self._pools = {}
+                self._opened = dd(int)
+            if db not in self._pools:
+                self._pools[db] = queue.LifoQueue()
+            return self._pools[db]
+
+    @contextmanager
+    def connection(self, db: str) -> Iterator[sqlite3.Connection]:
+        """
+        Borrows a connection to db, opening one if fewer than max_connections are open
+        and otherwise waiting for one to be returned.
+        """
+        pool = self._pool(db)
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened[db] < self.max_connections
+                if can_open:
+                    self._opened[db] += 1
+            if can_open:
+                try:
+                    conn = self._connect(db)
+                except Exception:
+                    with self._lock:
+                        self._opened[db] -= 1
+                    raise
+            else:
+                try:
+                    conn = pool.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise DataException("Timed out waiting for a connection to " + db)
+        try:
+            yield conn
+        finally:
+            pool.put(conn)
+
+    def query(
+        self, db: str, name: str, sql: str, params: Sequence[Any] = ()
+    ) -> list[tuple[Any, ...]]:
+        """
+        Returns the rows of the query as tuples, timed under name.
+        """
+        return self._query(db, name, sql, params)[1]
+
+    def query_dicts(
+        self, db: str, name: str, sql: str, params: Sequence[Any] = ()
+    ) -> list[dict[str, Any]]:
+        """
+        Returns the rows of the query as dicts keyed by column name, timed under name.
+        """
+        columns, rows = self._query(db, name, sql, params)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def _query(
+        self, db: str, name: str, sql: str, params: Sequence[Any]
+    ) -> tuple[list[str], list[tuple[Any, ...]]]:
+        start = timeit.default_timer()
+        with self.connection(db) as conn:
+            c = conn.execute(sql, params)
+            rows = c.fetchall()
+            columns = [d[0] for d in c.description] if c.description else []
+        elapsed = timeit.default_timer() - start
+        with self._lock:
+            timing = self._timings[(db, name)]
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+            timing[3] += len(rows)
+        return columns, rows
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "connections": dict(self._opened),
+                "max_connections": self.max_connections,
+                "queries": [
+                    {
+                        "db": db,
+                        "query": name,
+                        "count": int(count),
+                        "rows": int(rows),
+                        "total_ms": total * 1000,
+                        "mean_ms": total * 1000 / count,
+                        "max_ms": max_time * 1000,
+                    }
+                    for (db, name), (count, total, max_time, rows) in sorted(
+                        self._timings.items()
+                    )
+                ],
+            }
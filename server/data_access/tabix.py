@@ -0,0 +1,507 @@
+import abc
+import gzip
+import re
+import struct
+import subprocess
+import threading
+import zlib
+from array import array
+from collections import OrderedDict as od, defaultdict as dd
+from typing import Any, Iterable, Iterator
+
+from data_access.variant_index import VariantIndex, open_variant_index, variant_key
+from exceptions import DataException
+
+TBI_MAGIC = b"TBI\x01"
+# tabix stores metadata in this pseudo-bin, it does not point to data rows
+TBI_PSEUDO_BIN = 37450
+TBI_LINEAR_SHIFT = 14
+TBI_FORMAT_VCF = 2
+TBI_FORMAT_ZERO_BASED = 0x10000
+BGZF_HEADER_LEN = 18
+# number of decompressed blocks to keep per file handle
+BGZF_BLOCK_CACHE_SIZE = 64
+BGZF_MAX_VIRTUAL_OFFSET = 2**64 - 1
+# maximum number of regions given to one tabix process
+SUBPROCESS_MAX_REGIONS = 1000
+
+region_re = re.compile(r"^([^:]+)(?::([\d,]+)?(?:-([\d,]+)?)?)?$")
+
+
+def parse_region(region: str) -> tuple[str, int, int]:
+    """
+    Parses a tabix region string "chr:start-end" (1-based, inclusive)
+    into a chromosome and a 0-based half-open interval.
+    """
+    m = region_re.match(region.strip())
+    if m is None:
+        raise DataException(f"could not parse region {region}")
+    start = int(m.group(2).replace(",", "")) if m.group(2) else 1
+    end = int(m.group(3).replace(",", "")) if m.group(3) else 2**31 - 1
+    return (m.group(1), max(start - 1, 0), end)
+
+
+def reg2bins(beg: int, end: int) -> list[int]:
+    """
+    Returns the bins that may contain rows overlapping the 0-based half-open interval [beg, end).
+    See section 5.3 of the SAM specification.
+    """
+    end -= 1
+    bins = [0]
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+class TabixIndex(object):
+    """
+    In-memory representation of a .tbi index.
+    """
+
+    def __init__(self, path: str) -> None:
+        try:
+            with gzip.open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            raise DataException(f"could not read tabix index {path}") from e
+        if data[:4] != TBI_MAGIC:
+            raise DataException(f"{path} is not a tabix index")
+        (
+            n_ref,
+            self.format,
+            self.col_seq,
+            self.col_beg,
+            self.col_end,
+            meta,
+            self.skip,
+            l_nm,
+        ) = struct.unpack_from("<8i", data, 4)
+        self.meta = chr(meta).encode()
+        offset = 36
+        self.names: list[str] = [
+            name.decode() for name in data[offset : offset + l_nm].split(b"\0")[:n_ref]
+        ]
+        self.tids: dict[str, int] = {name: tid for tid, name in enumerate(self.names)}
+        offset += l_nm
+        self.bins: list[dict[int, list[tuple[int, int]]]] = []
+        self.linear: list[array[int]] = []
+        for _ in range(n_ref):
+            (n_bin,) = struct.unpack_from("<i", data, offset)
+            offset += 4
+            bins: dict[int, list[tuple[int, int]]] = {}
+            for _ in range(n_bin):
+                bin, n_chunk = struct.unpack_from("<Ii", data, offset)
+                offset += 8
+                chunks = array("Q")
+                chunks.frombytes(data[offset : offset + n_chunk * 16])
+                offset += n_chunk * 16
+                if bin != TBI_PSEUDO_BIN:
+                    bins[bin] = list(zip(chunks[::2], chunks[1::2]))
+            self.bins.append(bins)
+            (n_intv,) = struct.unpack_from("<i", data, offset)
+            offset += 4
+            linear = array("Q")
+            linear.frombytes(data[offset : offset + n_intv * 8])
+            offset += n_intv * 8
+            self.linear.append(linear)
+
+    def chunks(self, chr: str, beg: int, end: int) -> list[tuple[int, int]]:
+        """
+        Returns merged (start, end) virtual offset pairs of the blocks
+        that may contain rows overlapping [beg, end) on chr.
+        """
+        tid = self.tids.get(chr)
+        if tid is None or end <= beg:
+            return []
+        bins = self.bins[tid]
+        linear = self.linear[tid]
+        min_off = 0
+        if len(linear) > 0:
+            min_off = linear[min(beg >> TBI_LINEAR_SHIFT, len(linear) - 1)]
+        chunks = sorted(
+            chunk
+            for bin in reg2bins(beg, end)
+            if bin in bins
+            for chunk in bins[bin]
+            if chunk[1] > min_off
+        )
+        merged: list[tuple[int, int]] = []
+        for chunk in chunks:
+            if merged and chunk[0] <= merged[-1][1]:
+                if chunk[1] > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], chunk[1])
+            else:
+                merged.append(chunk)
+        return merged
+
+
+class BGZFReader(object):
+    """
+    Reads lines from a BGZF file by virtual offset.
+    Not thread-safe, use one reader per thread.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._f = open(path, "rb")
+        self._blocks: od[int, tuple[bytes, int]] = od()
+
+    def _block(self, coffset: int) -> tuple[bytes, int] | None:
+        """
+        Returns the decompressed data of the block at compressed offset coffset
+        and the compressed offset of the next block, or None at the end of the file.
+        """
+        if coffset in self._blocks:
+            self._blocks.move_to_end(coffset)
+            return self._blocks[coffset]
+        self._f.seek(coffset)
+        header = self._f.read(BGZF_HEADER_LEN)
+        if len(header) < BGZF_HEADER_LEN:
+            return None
+        if header[12:14] != b"BC":
+            raise DataException(f"{self.path} is not BGZF compressed")
+        (bsize,) = struct.unpack_from("<H", header, 16)
+        cdata = self._f.read(bsize + 1 - BGZF_HEADER_LEN)
+        try:
+            data = zlib.decompress(cdata[:-8], -15)
+        except zlib.error as e:
+            raise DataException(f"corrupt BGZF block in {self.path}") from e
+        block = (data, coffset + bsize + 1)
+        self._blocks[coffset] = block
+        if len(self._blocks) > BGZF_BLOCK_CACHE_SIZE:
+            self._blocks.popitem(last=False)
+        return block
+
+    def read_lines(self, start: int, stop: int) -> Iterator[tuple[int, bytes]]:
+        """
+        Yields (virtual offset, line) for the lines that start at or after
+        virtual offset start and before virtual offset stop.
+        """
+        coffset = start >> 16
+        pos = start & 0xFFFF
+        partial = b""
+        line_vo = start
+        while True:
+            block = self._block(coffset)
+            if block is None:
+                break
+            data, next_coffset = block
+            while pos < len(data):
+                if not partial:
+                    line_vo = (coffset << 16) | pos
+                    if line_vo >= stop:
+                        return
+                nl = data.find(b"\n", pos)
+                if nl == -1:
+                    partial += data[pos:]
+                    break
+                yield line_vo, partial + data[pos:nl]
+                partial = b""
+                pos = nl + 1
+            coffset = next_coffset
+            pos = 0
+        if partial:
+            yield line_vo, partial
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class TabixSource(abc.ABC):
+    """
+    Base class for fetching rows from a tabix-indexed file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @abc.abstractmethod
+    def fetch(self, region: str) -> list[str]:
+        """
+        Returns the rows of the region.
+        """
+
+    @abc.abstractmethod
+    def iter_region(self, region: str) -> Iterator[str]:
+        """
+        Yields the rows of the region, reading only as far as the rows are consumed.
+        """
+
+    @abc.abstractmethod
+    def fetch_positions(
+        self, positions: Iterable[tuple[str, int]]
+    ) -> dict[tuple[str, int], list[str]]:
+        """
+        Returns the rows at each of the given (chr, 1-based position) pairs.
+        """
+
+    def fetch_variants(
+        self, variants: Iterable[tuple[str, int, str, str]]
+    ) -> dict[tuple[str, int, str, str], list[str]]:
+        """
+        Returns rows for each of the given (chr, pos, ref, alt) variants.
+        The rows include all rows of the variant and can include rows of other variants
+        at the same position, so callers need to check the alleles.
+        """
+        variants = list(variants)
+        rows = self.fetch_positions((chr, pos) for chr, pos, _, _ in variants)
+        return {variant: rows[(variant[0], variant[1])] for variant in variants}
+
+
+class SubprocessTabix(TabixSource):
+    """
+    Fetches rows by running the tabix executable, one process per query.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.index: TabixIndex | None = None
+
+    def fetch(self, region: str) -> list[str]:
+        return self.fetch_regions([region])
+
+    def iter_region(self, region: str) -> Iterator[str]:
+        # rows are read from the process as they are consumed,
+        # the process is stopped if the rows are not consumed to the end
+        process = subprocess.Popen(
+            ["tabix", self.path, region],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            assert process.stdout is not None and process.stderr is not None
+            for line in process.stdout:
+                row = line.rstrip("\n")
+                if row != "":
+                    yield row
+            stderr = process.stderr.read()
+            if process.wait() != 0 or stderr:
+                raise DataException(stderr)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            for pipe in (process.stdout, process.stderr):
+                if pipe is not None:
+                    pipe.close()
+
+    def fetch_regions(self, regions: list[str]) -> list[str]:
+        try:
+            result = subprocess.run(
+                ["tabix", self.path] + regions,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        except subprocess.CalledProcessError as e:
+            raise DataException from e
+        if result.stderr:
+            raise DataException(result.stderr)
+        return [row for row in result.stdout.split("\n") if row != ""]
+
+    def fetch_positions(
+        self, positions: Iterable[tuple[str, int]]
+    ) -> dict[tuple[str, int], list[str]]:
+        if self.index is None:
+            self.index = TabixIndex(self.path + ".tbi")
+        uniq = sorted(set(positions))
+        rows: dict[tuple[str, int], list[str]] = {p: [] for p in uniq}
+        offset = 0 if self.index.format & TBI_FORMAT_ZERO_BASED else 1
+        max_split = max(self.index.col_seq, self.index.col_beg)
+        # one tabix process per batch of positions to stay within command line length limits
+        for i in range(0, len(uniq), SUBPROCESS_MAX_REGIONS):
+            for row in self.fetch_regions(
+                [
+                    f"{chr}:{pos}-{pos}"
+                    for chr, pos in uniq[i : i + SUBPROCESS_MAX_REGIONS]
+                ]
+            ):
+                # rows are attributed to positions by their begin column
+                fields = row.split("\t", max_split)
+                key = (
+                    fields[self.index.col_seq - 1],
+                    int(fields[self.index.col_beg - 1]) + 1 - offset,
+                )
+                if key in rows:
+                    rows[key].append(row)
+        return rows
+
+
+class TabixReader(TabixSource):
+    """
+    Fetches rows in-process using an in-memory copy of the tabix index.
+    The index is shared, file handles are opened once per thread.
+    """
+
+    def __init__(self, path: str, use_variant_index: bool = True) -> None:
+        super().__init__(path)
+        self.index = TabixIndex(path + ".tbi")
+        # exact variant lookups, see scripts/build_variant_index.py
+        self.variant_index: VariantIndex | None = (
+            open_variant_index(path) if use_variant_index else None
+        )
+        # a handle and its block cache are released with the thread that opened it
+        self._local = threading.local()
+        self._max_col = (
+            max(self.index.col_seq, self.index.col_beg, self.index.col_end, 4) + 1
+        )
+
+    @property
+    def handle(self) -> BGZFReader:
+        handle: BGZFReader | None = getattr(self._local, "handle", None)
+        if handle is None:
+            handle = BGZFReader(self.path)
+            self._local.handle = handle
+        return handle
+
+    def _row_interval(self, fields: list[bytes]) -> tuple[int, int]:
+        beg = int(fields[self.index.col_beg - 1])
+        if not self.index.format & TBI_FORMAT_ZERO_BASED:
+            beg -= 1
+        if (self.index.format & 0xFFFF) == TBI_FORMAT_VCF:
+            return (beg, beg + len(fields[3]))
+        if self.index.col_end > 0 and self.index.col_end != self.index.col_beg:
+            return (beg, int(fields[self.index.col_end - 1]))
+        return (beg, beg + 1)
+
+    def iter_rows(self, chr: str, beg: int, end: int) -> Iterator[tuple[int, str]]:
+        """
+        Yields (virtual offset, row) for rows on chr overlapping the 0-based half-open interval [beg, end).
+        """
+        handle = self.handle
+        for chunk_start, chunk_end in self.index.chunks(chr, beg, end):
+            for vo, line in handle.read_lines(chunk_start, chunk_end):
+                if line.startswith(self.index.meta):
+                    continue
+                fields = line.split(b"\t", self._max_col)
+                row_beg, row_end = self._row_interval(fields)
+                if row_beg >= end:
+                    return
+                if row_end > beg:
+                    yield vo, line.decode()
+
+    def fetch(self, region: str) -> list[str]:
+        chr, beg, end = parse_region(region)
+        return [row for _, row in self.iter_rows(chr, beg, end)]
+
+    def iter_region(self, region: str) -> Iterator[str]:
+        chr, beg, end = parse_region(region)
+        return (row for _, row in self.iter_rows(chr, beg, end))
+
+    def _next_target(
+        self, chr: str, positions: list[int], i: int
+    ) -> tuple[int, int | None]:
+        """
+        Returns the index of the next query position at or after i that may have rows
+        and the virtual offset of the first block that may contain them,
+        or None as the offset if no remaining position has rows.
+        """
+        while i < len(positions):
+            chunks = self.index.chunks(chr, positions[i] - 1, positions[i])
+            if len(chunks) > 0:
+                return (i, chunks[0][0])
+            i += 1
+        return (i, None)
+
+    def iter_positions(
+        self, chr: str, positions: list[int]
+    ) -> Iterator[tuple[int, str]]:
+        """
+        Yields (position, row) for rows on chr overlapping any of the given sorted, unique 1-based positions.
+        The file is scanned once in genomic order like a merge join of the positions and the rows,
+        blocks that cannot contain any of the positions are skipped over.
+        """
+        handle = self.handle
+        seq = chr.encode()
+        n = len(positions)
+        i, start = self._next_target(chr, positions, 0)
+        while start is not None:
+            jump: int | None = None
+            for vo, line in handle.read_lines(start, BGZF_MAX_VIRTUAL_OFFSET):
+                if line.startswith(self.index.meta):
+                    continue
+                fields = line.split(b"\t", self._max_col)
+                if fields[self.index.col_seq - 1] != seq:
+                    return
+                row_beg, row_end = self._row_interval(fields)
+                # rows are sorted by start so positions before this row will not get more rows
+                advanced = False
+                while i < n and positions[i] <= row_beg:
+                    i += 1
+                    advanced = True
+                if i == n:
+                    return
+                j = i
+                row = None
+                while j < n and positions[j] <= row_end:
+                    if row is None:
+                        row = line.decode()
+                    yield positions[j], row
+                    j += 1
+                if advanced:
+                    i, target = self._next_target(chr, positions, i)
+                    if target is None:
+                        return
+                    if (target >> 16) > (vo >> 16):
+                        # the next position is in a later block, skip the blocks in between
+                        jump = target
+                        break
+            if jump is None:
+                return
+            start = jump
+
+    def fetch_positions(
+        self, positions: Iterable[tuple[str, int]]
+    ) -> dict[tuple[str, int], list[str]]:
+        by_chr: dict[str, set[int]] = dd(set)
+        for chr, pos in positions:
+            by_chr[chr].add(pos)
+        rows: dict[tuple[str, int], list[str]] = {}
+        for chr in by_chr:
+            chr_positions = sorted(by_chr[chr])
+            for pos in chr_positions:
+                rows[(chr, pos)] = []
+            for pos, row in self.iter_positions(chr, chr_positions):
+                rows[(chr, pos)].append(row)
+        return rows
+
+    def fetch_variants(
+        self, variants: Iterable[tuple[str, int, str, str]]
+    ) -> dict[tuple[str, int, str, str], list[str]]:
+        if self.variant_index is None:
+            return super().fetch_variants(variants)
+        uniq = list(dict.fromkeys(variants))
+        keys = [variant_key(*variant) for variant in uniq]
+        packed = [(variant, key) for variant, key in zip(uniq, keys) if key is not None]
+        runs = self.variant_index.lookup([key for _, key in packed])
+        # read the runs in file order so that consecutive runs share decompressed blocks
+        reads = sorted(
+            (offset, count, variant)
+            for (variant, _), variant_runs in zip(packed, runs)
+            for offset, count in variant_runs
+        )
+        rows: dict[tuple[str, int, str, str], list[str]] = {
+            variant: [] for variant in uniq
+        }
+        handle = self.handle
+        for offset, count, variant in reads:
+            for _, line in handle.read_lines(offset, BGZF_MAX_VIRTUAL_OFFSET):
+                rows[variant].append(line.decode())
+                count -= 1
+                if count == 0:
+                    break
+        return rows
+
+
+def open_tabix(path: str, conf: dict[str, Any]) -> TabixSource:
+    """
+    Returns a row source for the given tabix-indexed file using the backend configured in conf["tabix"].
+    The in-process reader is the default, the tabix executable can be used as a fallback.
+    """
+    backend = conf.get("tabix", {}).get("backend", "inprocess")
+    if backend == "subprocess":
+        return SubprocessTabix(path)
+    if backend == "inprocess":
+        return TabixReader(path, conf.get("tabix", {}).get("variant_index", True))
+    raise DataException(f"unknown tabix backend {backend}")
@@ -0,0 +1,69 @@
+import os
+import zlib
+from typing import Any
+
+import numpy as np
+from variant import CHROMOSOME_CODES
+
+# written next to the data file by scripts/build_variant_index.py
+INDEX_SUFFIX = ".vidx.npy"
+
+MAX_POSITION = 2**28 - 1
+
+
+def variant_key(chr: str, pos: int, ref: str, alt: str) -> int | None:
+    """
+    Returns the packed 64-bit key of a variant: 5 bits of chromosome code, 28 bits of position
+    and 31 bits of a hash of the alleles, or None if the variant cannot be packed.
+    Different alleles at a position can share a key so rows found through a key need to be checked.
+    Also used by scripts/build_variant_index.py to write the index.
+    """
+    code = CHROMOSOME_CODES.get(chr.upper().replace("CHR", ""))
+    if code is None or pos < 0 or pos > MAX_POSITION:
+        return None
+    allele_hash = zlib.crc32(f"{ref}\t{alt}".encode()) & 0x7FFFFFFF
+    return (code << 59) | (pos << 31) | allele_hash
+
+
+class VariantIndex(object):
+    """
+    Memory-mapped index from packed variant keys to runs of rows in a BGZF-compressed data file.
+    The index is a 3 x n uint64 array: sorted keys, virtual offsets of the first row of each run and row counts.
+    A key has several runs if the rows of the variant are not contiguous in the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._index: np.ndarray[Any, Any] = np.load(path, mmap_mode="r")
+        self._keys = self._index[0]
+
+    def lookup(self, keys: list[int]) -> list[list[tuple[int, int]]]:
+        """
+        Returns the (virtual offset, row count) runs of each key in file order.
+        """
+        query = np.array(keys, dtype=np.uint64)
+        lows = np.searchsorted(self._keys, query, side="left").tolist()
+        highs = np.searchsorted(self._keys, query, side="right").tolist()
+        return [
+            list(
+                zip(
+                    self._index[1][low:high].tolist(),
+                    self._index[2][low:high].tolist(),
+                )
+            )
+            for low, high in zip(lows, highs)
+        ]
+
+
+def open_variant_index(path: str) -> VariantIndex | None:
+    """
+    Returns the variant index of the given data file
+    or None if there is no index or it is older than the data file.
+    """
+    index_path = path + INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return None
+    if os.path.getmtime(index_path) < os.path.getmtime(path):
+        print(f"ignoring variant index {index_path}, it is older than {path}")
+        return None
+    return VariantIndex(index_path)
@@ -54,6 +54,13 @@ class AssociationResult(TypedDict):
     mlogp: float
     beta: float
     sebeta: float
+    ld: NotRequired[bool]
+    overall_r2: NotRequired[float]
+    lead: NotRequired[bool]
+    lead_chr: NotRequired[str]
+    lead_pos: NotRequired[int]
+    lead_ref: NotRequired[str]
+    lead_alt: NotRequired[str]
 
 
 class AssociationResultContainer(TypedDict):
@@ -69,4 +76,9 @@ class ResponseTime(TypedDict):
     gnomad: float
     finemapped: float
     assoc: float
+    ld_assoc: NotRequired[float]
+    # phenotype and dataset metadata lookups
+    metadata: NotRequired[float]
+    # wall-clock time per data source when sources are fetched concurrently
+    wall: NotRequired[dict[str, float]]
     total: float
@@ -0,0 +1,177 @@
+import timeit
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterator
+
+from data_access.assoc import Datafetch
+from data_access.finemapped import Finemapped
+from data_access.gnomad import GnomAD
+from variant import Variant
+
+SOURCES = ["gnomad", "finemapped", "assoc", "ld_assoc"]
+
+
+class FetchExecutor(object):
+    """
+    Runs the gnomAD, fine-mapping, association and LD association lookups of a query
+    on a bounded thread pool, concurrently both between sources and between batches of variants.
+    Results are merged in input order so the output does not depend on scheduling.
+    """
+
+    def __init__(
+        self,
+        conf: dict[str, Any],
+        gnomad_fetch: GnomAD,
+        finemapped_fetch: Finemapped,
+        assoc_fetch: Datafetch,
+    ) -> None:
+        self.gnomad_fetch = gnomad_fetch
+        self.finemapped_fetch = finemapped_fetch
+        self.assoc_fetch = assoc_fetch
+        concurrency = conf.get("concurrency", {})
+        self.batch_size: int = concurrency.get("batch_size", 500)
+        max_workers: int = concurrency.get("max_workers", 0)
+        # number of batches fetched ahead of the one being sent in streamed responses
+        self.stream_window: int = concurrency.get("stream_window", max(1, max_workers))
+        # threads are started lazily on first submit, i.e. after gunicorn has forked the workers
+        self.executor = (
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+            if max_workers > 0
+            else None
+        )
+
+    def _task(self, source: str, batch: list[Variant]) -> Callable[[], dict[str, Any]]:
+        if source == "gnomad":
+            return lambda: self.gnomad_fetch.get_gnomad_many(batch)
+        if source == "finemapped":
+            return lambda: self.finemapped_fetch.get_finemapped_many(batch)
+        if source == "assoc":
+            return lambda: self.assoc_fetch.get_assoc_many(batch, include_ld=False)
+        return lambda: self.assoc_fetch.get_ld_assoc_many(batch)
+
+    def _timed(
+        self, task: Callable[[], dict[str, Any]]
+    ) -> tuple[dict[str, Any], float, float]:
+        start = timeit.default_timer()
+        result = task()
+        return (result, start, timeit.default_timer())
+
+    def _merge_batch(
+        self,
+        batch: list[Variant],
+        timed_results: list[tuple[dict[str, Any], float, float]],
+    ) -> dict[str, Any]:
+        results = dict(zip(SOURCES, timed_results))
+        gnomad = results["gnomad"][0]
+        finemapped = {}
+        assoc = {}
+        for variant in batch:
+            if variant in gnomad["gnomad"]:
+                finemapped[variant] = results["finemapped"][0]["finemapped"][variant]
+                assoc[variant] = self.assoc_fetch.merge_assoc_and_ld_assoc(
+                    results["assoc"][0]["assoc"][variant],
+                    results["ld_assoc"][0]["assoc"][variant],
+                )
+        return {
+            "gnomad": gnomad["gnomad"],
+            "not_found": gnomad["not_found"],
+            "ac0": gnomad["ac0"],
+            "finemapped": finemapped,
+            "assoc": assoc,
+            "time": {
+                source: (result["time"], start, end)
+                for source, (result, start, end) in results.items()
+            },
+        }
+
+    def fetch_batches(
+        self, variants: list[Variant], window: int | None = None
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Yields gnomAD, fine-mapping and merged association results of each batch of variants
+        in input order as soon as the batch is done, see fetch.
+        Times are given per source as (summed time, start, end) of the batch.
+        At most window batches are fetched ahead of the one being yielded, all batches if None.
+        """
+        batches = [
+            variants[i : i + self.batch_size]
+            for i in range(0, len(variants), self.batch_size)
+        ]
+        executor = self.executor
+        if executor is None:
+            for batch in batches:
+                yield self._merge_batch(
+                    batch,
+                    [self._timed(self._task(source, batch)) for source in SOURCES],
+                )
+            return
+        pending: deque[
+            tuple[list[Variant], list[Future[tuple[dict[str, Any], float, float]]]]
+        ] = deque()
+
+        def submit(batch: list[Variant]) -> None:
+            pending.append(
+                (
+                    batch,
+                    [
+                        executor.submit(self._timed, self._task(source, batch))
+                        for source in SOURCES
+                    ],
+                )
+            )
+
+        queued = iter(batches)
+        for batch in islice(queued, window if window is not None else len(batches)):
+            submit(batch)
+        while len(pending) > 0:
+            batch, futures = pending.popleft()
+            timed_results = [future.result() for future in futures]
+            for next_batch in islice(queued, 1):
+                submit(next_batch)
+            yield self._merge_batch(batch, timed_results)
+
+    def fetch(self, variants: list[Variant]) -> dict[str, Any]:
+        """
+        Returns gnomAD, fine-mapping and merged association results keyed by variant.
+        Variants not in gnomAD or with AC0 are listed separately and
+        their fine-mapping and association results are dropped.
+        Times are reported per source both as wall-clock time and summed over batches.
+        Exceptions raised by a lookup are raised here.
+        """
+        gnomad: dict[Variant, Any] = {}
+        finemapped: dict[Variant, Any] = {}
+        assoc: dict[Variant, Any] = {}
+        not_found: list[Variant] = []
+        ac0: list[Variant] = []
+        summed = {source: 0.0 for source in SOURCES}
+        starts: dict[str, list[float]] = {source: [] for source in SOURCES}
+        ends: dict[str, list[float]] = {source: [] for source in SOURCES}
+        for result in self.fetch_batches(variants):
+            gnomad.update(result["gnomad"])
+            finemapped.update(result["finemapped"])
+            assoc.update(result["assoc"])
+            not_found.extend(result["not_found"])
+            ac0.extend(result["ac0"])
+            for source, (time, start, end) in result["time"].items():
+                summed[source] += time
+                starts[source].append(start)
+                ends[source].append(end)
+        return {
+            "gnomad": gnomad,
+            "not_found": not_found,
+            "ac0": ac0,
+            "finemapped": finemapped,
+            "assoc": assoc,
+            "time": {
+                "summed": summed,
+                "wall": {
+                    source: (
+                        max(ends[source]) - min(starts[source])
+                        if len(starts[source]) > 0
+                        else 0.0
+                    )
+                    for source in SOURCES
+                },
+            },
+        }
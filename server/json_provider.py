@@ -0,0 +1,123 @@
+import math
+from typing import Any, Callable
+
+import orjson
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from exceptions import DataException
+
+
+def float_policy(precision: int | None, strict: bool) -> Callable[[Any], Any]:
+    """
+    Returns a function that copies an object with floats rounded to the given number
+    of significant digits and, if strict, non-finite floats replaced with None.
+    """
+    fmt = f".{precision}g" if precision is not None else None
+
+    def apply(obj: Any) -> Any:
+        # exact type checks first, most values in a response are not floats
+        t = type(obj)
+        if t is dict:
+            return {k: apply(v) for k, v in obj.items()}
+        if t is list or t is tuple:
+            return [apply(v) for v in obj]
+        if isinstance(obj, float):
+            if not math.isfinite(obj):
+                return None if strict else obj
+            return float(format(obj, fmt)) if fmt is not None else obj
+        # subclasses such as defaultdict and OrderedDict
+        if isinstance(obj, dict):
+            return {k: apply(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [apply(v) for v in obj]
+        return obj
+
+    return apply
+
+
+def default(obj: Any) -> Any:
+    """
+    Serializes objects that define __json__, e.g. lazily decoded data, as its return value
+    and other objects as Flask's default provider does.
+    """
+    if hasattr(obj, "__json__"):
+        return obj.__json__()
+    return DefaultJSONProvider.default(obj)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """
+    Flask's default JSON provider with the float policy applied before serialization.
+    Without strict, non-finite floats are written as NaN and Infinity which is not valid JSON.
+    """
+
+    float_precision: int | None = None
+    strict = True
+    default = staticmethod(default)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if self.strict or self.float_precision is not None:
+            obj = float_policy(self.float_precision, self.strict)(obj)
+        return super().dumps(obj, **kwargs)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson which serializes large responses several times faster.
+    orjson always writes non-finite floats as null so responses are always valid JSON,
+    floats are otherwise written in their shortest round-trip form unless float_precision is set.
+    Output is UTF-8 instead of ASCII-escaped but otherwise the same as with the default provider.
+    """
+
+    float_precision: int | None = None
+    strict = True
+    default = staticmethod(default)
+
+    def _options(self, indent: bool) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj: Any, indent: bool = False) -> bytes:
+        if self.float_precision is not None:
+            obj = float_policy(self.float_precision, self.strict)(obj)
+        return orjson.dumps(obj, default=self.default, option=self._options(indent))
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return self.dumps_bytes(obj, indent=kwargs.get("indent") is not None).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Any:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # the bytes are passed to the response as they are instead of decoding them to str first
+        response_class: Any = self._app.response_class
+        return response_class(
+            self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype
+        )
+
+
+PROVIDERS: dict[str, type[ORJSONProvider] | type[StdlibJSONProvider]] = {
+    "orjson": ORJSONProvider,
+    "stdlib": StdlibJSONProvider,
+}
+
+
+def init_json_provider(app: Flask, conf: dict[str, Any]) -> None:
+    """
+    Sets the JSON provider of the app from the json_response configuration.
+    """
+    json_conf = conf.get("json_response", {})
+    name = json_conf.get("provider", "orjson")
+    if name not in PROVIDERS:
+        raise DataException(f"unknown json provider {name}")
+    provider = PROVIDERS[name](app)  # type: ignore[arg-type]
+    provider.float_precision = json_conf.get("float_precision")
+    provider.strict = json_conf.get("strict", True)
+    app.json = provider
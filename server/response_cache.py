@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import timeit
+from typing import Any
+
+from singleton import Singleton
+
+SUFFIX = ".json.gz"
+TMP_SUFFIX = ".tmp"
+# temporary files older than this (seconds) are left behind by writers that crashed and are removed
+TMP_MAX_AGE = 600
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache(object, metaclass=Singleton):
+    """
+    On-disk cache of gzip-compressed responses shared by the server processes.
+    Keys are hashes of a normalized query and a fingerprint of the configuration and the data files
+    it points to, so entries computed from other data are never returned, they are evicted eventually.
+    The directory is bounded by bytes, least recently used files are removed first.
+    """
+
+    def __init__(self, conf: dict[str, Any]) -> None:
+        self.conf = conf
+        cache_conf = conf.get("response_cache", {})
+        # None disables the cache
+        self.dir: str | None = cache_conf.get("dir")
+        self.max_bytes: int = cache_conf.get("max_bytes", 1024 * 1024 * 1024)
+        # data files are checked for changes at most this often (seconds)
+        self.check_interval: float = cache_conf.get("check_interval", 10)
+        self._lock = threading.Lock()
+        self._fingerprint = ""
+        self._last_checked: float | None = None
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.dir is not None:
+            try:
+                os.makedirs(self.dir, exist_ok=True)
+                self._bytes = sum(size for _, _, size in self._entries())
+            except OSError as e:
+                logger.warning(f"response cache disabled, cannot use {self.dir}: {e}")
+                self.dir = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.dir is not None
+
+    def _data_files(self, value: Any) -> list[str]:
+        """
+        Returns the paths of existing files and directories in a configuration value.
+        """
+        if isinstance(value, dict):
+            return [path for v in value.values() for path in self._data_files(v)]
+        if isinstance(value, (list, tuple)):
+            return [path for v in value for path in self._data_files(v)]
+        if isinstance(value, str) and os.path.exists(value):
+            return [value]
+        return []
+
+    def data_version(self) -> str:
+        """
+        Returns a fingerprint of the configuration and the size and modification time
+        of the data files it points to, files are checked at most every check_interval seconds.
+        """
+        now = timeit.default_timer()
+        with self._lock:
+            if (
+                self._last_checked is not None
+                and now - self._last_checked < self.check_interval
+            ):
+                return self._fingerprint
+            self._last_checked = now
+            files = []
+            for path in sorted(set(self._data_files(self.conf))):
+                if os.path.isdir(path):
+                    # e.g. a columnar association store, rewritten together with its meta.json
+                    path = os.path.join(path, "meta.json")
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((path, st.st_size, st.st_mtime_ns))
+            self._fingerprint = hashlib.sha256(
+                json.dumps([self.conf, files], sort_keys=True, default=repr).encode()
+            ).hexdigest()
+            return self._fingerprint
+
+    def key(self, query: Any) -> str:
+        """
+        Returns the cache key of a normalized query, JSON-serializable, for the current data version.
+        """
+        return hashlib.sha256(
+            json.dumps([query, self.data_version()], sort_keys=True).encode()
+        ).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        assert self.dir is not None
+        return os.path.join(self.dir, key + SUFFIX)
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        """
+        Returns the path, modification time and size of the cached responses
+        and removes stale temporary files on the way.
+        """
+        assert self.dir is not None
+        entries = []
+        now = time.time()
+        with os.scandir(self.dir) as it:
+            for entry in it:
+                try:
+                    if entry.name.endswith(SUFFIX):
+                        st = entry.stat()
+                        entries.append((entry.path, st.st_mtime, st.st_size))
+                    elif entry.name.endswith(TMP_SUFFIX):
+                        if now - entry.stat().st_mtime > TMP_MAX_AGE:
+                            os.remove(entry.path)
+                except OSError:
+                    continue
+        return entries
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Returns the compressed response of key or None if it is not cached.
+        """
+        if self.dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # the modification time orders the files for eviction
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Stores the compressed response of key, evicting the least recently used responses if needed.
+        """
+        if self.dir is None or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = None
+        try:
+            # an overwritten response only changes the size by the difference
+            previous_size = os.stat(path).st_size if os.path.exists(path) else 0
+            # written to a temporary file first so that other processes never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.dir, suffix=TMP_SUFFIX)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # the response is still sent, it is just not cached
+            logger.warning(f"could not cache response {key}: {e}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return
+        with self._lock:
+            self._bytes += len(data) - previous_size
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used files until the directory is within max_bytes.
+        Call with the lock held. Other processes write to the same directory so it is rescanned.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._bytes = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
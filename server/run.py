@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import gc
 import sys
 import argparse
 from typing import Any
@@ -39,6 +40,10 @@ def run_gunicorn(app: Any, args: Any) -> None:
         "worker_class": "sync",
     }
     sga = StandaloneGunicornApplication(app, options)
+    # the app is loaded before the workers are forked, move the objects created at startup
+    # (e.g. the preloaded metadata) out of the garbage collector's reach so that collections
+    # in the workers don't write to their pages and they stay shared copy-on-write
+    gc.freeze()
     sga.run()
 
 
@@ -1,7 +1,11 @@
+import base64
+import binascii
+import gzip
 import json
 import sys
 import timeit
-from typing import Any, Callable, Literal
+import zlib
+from typing import Any, Callable, Iterator, Literal
 from flask import (
     Flask,
     flash,
@@ -9,6 +13,7 @@ from flask import (
     render_template,
     request,
     session,
+    stream_with_context,
     redirect,
     url_for,
 )
@@ -27,11 +32,18 @@ from exceptions import (
     VariantNotFoundException,
 )
 from data_access.assoc import Datafetch
-from data_access.gnomad import GnomAD
+from data_access.gene_index import GeneIndex, parse_region
+from data_access.gnomad import GnomAD, LazyConsequences
 from data_access.rsid_db import RsidDB
 from data_access.finemapped import Finemapped
 from data_access.metadata import Metadata
+from data_access.result_cache import ResultCache
+from data_access.sqlite_db import SQLiteDB
+from columnar_response import COLUMNAR_MEDIA_TYPE, encode_columnar
 from datatypes import ResponseTime
+from fetch_executor import SOURCES, FetchExecutor
+from json_provider import init_json_provider
+from response_cache import ResponseCache
 from variant import Variant
 from group_based_auth import verify_membership, GoogleSignIn, before_request
 from collections import defaultdict as dd
@@ -50,6 +62,8 @@ config = {
     if not key.startswith("_")
 }
 
+init_json_provider(app, config)
+
 app.config["SECRET_KEY"] = (
     config["SECRET_KEY"] if "SECRET_KEY" in config else "nonsecret key"
 )
@@ -67,18 +81,9 @@ fetch_finemapped = Finemapped(config)
 meta = Metadata(config)
 gnomad_fetch = GnomAD(config)
 rsid_db = RsidDB(config)
-
-GENEUPPER2RANGE = {}
-with open(config["gene_chr_pos"], "r") as f:
-    for line in f:
-        s = line.strip().split("\t")
-        GENEUPPER2RANGE[s[0].upper()] = (s[1], int(s[2]), int(s[3]))
-
-
-def get_gene_range(gene: str) -> tuple[str, int, int]:
-    if gene.upper() not in GENEUPPER2RANGE:
-        raise GeneNotFoundException(f"Gene {gene} not found")
-    return GENEUPPER2RANGE[gene.upper()]
+fetch_executor = FetchExecutor(config, gnomad_fetch, fetch_finemapped, fetch)
+response_cache = ResponseCache(config)
+gene_index = GeneIndex(config)
 
 
 coding_set = set(
@@ -98,6 +103,31 @@ coding_set = set(
         "coding sequence",
     ]
 )
+# the consequence terms in the raw consequences JSON, e.g. stop_gained or missense_variant
+coding_terms = tuple(c.replace(" ", "_") for c in coding_set)
+
+
+def is_coding_in_gene(gnomad_variant: dict[str, Any], gene: str) -> bool:
+    """
+    Returns whether a variant from a gnomAD range query has a coding exome consequence in the given gene.
+    """
+    if gnomad_variant["exomes"] is None:
+        return False
+    consequences = gnomad_variant["exomes"]["consequences"]
+    # rows without any coding term are not decoded
+    if isinstance(consequences, LazyConsequences) and not consequences.mentions(
+        coding_terms
+    ):
+        return False
+    return any(
+        (
+            "gene_symbol" not in c
+            or c["gene_symbol"] is None
+            or c["gene_symbol"].upper() == gene.upper()
+        )
+        and c["consequence"] in coding_set
+        for c in consequences
+    )
 
 
 def parse_query(
@@ -186,35 +216,68 @@ def get_config() -> Any:
     )
 
 
-def looks_like_a_gene(query: str) -> bool:
-    items = [item for item in sep_re_line.split(query) if item.strip() != ""]
-    if len(items) != 1:
-        return False
+@app.route("/api/v1/cache", methods=["GET"])
+def get_cache_stats() -> Any:
+    return jsonify(
+        ResultCache(config).stats() | {"response_cache": response_cache.stats()}
+    )
+
+
+@app.route("/api/v1/db_stats", methods=["GET"])
+def get_db_stats() -> Any:
+    return jsonify(SQLiteDB(config).stats())
+
+
+def wants_columnar() -> bool:
+    return (request.get_json(silent=True) or {}).get(
+        "format"
+    ) == "columnar" or COLUMNAR_MEDIA_TYPE in request.headers.get("Accept", "")
+
+
+def results_response(results: dict[str, Any]) -> Any:
+    """
+    Returns the results in the columnar format if the client asked for it
+    and in the default format otherwise.
+    """
+    if wants_columnar():
+        return jsonify(encode_columnar(results, fetch.placeholders()))
+    return jsonify(results)
+
+
+def looks_like_a_gene(item: str) -> bool:
     try:
-        _ = Variant(items[0])
+        _ = Variant(item)
     except ParseException:
-        if not re.match(
-            r"^rs\d\d+", items[0]
-        ):  # not an rsid - apparently RS1 is the only gene that starts with rs
-            return True
+        # not an rsid - apparently RS1 is the only gene that starts with rs
+        # and not a beta or custom value
+        return not re.match(r"^rs\d\d+", item) and not is_number(item)
     return False
 
 
-@app.route("/api/v1/results", methods=["POST"])
-def results() -> Any | tuple[Any, int]:
-    start_time = timeit.default_timer()
-    query = request.json[
-        "variants"
-    ].strip()  # TODO this shouldn't be called "variants" now that it may be a gene too
-    if looks_like_a_gene(query):
-        return gene_results(query)
+def is_number(item: str) -> bool:
     try:
-        parsed = parse_query(query)
-    except ParseException as e:
-        return jsonify({"message": str(e)}), 400
+        float(item)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_genes(query: str) -> list[str] | None:
+    """
+    Returns the genes of the query if it has only genes, separated like variants, and None otherwise.
+    """
+    items = [item for item in sep_re_line_and_delim.split(query) if item.strip() != ""]
+    if len(items) == 0 or not all(looks_like_a_gene(item) for item in items):
+        return None
+    return list(dict.fromkeys(items))
+
 
-    if len(parsed[1]) > config["max_query_variants"]:
-        app.logger.warn(str(len(parsed[1])) + " variants given, too much")
+ParsedVariant = tuple[str, float, str | None]
+
+
+def query_size_error(parsed: list[ParsedVariant]) -> tuple[Any, int] | None:
+    if len(parsed) > config["max_query_variants"]:
+        app.logger.warn(str(len(parsed)) + " variants given, too much")
         return (
             jsonify(
                 {
@@ -225,7 +288,164 @@ def results() -> Any | tuple[Any, int]:
             ),
             400,
         )
+    return None
+
+
+def resolve_input_variants(
+    parsed: list[ParsedVariant],
+) -> tuple[list[tuple[ParsedVariant, Variant]], set[str], set[str]]:
+    """
+    Resolves the parsed input to variants, rsids to all their variants.
+    Returns the input with the variants, and the unparsed and not found inputs.
+    """
+    unparsed_variants = set()
+    notfound_variants = set()
+    input_variants: list[tuple[ParsedVariant, Variant]] = []
+    parsed_variants: list[Variant | None] = []
+    for tpl in parsed:
+        try:
+            parsed_variants.append(Variant(tpl[0]))
+        except ParseException as e:
+            parsed_variants.append(None)
+    # the inputs that are not variants are looked up as rsids at once
+    rsid_variants = rsid_db.get_variants_by_rsids(
+        [tpl[0] for tpl, var in zip(parsed, parsed_variants) if var is None]
+    )
+    for tpl, var in zip(parsed, parsed_variants):
+        if var is not None:
+            vars = [var]
+        elif tpl[0] not in rsid_variants:
+            unparsed_variants.add(tpl[0])
+            continue
+        else:
+            vars = rsid_variants[tpl[0]]
+            if len(vars) == 0:
+                notfound_variants.add(tpl[0])
+                continue
+        input_variants.extend([(tpl, var) for var in vars])
+    return input_variants, unparsed_variants, notfound_variants
+
+
+def add_row_to_summary(
+    row: dict[str, Any],
+    uniq_phenos: set[tuple[str, str, str, str]],
+    uniq_datasets: set[str],
+    uniq_most_severe: set[str],
+) -> None:
+    records = row["assoc"]["data"] + row["finemapped"]["data"]
+    uniq_phenos.update(
+        [(a["data_type"], a["resource"], a["dataset"], a["phenocode"]) for a in records]
+    )
+    uniq_datasets.update(a["dataset"] for a in records)
+    for type in ["exomes", "genomes"]:
+        if (
+            type in row["gnomad"]
+            and row["gnomad"][type] is not None
+            and row["gnomad"][type]["most_severe"] is not None
+        ):
+            uniq_most_severe.add(row["gnomad"][type]["most_severe"])
+
+
+def get_phenos_and_datasets(
+    uniq_phenos: set[tuple[str, str, str, str]], uniq_datasets: set[str]
+) -> tuple[dict[str, Any], dict[str, Any], float]:
+    """
+    Returns the metadata of the given phenotypes and datasets and the time it took.
+    Raises DataException if a phenotype is not found.
+    """
+    start_time = timeit.default_timer()
+    # use resource:phenocode as key
+    # note that for eQTL Catalogue leafcutter, phenocode is dataset:phenocode
+    phenos = {
+        resource + ":" + phenocode: pheno
+        for (resource, phenocode), pheno in meta.get_phenotypes_many(
+            uniq_phenos
+        ).items()
+    }
+    datasets: dict[str, Any] = meta.get_datasets_many(uniq_datasets)
+    return phenos, datasets, timeit.default_timer() - start_time
+
+
+def response_meta() -> dict[str, Any]:
+    return {
+        "gnomad": config["gnomad"],
+        "assoc": config["assoc"],
+        "finemapped": config["finemapped"],
+    }
+
+
+def cached_results_response(
+    query: dict[str, Any], compute: Callable[[], Any | tuple[Any, int]]
+) -> Any | tuple[Any, int]:
+    """
+    Returns the response of the normalized query from the response cache
+    or computes and caches it. Error responses are not cached.
+    Responses have an ETag of the query and the data version and
+    a request with a matching If-None-Match gets 304 Not Modified.
+    Cached responses keep the times of the request that computed them.
+    """
+    if not response_cache.enabled:
+        return compute()
+    query["format"] = "columnar" if wants_columnar() else "default"
+    key = response_cache.key(query)
+    if request.if_none_match.contains_weak(key):
+        not_modified = app.response_class(status=304)
+        not_modified.set_etag(key, weak=True)
+        return not_modified
+    data = response_cache.get(key)
+    if data is None:
+        computed = compute()
+        if isinstance(computed, tuple) or computed.status_code != 200:
+            return computed
+        data = gzip.compress(
+            computed.get_data(), compresslevel=app.config.get("COMPRESS_LEVEL", 6)
+        )
+        response_cache.put(key, data)
+    # the compressed bytes are sent as they are to clients that accept gzip
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = app.response_class(data, mimetype="application/json")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = app.response_class(
+            gzip.decompress(data), mimetype="application/json"
+        )
+    response.headers["Vary"] = "Accept-Encoding"
+    response.set_etag(key, weak=True)
+    return response
+
 
+@app.route("/api/v1/results", methods=["POST"])
+def results() -> Any | tuple[Any, int]:
+    start_time = timeit.default_timer()
+    query = request.json[
+        "variants"
+    ].strip()  # TODO this shouldn't be called "variants" now that it may be a gene too
+    genes = parse_genes(query)
+    if genes is not None:
+        # gene names are matched case-insensitively
+        return cached_results_response(
+            (
+                {"gene": genes[0].upper()}
+                if len(genes) == 1
+                else {"genes": [gene.upper() for gene in genes]}
+            ),
+            lambda: gene_results(genes),
+        )
+    try:
+        parsed = parse_query(query)
+    except ParseException as e:
+        return jsonify({"message": str(e)}), 400
+    error = query_size_error(parsed[1])
+    if error is not None:
+        return error
+    return cached_results_response(
+        {"variants": parsed}, lambda: variant_results(parsed, start_time)
+    )
+
+
+def variant_results(
+    parsed: tuple[Literal["single", "group"], list[ParsedVariant]], start_time: float
+) -> Any | tuple[Any, int]:
     time: ResponseTime = {"gnomad": 0, "finemapped": 0, "assoc": 0, "total": 0}
     uniq_most_severe: set[str] = set()
     uniq_phenos: set[tuple[str, str, str, str]] = set()
@@ -233,92 +453,51 @@ def results() -> Any | tuple[Any, int]:
     data = []
     found_input_variants = set()
     found_actual_variants = set()
-    unparsed_variants = set()
-    notfound_variants = set()
     ac0_variants = set()
     rsid_map = dd(list)
-    for tpl in parsed[1]:
-        try:
-            vars = [Variant(tpl[0])]
-        except ParseException as e:
-            try:
-                vars = rsid_db.get_variants_by_rsid(tpl[0])
-            except ParseException as e:
-                unparsed_variants.add(tpl[0])
-                continue
-            if len(vars) == 0:
-                notfound_variants.add(tpl[0])
-                continue
-        for var in vars:
-            if str(var) in found_actual_variants:
-                continue
-            try:
-                gnomad = gnomad_fetch.get_gnomad(var)
-            except VariantNotFoundException as e:
-                notfound_variants.add(str(var))
-                continue
-            except ACZeroException as e:
-                ac0_variants.add(str(var))
-                continue
-            try:
-                finemapped = fetch_finemapped.get_finemapped(var)
-                assoc = fetch.get_assoc_and_ld_assoc(var)
-            except DataException as e:
-                return jsonify({"message": str(e)}), 500
-            data.append(
-                {
-                    "variant": str(var),
-                    "beta": tpl[1],
-                    "value": tpl[2],
-                    "gnomad": gnomad["gnomad"],
-                    "finemapped": finemapped["finemapped"],
-                    "assoc": assoc["assoc"],
-                }
-            )
-            found_input_variants.add(tpl[0])
-            found_actual_variants.add(str(var))
-            rsid_map[tpl[0]].append(str(var))
-            time["gnomad"] += gnomad["time"]
-            time["finemapped"] += finemapped["time"]
-            time["assoc"] += assoc["time"]
-            uniq_phenos.update(
-                [
-                    (a["data_type"], a["resource"], a["dataset"], a["phenocode"])
-                    for a in assoc["assoc"]["data"] + finemapped["finemapped"]["data"]
-                ]
-            )
-            uniq_datasets.update(
-                a["dataset"]
-                for a in assoc["assoc"]["data"] + finemapped["finemapped"]["data"]
-            )
-            for type in ["exomes", "genomes"]:
-                if type in gnomad["gnomad"] and gnomad["gnomad"][type] is not None:
-                    uniq_most_severe.add(gnomad["gnomad"][type]["most_severe"])
+    # resolve the input to variants first so that data can be fetched for all variants at once
+    input_variants, unparsed_variants, notfound_variants = resolve_input_variants(
+        parsed[1]
+    )
+    uniq_variants = list(dict.fromkeys([var for _, var in input_variants]))
     try:
-        freq_summary = gnomad_fetch.summarize_freq(data)
-    except IndexError as e:
-        app.logger.error(e)
-        freq_summary = []
+        fetched = fetch_executor.fetch(uniq_variants)
+    except DataException as e:
+        return jsonify({"message": str(e)}), 500
+    notfound_variants.update([str(var) for var in fetched["not_found"]])
+    ac0_variants.update([str(var) for var in fetched["ac0"]])
+    time["gnomad"] = fetched["time"]["summed"]["gnomad"]
+    time["finemapped"] = fetched["time"]["summed"]["finemapped"]
+    time["assoc"] = fetched["time"]["summed"]["assoc"]
+    time["ld_assoc"] = fetched["time"]["summed"]["ld_assoc"]
+    time["wall"] = fetched["time"]["wall"]
+    for tpl, var in input_variants:
+        if str(var) in found_actual_variants or var not in fetched["gnomad"]:
+            continue
+        row = {
+            "variant": str(var),
+            "beta": tpl[1],
+            "value": tpl[2],
+            "gnomad": fetched["gnomad"][var],
+            "finemapped": fetched["finemapped"][var]["finemapped"],
+            "assoc": fetched["assoc"][var]["assoc"],
+        }
+        data.append(row)
+        found_input_variants.add(tpl[0])
+        found_actual_variants.add(str(var))
+        rsid_map[tpl[0]].append(str(var))
+        add_row_to_summary(row, uniq_phenos, uniq_datasets, uniq_most_severe)
+    freq_summary = gnomad_fetch.summarize_freq(data)
 
     try:
-        # use resource:phenocode as key
-        # note that for eQTL Catalogue leafcutter, phenocode is dataset:phenocode
-        phenos = {
-            pheno[1]
-            + ":"
-            + pheno[3]: meta.get_phenotype(pheno[0], pheno[1], pheno[2], pheno[3])
-            for pheno in uniq_phenos
-        }
+        phenos, datasets, time["metadata"] = get_phenos_and_datasets(
+            uniq_phenos, uniq_datasets
+        )
     except DataException as e:
         app.logger.error(e)
         return jsonify({"message": str(e)}), 500
-    datasets = {
-        ds["dataset_id"]: ds
-        for ds in [meta.get_dataset(dataset) for dataset in uniq_datasets]
-        if ds is not None
-    }
     time["total"] = timeit.default_timer() - start_time
-    return jsonify(
+    return results_response(
         {
             "data": data,
             "most_severe": sorted(list(uniq_most_severe)),
@@ -334,123 +513,278 @@ def results() -> Any | tuple[Any, int]:
                 "unparsed": sorted(list(unparsed_variants)),
                 "rsid_map": rsid_map,
             },
-            "meta": {
-                "gnomad": config["gnomad"],
-                "assoc": config["assoc"],
-                "finemapped": config["finemapped"],
-            },
+            "meta": response_meta(),
             "query_type": "variant",
             "time": time,
         }
     )
 
 
-# @app.route("/api/v1/gene_results/<gene>", methods=["GET"])
-def gene_results(gene: str) -> Any | tuple[Any, int]:
+# keys of the results response sent in the header record of the streamed response,
+# the other keys except data are sent in the trailer record
+STREAM_HEADER_KEYS = ["has_betas", "has_custom_values", "meta", "query_type"]
+
+
+def ndjson_response(chunks: Iterator[list[dict[str, Any]]]) -> Any:
+    """
+    Returns a streamed response with one JSON record per line.
+    Each chunk of records is sent as soon as it is ready, gzip-compressed if the client accepts it.
+    """
+    gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+
+    def generate() -> Iterator[bytes]:
+        # wbits 31 writes a gzip header and trailer
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+        for chunk in chunks:
+            data = "".join(app.json.dumps(record) + "\n" for record in chunk).encode()
+            if compressor is not None:
+                # sync flush so that the client can decompress the chunk right away
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield data
+        if compressor is not None:
+            yield compressor.flush()
+
+    response = app.response_class(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+    if gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    # let nginx pass the chunks through without buffering them
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/api/v1/results/stream", methods=["POST"])
+def results_stream() -> Any | tuple[Any, int]:
+    """
+    Streams the results of /api/v1/results as NDJSON: a header record,
+    one row record per variant as soon as its batch has been fetched,
+    and a trailer record with the phenotype and dataset metadata, frequency summary,
+    input variants and times. Records have a "type" of header, row, trailer or error,
+    an error record ends the stream if fetching fails after the stream has started.
+    """
     start_time = timeit.default_timer()
+    query = request.json["variants"].strip()
+    genes = parse_genes(query)
+    if genes is not None:
+        # gene results are read with one range query per merged gene range and are sent at once
+        response = gene_results_data(genes)
+        if isinstance(response, tuple):
+            return response
+        header = {key: response[key] for key in STREAM_HEADER_KEYS}
+        trailer = {
+            key: value
+            for key, value in response.items()
+            if key not in STREAM_HEADER_KEYS and key != "data"
+        }
+        return ndjson_response(
+            iter(
+                [
+                    [{"type": "header", **header}],
+                    [{"type": "row", "data": row} for row in response["data"]],
+                    [{"type": "trailer", **trailer}],
+                ]
+            )
+        )
     try:
-        tabix_range = get_gene_range(gene)
-    except GeneNotFoundException as e:
-        return jsonify({"message": str(e)}), 404
-    tabix_range_str = f"{tabix_range[0]}:{tabix_range[1]}-{tabix_range[2]}"
+        parsed = parse_query(query)
+    except ParseException as e:
+        return jsonify({"message": str(e)}), 400
+    error = query_size_error(parsed[1])
+    if error is not None:
+        return error
+    input_variants, unparsed_variants, notfound_variants = resolve_input_variants(
+        parsed[1]
+    )
+    # as in /api/v1/results, the beta and value of a variant come from its first input
+    first_input: dict[Variant, ParsedVariant] = {}
+    for tpl, var in input_variants:
+        first_input.setdefault(var, tpl)
+
+    def generate() -> Iterator[list[dict[str, Any]]]:
+        yield [
+            {
+                "type": "header",
+                "has_betas": parsed[0] == "group",
+                "has_custom_values": parsed[1][0][2] is not None,
+                "meta": response_meta(),
+                "query_type": "variant",
+            }
+        ]
+        summed = {source: 0.0 for source in SOURCES}
+        uniq_most_severe: set[str] = set()
+        uniq_phenos: set[tuple[str, str, str, str]] = set()
+        uniq_datasets: set[str] = set()
+        # only the gnomAD data of the rows are kept for the frequency summary
+        gnomad_rows = []
+        found_input_variants = set()
+        ac0_variants = set()
+        rsid_map = dd(list)
+        try:
+            for batch in fetch_executor.fetch_batches(
+                list(first_input), window=fetch_executor.stream_window
+            ):
+                notfound_variants.update([str(var) for var in batch["not_found"]])
+                ac0_variants.update([str(var) for var in batch["ac0"]])
+                for source, (source_time, _, _) in batch["time"].items():
+                    summed[source] += source_time
+                rows = []
+                # variants found in gnomAD in input order
+                for var in batch["assoc"]:
+                    tpl = first_input[var]
+                    gnomad = batch["gnomad"][var]
+                    row = {
+                        "variant": str(var),
+                        "beta": tpl[1],
+                        "value": tpl[2],
+                        "gnomad": gnomad,
+                        "finemapped": batch["finemapped"][var]["finemapped"],
+                        "assoc": batch["assoc"][var]["assoc"],
+                    }
+                    rows.append({"type": "row", "data": row})
+                    gnomad_rows.append({"gnomad": gnomad})
+                    found_input_variants.add(tpl[0])
+                    rsid_map[tpl[0]].append(str(var))
+                    add_row_to_summary(
+                        row, uniq_phenos, uniq_datasets, uniq_most_severe
+                    )
+                yield rows
+            phenos, datasets, metadata_time = get_phenos_and_datasets(
+                uniq_phenos, uniq_datasets
+            )
+        except DataException as e:
+            app.logger.error(e)
+            yield [{"type": "error", "message": str(e)}]
+            return
+        freq_summary = gnomad_fetch.summarize_freq(gnomad_rows)
+        time: ResponseTime = {
+            "gnomad": summed["gnomad"],
+            "finemapped": summed["finemapped"],
+            "assoc": summed["assoc"],
+            "ld_assoc": summed["ld_assoc"],
+            "metadata": metadata_time,
+            "total": timeit.default_timer() - start_time,
+        }
+        yield [
+            {
+                "type": "trailer",
+                "most_severe": sorted(list(uniq_most_severe)),
+                "phenos": phenos,
+                "datasets": datasets,
+                "freq_summary": freq_summary,
+                "input_variants": {
+                    "found": sorted(list(found_input_variants)),
+                    "not_found": sorted(list(notfound_variants)),
+                    "ac0": sorted(list(ac0_variants)),
+                    "unparsed": sorted(list(unparsed_variants)),
+                    "rsid_map": rsid_map,
+                },
+                "time": time,
+            }
+        ]
+
+    return ndjson_response(generate())
+
+
+def encode_cursor(variant: tuple[int, str, str]) -> str:
+    """
+    Returns the opaque cursor of the last (pos, ref, alt) of a page.
+    """
+    pos, ref, alt = variant
+    return base64.urlsafe_b64encode(f"{pos}:{ref}:{alt}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[int, str, str]:
+    """
+    Returns the (pos, ref, alt) of a cursor from encode_cursor.
+    Raises ParseException if it is not a valid cursor.
+    """
+    try:
+        pos, ref, alt = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return (int(pos), ref, alt)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ParseException("invalid cursor")
+
+
+@app.route("/api/v1/region", methods=["GET"])
+def region_results() -> Any | tuple[Any, int]:
+    """
+    Returns the variants of a chr:start-end region with their gnomAD, fine-mapping and association data,
+    one page of at most limit variants in position order. The response has the cursor of the next page
+    as next_cursor, or null on the last page, which is passed as cursor to get the next page.
+    """
+    start_time = timeit.default_timer()
+    page_size = config.get("region_page_size", 100)
+    max_page_size = config.get("max_region_page_size", 1000)
+    try:
+        chr, start, end = parse_region(request.args.get("region", ""))
+        cursor = request.args.get("cursor")
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and not start <= after[0] <= end:
+            raise ParseException("cursor is not in the region")
+        limit = int(request.args.get("limit", page_size))
+    except ParseException as e:
+        return jsonify({"message": str(e)}), 400
+    except ValueError:
+        return jsonify({"message": "limit must be an integer"}), 400
+    if limit < 1 or limit > max_page_size:
+        return (
+            jsonify({"message": f"limit must be between 1 and {max_page_size}"}),
+            400,
+        )
     time: ResponseTime = {"gnomad": 0, "finemapped": 0, "assoc": 0, "total": 0}
-    uniq_most_severe: set[str] = set()
-    uniq_phenos: set[tuple[str, str, str, str]] = set()
-    uniq_datasets: set[str] = set()
-    data = []
     try:
-        gnomad = gnomad_fetch.get_gnomad_range(tabix_range_str, gene)
-    except VariantNotFoundException as e:
-        return jsonify({"message": f"No variants found for gene {gene}"}), 404
-    try:  # TODO only parse variants that are in the gnomad result set for speedup
-        finemapped = fetch_finemapped.get_finemapped_range(tabix_range_str)
-        assoc = fetch.get_assoc_range(tabix_range_str)
+        page = gnomad_fetch.get_gnomad_page(chr, start, end, after, limit)
     except DataException as e:
-        return jsonify({"message": str(e)}), 500
-    for variant in gnomad["gnomad"]:
-        if gnomad["gnomad"][variant]["exomes"] is not None:
-            csq = gnomad["gnomad"][variant]["exomes"]["consequences"]
-            for c in csq:
-                if (
-                    (
-                        "gene_symbol" not in c
-                        or c["gene_symbol"] is None
-                        or c["gene_symbol"].upper() == gene.upper()
-                    )
-                    and c["consequence"] in coding_set
-                    and (
-                        variant in finemapped["finemapped"]["data"]
-                        or variant in assoc["assoc"]["data"]
-                    )
-                ):
-                    data.append(
-                        {
-                            "variant": variant,
-                            "gnomad": gnomad["gnomad"][variant],
-                            "finemapped": (
-                                finemapped["finemapped"]["data"][variant]
-                                if variant in finemapped["finemapped"]["data"]
-                                else {"data": [], "resources": []}
-                            ),
-                            "assoc": (
-                                assoc["assoc"]["data"][variant]
-                                if variant in assoc["assoc"]["data"]
-                                else {"data": [], "resources": []}
-                            ),
-                        }
-                    )
-                    uniq_phenos.update(
-                        [
-                            (
-                                a["data_type"],
-                                a["resource"],
-                                a["dataset"],
-                                a["phenocode"],
-                            )
-                            for a in assoc["assoc"]["data"][variant]["data"]
-                            + finemapped["finemapped"]["data"][variant]["data"]
-                        ]
-                    )
-                    uniq_datasets.update(
-                        a["dataset"]
-                        for a in assoc["assoc"]["data"][variant]["data"]
-                        + finemapped["finemapped"]["data"][variant]["data"]
-                    )
-                    for type in ["exomes", "genomes"]:
-                        if (
-                            type in gnomad["gnomad"]
-                            and gnomad["gnomad"][type] is not None
-                        ):
-                            uniq_most_severe.add(gnomad["gnomad"][type]["most_severe"])
-                    break
-    try:
-        freq_summary = gnomad_fetch.summarize_freq(data)
-    except IndexError as e:
         app.logger.error(e)
-        freq_summary = []
-    time["gnomad"] += gnomad["time"]
-    time["finemapped"] += finemapped["time"]
-    time["assoc"] += assoc["time"]
-
+        return jsonify({"message": str(e)}), 500
+    time["gnomad"] = page["time"]
+    variants = list(page["gnomad"].keys())
+    data = []
+    uniq_most_severe: set[str] = set()
+    uniq_phenos: set[tuple[str, str, str, str]] = set()
+    uniq_datasets: set[str] = set()
+    if len(variants) > 0:
+        # only the positions of the page are read
+        page_range = f"{chr}:{variants[0].split('-')[1]}-{variants[-1].split('-')[1]}"
+        try:
+            finemapped = fetch_finemapped.get_finemapped_range(
+                page_range, frozenset(variants)
+            )
+            assoc = fetch.get_assoc_range(page_range, frozenset(variants))
+        except DataException as e:
+            app.logger.error(e)
+            return jsonify({"message": str(e)}), 500
+        time["finemapped"] = finemapped["time"]
+        time["assoc"] = assoc["time"]
+        for variant in variants:
+            row = {
+                "variant": variant,
+                "gnomad": page["gnomad"][variant],
+                "finemapped": (
+                    finemapped["finemapped"]["data"][variant]
+                    if variant in finemapped["finemapped"]["data"]
+                    else {"data": [], "resources": []}
+                ),
+                "assoc": (
+                    assoc["assoc"]["data"][variant]
+                    if variant in assoc["assoc"]["data"]
+                    else {"data": [], "resources": []}
+                ),
+            }
+            data.append(row)
+            add_row_to_summary(row, uniq_phenos, uniq_datasets, uniq_most_severe)
+    freq_summary = gnomad_fetch.summarize_freq(data)
     try:
-        # use resource:phenocode as key
-        # note that for eQTL Catalogue leafcutter, phenocode is dataset:phenocode
-        phenos = {
-            pheno[1]
-            + ":"
-            + pheno[3]: meta.get_phenotype(pheno[0], pheno[1], pheno[2], pheno[3])
-            for pheno in uniq_phenos
-        }
+        phenos, datasets, time["metadata"] = get_phenos_and_datasets(
+            uniq_phenos, uniq_datasets
+        )
     except DataException as e:
         app.logger.error(e)
         return jsonify({"message": str(e)}), 500
-    datasets = {
-        ds["dataset_id"]: ds
-        for ds in [meta.get_dataset(dataset) for dataset in uniq_datasets]
-        if ds is not None
-    }
     time["total"] = timeit.default_timer() - start_time
-    return jsonify(
+    return results_response(
         {
             "data": data,
             "most_severe": sorted(list(uniq_most_severe)),
@@ -459,17 +793,126 @@ def gene_results(gene: str) -> Any | tuple[Any, int]:
             "freq_summary": freq_summary,
             "has_betas": False,
             "has_custom_values": False,
-            "meta": {
-                "gnomad": config["gnomad"],
-                "assoc": config["assoc"],
-                "finemapped": config["finemapped"],
-            },
-            "query_type": "gene",
+            "meta": response_meta(),
+            "query_type": "region",
+            "region": f"{chr}:{start}-{end}",
+            "genes": gene_index.overlapping(chr, start, end),
+            "next_cursor": (
+                encode_cursor(page["next"]) if page["next"] is not None else None
+            ),
             "time": time,
         }
     )
 
 
+# @app.route("/api/v1/gene_results/<gene>", methods=["GET"])
+def gene_results(genes: list[str]) -> Any | tuple[Any, int]:
+    response = gene_results_data(genes)
+    if isinstance(response, tuple):
+        return response
+    return results_response(response)
+
+
+def gene_results_data(genes: list[str]) -> dict[str, Any] | tuple[Any, int]:
+    """
+    Returns the results of the coding variants of the genes or an error response.
+    Overlapping gene ranges are merged and each merged range is read once.
+    """
+    start_time = timeit.default_timer()
+    try:
+        ranges = gene_index.merged_ranges(genes)
+    except GeneNotFoundException as e:
+        return jsonify({"message": str(e)}), 404
+    time: ResponseTime = {"gnomad": 0, "finemapped": 0, "assoc": 0, "total": 0}
+    uniq_most_severe: set[str] = set()
+    uniq_phenos: set[tuple[str, str, str, str]] = set()
+    uniq_datasets: set[str] = set()
+    data = []
+    found = False
+    for gene_range in ranges:
+        tabix_range_str = f"{gene_range.chr}:{gene_range.start}-{gene_range.end}"
+        try:
+            gnomad = gnomad_fetch.get_gnomad_range(
+                tabix_range_str,
+                genes[0] if len(genes) == 1 else tuple(gene_range.genes),
+            )
+        except VariantNotFoundException as e:
+            continue
+        found = True
+        # decide the coding variants of the genes first so that only their association
+        # and fine-mapping rows need to be parsed,
+        # the exome row of a variant is in the range only if its most severe gene is one of the genes
+        coding_variants = [
+            variant
+            for variant in gnomad["gnomad"]
+            if gnomad["gnomad"][variant]["exomes"] is not None
+            and is_coding_in_gene(
+                gnomad["gnomad"][variant],
+                gnomad["gnomad"][variant]["exomes"]["gene_most_severe"],
+            )
+        ]
+        try:
+            finemapped = fetch_finemapped.get_finemapped_range(
+                tabix_range_str, frozenset(coding_variants)
+            )
+            assoc = fetch.get_assoc_range(tabix_range_str, frozenset(coding_variants))
+        except DataException as e:
+            return jsonify({"message": str(e)}), 500
+        for variant in coding_variants:
+            if (
+                variant in finemapped["finemapped"]["data"]
+                or variant in assoc["assoc"]["data"]
+            ):
+                variant_finemapped = (
+                    finemapped["finemapped"]["data"][variant]
+                    if variant in finemapped["finemapped"]["data"]
+                    else {"data": [], "resources": []}
+                )
+                variant_assoc = (
+                    assoc["assoc"]["data"][variant]
+                    if variant in assoc["assoc"]["data"]
+                    else {"data": [], "resources": []}
+                )
+                row = {
+                    "variant": variant,
+                    "gnomad": gnomad["gnomad"][variant],
+                    "finemapped": variant_finemapped,
+                    "assoc": variant_assoc,
+                }
+                data.append(row)
+                add_row_to_summary(row, uniq_phenos, uniq_datasets, uniq_most_severe)
+        time["gnomad"] += gnomad["time"]
+        time["finemapped"] += finemapped["time"]
+        time["assoc"] += assoc["time"]
+    if not found:
+        return (
+            jsonify({"message": f"No variants found for gene {', '.join(genes)}"}),
+            404,
+        )
+    freq_summary = gnomad_fetch.summarize_freq(data)
+
+    try:
+        phenos, datasets, time["metadata"] = get_phenos_and_datasets(
+            uniq_phenos, uniq_datasets
+        )
+    except DataException as e:
+        app.logger.error(e)
+        return jsonify({"message": str(e)}), 500
+    time["total"] = timeit.default_timer() - start_time
+    return {
+        "data": data,
+        "most_severe": sorted(list(uniq_most_severe)),
+        "phenos": phenos,
+        "datasets": datasets,
+        "freq_summary": freq_summary,
+        "has_betas": False,
+        "has_custom_values": False,
+        "meta": response_meta(),
+        "query_type": "gene",
+        "time": time,
+    }
+
+
 # OAUTH2
 if config["authentication"]:
     with open(config["authentication_file"]) as f:
@@ -1,59 +1,121 @@
 import re
+import sys
 from exceptions import ParseException
 
 var_re = re.compile("-|_|:|\\|")
 non_autosomes = set(["X", "Y", "XY", "MT"])
+allele_re = re.compile(r"[ACGT]+$")
+# codes of the normalized chromosomes in packed keys, also of the variant index and the rsid db
+CHROMOSOME_CODES = {str(i): i for i in range(1, 23)}
+CHROMOSOME_CODES.update({"X": 23, "Y": 24, "XY": 25, "MT": 26, "M": 26})
+# the position takes the low bits of Variant.key, the chromosome code the high bits
+POSITION_BITS = 32
+
+# normalized chromosome of each valid chromosome string seen
+_chromosomes: dict[str, str] = {}
+
+
+def normalize_chromosome(chr: str) -> str:
+    """
+    Returns the chromosome without a leading 0 or chr prefix, with 23, 24, 25 and 26 as X, Y, XY and MT.
+    Raises ParseException if it is not a supported chromosome.
+    """
+    try:
+        chr = re.sub(r"^0", "", str(chr))
+        chr = (
+            chr.upper()
+            .replace("CHR", "")
+            .replace("23", "X")
+            .replace("24", "Y")
+            .replace("25", "XY")
+            .replace("26", "MT")
+        )
+        chr_int = int(chr)
+        if chr_int < 1 or chr_int > 26:
+            raise ValueError
+    except ValueError:
+        if chr not in non_autosomes:
+            raise ParseException("supported chromosomes: 1-26,X,Y,XY,MT")
+    return chr
+
+
+def _normalize_and_cache(chr: str) -> str:
+    normalized = normalize_chromosome(chr)
+    _chromosomes[chr] = normalized
+    return normalized
 
 
 class Variant(object):
+    """
+    A variant with its chromosome and position packed into one integer and interned alleles.
+    The hash is computed once so variants are cheap dict and cache keys.
+    """
+
+    __slots__ = ("chr", "pos", "ref", "alt", "key", "_hash", "_varid")
+
     def __init__(self, varstr: str) -> None:
         s = var_re.split(varstr)
         if len(s) != 4:
             raise ParseException(
                 "variant needs to contain four fields, supported separators are - _ : |"
             )
-        try:
-            chr = re.sub(r"^0", "", str(s[0]))
-            chr = (
-                chr.upper()
-                .replace("CHR", "")
-                .replace("23", "X")
-                .replace("24", "Y")
-                .replace("25", "XY")
-                .replace("26", "MT")
-            )
-            chr_int = int(chr)
-            if chr_int < 1 or chr_int > 26:
-                raise ValueError
-        except ValueError:
-            if chr not in non_autosomes:
-                raise ParseException("supported chromosomes: 1-26,X,Y,XY,MT")
+        chr = _chromosomes.get(s[0]) or _normalize_and_cache(s[0])
         try:
             pos = int(s[1])
         except ValueError:
             raise ParseException("position must be an integer")
+        if pos < 0 or pos >= 1 << POSITION_BITS:
+            raise ParseException("position out of range")
+        ref = s[2].upper()
+        alt = s[3].upper()
+        if not bool(allele_re.match(ref)) or not bool(allele_re.match(alt)):
+            raise ParseException("only ACGT alleles are supported")
+        self._set(chr, pos, ref, alt)
+
+    def _set(self, chr: str, pos: int, ref: str, alt: str) -> None:
         self.chr = chr
         self.pos = pos
-        self.ref = s[2].upper()
-        self.alt = s[3].upper()
-        if not bool(re.match(r"[ACGT]+$", self.ref)) or not bool(
-            re.match(r"[ACGT]+$", self.alt)
-        ):
-            raise ParseException("only ACGT alleles are supported")
-        self.varid = "{}-{}-{}-{}".format(self.chr, self.pos, self.ref, self.alt)
+        self.ref = sys.intern(ref)
+        self.alt = sys.intern(alt)
+        self.key = (CHROMOSOME_CODES[chr] << POSITION_BITS) | pos
+        self._hash = hash((self.key, self.ref, self.alt))
+        self._varid: str | None = None
+
+    @classmethod
+    def from_trusted(cls, chr: str, pos: int | str, ref: str, alt: str) -> "Variant":
+        """
+        Returns the variant of a row of our own data files without validating it.
+        The chromosome is still normalized.
+        """
+        variant: Variant = cls.__new__(cls)
+        variant._set(
+            _chromosomes.get(chr) or _normalize_and_cache(chr),
+            int(pos),
+            ref.upper(),
+            alt.upper(),
+        )
+        return variant
+
+    @property
+    def varid(self) -> str:
+        if self._varid is None:
+            self._varid = "{}-{}-{}-{}".format(self.chr, self.pos, self.ref, self.alt)
+        return self._varid
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Variant):
             return NotImplemented
-        return (
-            self.chr == other.chr
-            and self.pos == other.pos
-            and self.ref == other.ref
-            and self.alt == other.alt
-        )
+        return self.key == other.key and self.ref == other.ref and self.alt == other.alt
 
     def __hash__(self) -> int:
-        return hash(self.varid)
+        return self._hash
+
+    def __getstate__(self) -> tuple[str, int, str, str]:
+        return (self.chr, self.pos, self.ref, self.alt)
+
+    def __setstate__(self, state: tuple[str, int, str, str]) -> None:
+        # hashes and interned strings are per process
+        self._set(*state)
 
     def __repr__(self) -> str:
         return self.varid
@@ -1,6 +1,11 @@
 import { useQuery, UseQueryResult } from "@tanstack/react-query";
-import axios from "axios";
-import { Config, TableData } from "../types/types";
+import axios, { AxiosResponse } from "axios";
+import { ColumnarRecords, ColumnarTableData, Config, TableData, VariantRecord } from "../types/types";
+
+const COLUMNAR_MEDIA_TYPE = "application/vnd.genetics-results.columnar+json";
+
+// the columnar response format is opt-in with ?format=columnar in the URL
+const columnarFormatRequested = (): boolean => new URLSearchParams(window.location.search).get("format") === "columnar";
 
 export const useConfigQuery = (): UseQueryResult<Config, Error> => {
   return useQuery<Config>({
@@ -12,27 +17,122 @@ export const useConfigQuery = (): UseQueryResult<Config, Error> => {
   });
 };
 
+const decodeRecords = (
+  encoded: ColumnarRecords,
+  strings: Array<string>,
+  variantIndex: number
+): { data: Array<Record<string, unknown>>; resources: Array<string> } => {
+  const fields = Object.keys(encoded.columns);
+  const isEncoded = fields.map((field) => encoded.encoded.includes(field));
+  const data: Array<Record<string, unknown>> = [];
+  for (let row = encoded.offsets[variantIndex]; row < encoded.offsets[variantIndex + 1]; row++) {
+    const record: Record<string, unknown> = {};
+    fields.forEach((field, f) => {
+      const value = encoded.columns[field][row];
+      // null stands for a field the record does not have
+      if (value !== null) {
+        record[field] = isEncoded[f] ? strings[value as number] : value;
+      }
+    });
+    data.push(record);
+  }
+  if (encoded.has_placeholders[variantIndex]) {
+    // placeholders go after records with the same mlogp, Array.prototype.sort is stable
+    encoded.placeholders.forEach((placeholder) => data.push({ ...placeholder }));
+    data.sort((a, b) => (b.mlogp as number) - (a.mlogp as number));
+  }
+  return {
+    data: data,
+    resources: encoded.resources[variantIndex].map((i) => strings[i]),
+  };
+};
+
+export const decodeColumnar = (encoded: ColumnarTableData): TableData => {
+  const { assoc, finemapped, strings, format, format_version, ...rest } = encoded;
+  const data = encoded.data.map(
+    (row, i) =>
+      ({
+        ...row,
+        assoc: decodeRecords(assoc, strings, i),
+        finemapped: decodeRecords(finemapped, strings, i),
+      } as VariantRecord)
+  );
+  return { ...rest, data: data };
+};
+
+// JSON error bodies of text responses are parsed so that the server's message is shown
+const parseErrorBody = (error: unknown): unknown => {
+  if (axios.isAxiosError(error) && error.response && typeof error.response.data === "string") {
+    try {
+      error.response.data = JSON.parse(error.response.data);
+    } catch (e) {
+      // not a JSON error body, keep the text
+    }
+  }
+  return error;
+};
+
+const checkParsed = (data: unknown): void => {
+  if (typeof data !== "object") {
+    // JSON parsing failed
+    if (typeof data === "string") {
+      if (String(data).includes("Infinity")) {
+        console.error("Possible Infinity value in data and it's not JSON");
+        throw Error("Invalid data received from the server, possible Infinity value in data");
+      }
+      if (String(data).includes("NaN")) {
+        console.error("Possible NaN value in data and it's not JSON");
+        throw Error("Invalid data received from the server, possible NaN value in data");
+      }
+    }
+  }
+};
+
+// the columnar format is requested as text to measure its payload size and decoding time
+const fetchColumnar = async (variantInput: string | undefined): Promise<TableData> => {
+  const startTime = performance.now();
+  let response: AxiosResponse<string>;
+  try {
+    response = await axios.post<string>(
+      "/api/v1/results",
+      { variants: variantInput, format: "columnar" },
+      { responseType: "text", headers: { Accept: COLUMNAR_MEDIA_TYPE } }
+    );
+  } catch (e) {
+    throw parseErrorBody(e);
+  }
+  const receivedTime = performance.now();
+  let parsed: TableData | ColumnarTableData;
+  try {
+    parsed = JSON.parse(response.data);
+  } catch (e) {
+    checkParsed(response.data);
+    throw e;
+  }
+  const data = "format" in parsed && parsed.format === "columnar" ? decodeColumnar(parsed) : (parsed as TableData);
+  console.info(
+    `columnar format: ${response.data.length} characters, ` +
+      `request ${Math.round(receivedTime - startTime)} ms, ` +
+      `parsing and decoding ${Math.round(performance.now() - receivedTime)} ms`
+  );
+  return data;
+};
+
 export const useServerQuery = (
   variantInput: string | undefined
 ): UseQueryResult<TableData, Error> => {
   return useQuery<TableData>({
     queryKey: ["table-data", variantInput],
     queryFn: async (): Promise<TableData> => {
-      let { data } = await axios.post<TableData>("/api/v1/results", {
-        variants: variantInput,
-      });
-      if (typeof data !== "object") {
-        // JSON parsing failed
-        if (typeof data === "string") {
-          if (String(data).includes("Infinity")) {
-            console.error("Possible Infinity value in data and it's not JSON");
-            throw Error("Invalid data received from the server, possible Infinity value in data");
-          }
-          if (String(data).includes("NaN")) {
-            console.error("Possible NaN value in data and it's not JSON");
-            throw Error("Invalid data received from the server, possible NaN value in data");
-          }
-        }
+      let data: TableData;
+      if (columnarFormatRequested()) {
+        data = await fetchColumnar(variantInput);
+      } else {
+        const response = await axios.post<TableData>("/api/v1/results", {
+          variants: variantInput,
+        });
+        checkParsed(response.data);
+        data = response.data;
       }
       data.data = data.data.filter((row) => row.assoc.data.length > 0);
       console.info(data);
@@ -59,6 +59,25 @@ export type TableData = {
   query_type: "variant" | "gene";
 };
 
+// /api/v1/results response in the columnar format, see server/columnar_response.py
+export type ColumnarRecords = {
+  offsets: Array<number>;
+  has_placeholders: Array<boolean>;
+  placeholders: Array<Record<string, string | number>>;
+  resources: Array<Array<number>>;
+  columns: Record<string, Array<string | number | boolean | null>>;
+  encoded: Array<string>;
+};
+
+export type ColumnarTableData = Omit<TableData, "data"> & {
+  data: Array<Omit<VariantRecord, "assoc" | "finemapped">>;
+  assoc: ColumnarRecords;
+  finemapped: ColumnarRecords;
+  strings: Array<string>;
+  format: "columnar";
+  format_version: number;
+};
+
 export type PopFreqSummary = {
   pop: string;
   max: number;